@@ -1,10 +1,18 @@
 from swing_schedule.swing_schedule import (
+    Assignment as Assignment,
     Input as Input,
+    Log as Log,
     Model as Model,
+    ScheduleError as ScheduleError,
+    ScheduleResult as ScheduleResult,
+    SolveOptions as SolveOptions,
+    alternatives as alternatives,
+    debug as debug,
+    info as info,
+    main as main,
+    pareto as pareto,
     parse as parse,
+    solve as solve,
     stop as stop,
-    info as info,
     warn as warn,
-    debug as debug,
-    main as main,
 )
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+from swing_schedule.swing_schedule import (
+    Model,
+    SolveOptions,
+    input_with_log,
+    schedule_result_of,
+)
+
+# asyncio interface, the solver runs in the default executor so that the event
+# loop is never blocked:
+#
+#   S = await schedule_async(In, {"time_limit": 60})  # a ScheduleResult
+#
+# or, to see improving schedules as they are found:
+#
+#   M = Model()
+#   await loop.run_in_executor(None, M.build, In)
+#   solve = AsyncSolve(M, time_limit=60).start()
+#   async for R in solve:
+#       ...                      # solve.cancel() stops the search
+#   R = await solve.result()     # the best schedule
+#
+# Results carry status, bound, time_limit and interrupted (after cancel) like
+# those of Model.solve, ScheduleError is raised when no schedule was found.
+
+
+class AsyncSolve:
+    def __init__(self, model, time_limit=None):
+        self.model = model
+        self.time_limit = time_limit
+        self.solver = model.new_solver(time_limit)
+        self.best = None
+        self.queue = None
+        self.future = None
+        self.cancelled = False
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+        def on_result(R):  # in the solver thread
+            self.best = R
+            loop.call_soon_threadsafe(self.queue.put_nowait, R)
+
+        self.future = loop.run_in_executor(None, self.model.run, self.solver, on_result)
+        # scheduled after all incumbents, marks the end of the stream
+        self.future.add_done_callback(lambda f: self.queue.put_nowait(None))
+        return self
+
+    # improving schedules, ends when the solve does
+    async def incumbents(self):
+        while True:
+            R = await self.queue.get()
+            if R is None:
+                return
+            yield R
+
+    def __aiter__(self):
+        return self.incumbents()
+
+    def cancel(self):
+        self.cancelled = True
+        self.solver.StopSearch()
+
+    async def result(self):
+        try:
+            status = await asyncio.shield(self.future)
+        except asyncio.CancelledError:
+            # the awaiting task was cancelled, the solver thread must stop too
+            self.cancel()
+            raise
+        R = self.best
+        if R is None:
+            self.model.log.error(f"Solution NOT found - status {status}")
+        R.status = status
+        R.bound = self.solver.BestObjectiveBound()
+        R.wall_time = self.solver.WallTime()
+        R.time_limit = self.time_limit
+        R.cached = False
+        R.interrupted = self.cancelled
+        return R
+
+
+# The ScheduleResult of input_ like that of solve, params: time_limit, cache
+# (as for Model.build), log (quiet without it) and on_incumbent(R)
+async def schedule_async(input_, params=None):
+    params = params or {}
+    In = input_with_log(input_, SolveOptions(log=params.get("log")))
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    M = Model()
+    await loop.run_in_executor(None, M.build, In, params.get("cache", False))
+    build_time = time.perf_counter() - start
+    solve = AsyncSolve(M, params.get("time_limit")).start()
+    on_incumbent = params.get("on_incumbent")
+    try:
+        if on_incumbent is not None:
+            async for R in solve:
+                on_incumbent(R)
+        R = await solve.result()
+    except asyncio.CancelledError:
+        solve.cancel()
+        raise
+    return schedule_result_of(R, In, build_time)
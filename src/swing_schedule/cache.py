@@ -0,0 +1,112 @@
+import hashlib
+import importlib.metadata
+import os
+import pickle
+import tempfile
+
+from swing_schedule.swing_schedule import LOG
+
+
+def cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "swing-schedule")
+
+
+def package_version():
+    try:
+        version = importlib.metadata.version("swing-schedule")
+    except importlib.metadata.PackageNotFoundError:
+        version = "unknown"
+    # running from a source tree is common, so the code itself is part of the key
+    h = hashlib.sha256()
+    for name in sorted(os.listdir(os.path.dirname(__file__))):
+        if name.endswith(".py"):
+            with open(os.path.join(os.path.dirname(__file__), name), mode="rb") as f:
+                h.update(f.read())
+    return f"{version}/{h.hexdigest()}"
+
+
+def file_digest(path):
+    if path is None:
+        return "-"
+    with open(path, mode="rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+# x with sets sorted and records as tuples, so that its repr does not depend
+# on the hash seed of the process
+def canonical(x):
+    if isinstance(x, (set, frozenset)):
+        return sorted((canonical(v) for v in x), key=repr)
+    if isinstance(x, dict):
+        return [(canonical(k), canonical(v)) for k, v in x.items()]
+    if isinstance(x, (list, tuple)):
+        return [canonical(v) for v in x]
+    if hasattr(x, "__slots__"):
+        return (
+            type(x).__name__,
+            [(k, canonical(getattr(x, k, None))) for k in x.__slots__],
+        )
+    return x
+
+
+def key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(repr(canonical(part)).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def path(kind, k):
+    return os.path.join(cache_dir(), kind, f"{k}.pickle")
+
+
+def load(kind, k, log=LOG):
+    p = path(kind, k)
+    try:
+        with open(p, mode="rb") as f:
+            stored_key, value = pickle.load(f)
+    except FileNotFoundError:
+        log.debug(f"cache: {kind} {k} not cached")
+        return None
+    except (
+        pickle.UnpicklingError,
+        EOFError,
+        AttributeError,
+        ImportError,
+        OSError,
+    ) as e:
+        # stale, corrupted or unreadable entry, just rebuild it
+        log.debug(f"cache: cannot load {p}: {e}")
+        return None
+    if stored_key != k:
+        log.debug(f"cache: key mismatch in {p}")
+        return None
+    log.debug(f"cache: loaded {p}")
+    return value
+
+
+def store(kind, k, value, log=LOG):
+    p = path(kind, k)
+    os.makedirs(os.path.dirname(p), exist_ok=True)
+    # a file of its own for every writer, threads of a process may store the
+    # same entry at once
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(p), suffix=".tmp", delete=False
+    ) as f:
+        try:
+            pickle.dump((k, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, p)  # readers never see a partial entry
+    log.debug(f"cache: stored {p}")
+
+
+def remove(kind, k, log=LOG):
+    try:
+        os.unlink(path(kind, k))
+    except FileNotFoundError:
+        return
+    log.debug(f"cache: removed {path(kind, k)}")
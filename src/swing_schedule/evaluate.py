@@ -0,0 +1,503 @@
+import time
+
+import numpy as np
+
+from swing_schedule.swing_schedule import Result, bits
+
+# Scores a schedule (a Result, e.g. from read_schedule) without the solver.
+#
+# The rules are those of Model.init, Model.init_teacher and
+# Model.init_penalties, so for a schedule satisfying all hard constraints the
+# objective equals the one the solver reports for the same schedule (after
+# Model.fix). Heavy rules are penalties, not violations, as in the model.
+#
+#   R = read_schedule(In, "published.json")
+#   evaluate(In, R)
+#   R.status, R.objective, R.violations
+#
+# Evaluator keeps the penalties of every course, teacher, student, group of
+# courses and room in a slot, so that the change of the objective caused by a
+# move is computed from the affected parts only:
+#
+#   E = Evaluator(In, R)
+#   E.delta(("swap", c1, c2))         # objective and violations change
+#   E.apply(("teacher", c, 0, t))     # t leads c from now on
+#   E.result()
+
+TOTAL_COURSESLOTS = 4 * 3 * 2  # days, times, rooms, as in Model.init_penalties
+
+# sums of the parts, the objective is computed from them
+SUMS = ("heavy", "teacher", "student", "repair_course", "repair_teacher", "violations")
+
+
+def part_sums(part):
+    repair = part.get("repair", {})
+    return {
+        "heavy": sum(part.get("heavy", {}).values()),
+        "teacher": sum(part.get("teacher", {}).values()),
+        "student": sum(part.get("student", {}).values()),
+        "repair_course": repair.get("course", 0),
+        "repair_teacher": repair.get("teacher", 0),
+        "violations": len(part.get("violations", ())),
+    }
+
+
+class Evaluator:
+    def __init__(self, In, R, published=None):
+        self.In = In
+        self.published = published
+        S, nT = len(In.slots), len(In.times)
+        T, C = len(In.teachers), len(In.courses)
+        self.couple = R.couple
+        self.slot = R.slot.copy()
+        self.room = R.room.copy()
+        self.teachers = R.teachers.copy()
+        self.venue = np.array([In.Venues[In.rooms_venues[Rm]] for Rm in In.rooms])
+        self.coeff = In.PENALTIES.get("teacher", 0)
+
+        # ts[t, s] courses teacher t teaches in slot s, tc[t, c] times teacher
+        # t is a teacher of course c (more than 1 breaks a hard constraint)
+        self.ts = np.zeros((T, S), dtype=int)
+        self.tc = np.zeros((T, C), dtype=int)
+        self.occupants = {}  # (slot, room) -> courses
+        for c in range(C):
+            s = self.slot[c]
+            if s >= 0:
+                self.occupants.setdefault((s, self.room[c]), []).append(c)
+            for t in self.teachers[c][self.teachers[c] >= 0]:
+                self.tc[t, c] += 1
+                if s >= 0:
+                    self.ts[t, s] += 1
+        self.n_active = int((self.slot >= 0).sum())
+        self.is_lead = np.array([Td.role == "lead" for Td in In.teacher_data])
+        self.is_follow = np.array([Td.role == "follow" for Td in In.teacher_data])
+        self.tt = In.Courses.get("Teachers Training")
+        assert S == len(In.days) * nT
+
+        # weights, bad and perfect courses and bad slots of every teacher
+        self.teacher_prefs = []
+        prefs = In.courses_regular + In.courses_solo + In.courses_threesome
+        for Td in In.teacher_data:
+            total_ic = sum(Td.ic.values()) or 1
+            icw = {k: self.coeff * v // total_ic for k, v in Td.ic.items()}
+            bad, perfect = (
+                [In.Courses[Cn] for Cn in prefs if Td.courses_pref.get(Cn) == x]
+                for x in (1, 3)
+            )
+            self.teacher_prefs.append((icw, bad, perfect, list(bits(Td.slots_bad))))
+
+        # which parts depend on what
+        self.tt_not = []  # t -> [(t2, heavy rule name of every course)]
+        self.related = [set() for t in range(T)]  # t -> teachers using tc[t]
+        for t, Tn in enumerate(In.teachers):
+            pairs = []
+            for T2 in sorted({T2 for T1, T2 in In.tt_not_together if T1 == Tn}):
+                t2 = In.Teachers[T2]
+                names = [
+                    f"tt_not/{Tn}+{T2}/{Cn}".replace(" ", "-") for Cn in In.courses
+                ]
+                pairs.append((t2, names))
+                self.related[t2].add(t)
+            self.tt_not.append(pairs)
+            for o in In.teacher_data[t].together:
+                self.related[o].add(t)
+        self.groups = (
+            [("different", Cs) for Cs in In.courses_different]
+            + [("diffday", Cs) for Cs in In.courses_diffday]
+            + [("same", Cs) for Cs in In.courses_same]
+        )
+        self.course_groups = [[] for c in range(C)]
+        for g, (kind, Cs) in enumerate(self.groups):
+            for Cn in Cs:
+                self.course_groups[In.Courses[Cn]].append(g)
+        self.students = []
+        self.student_courses = []  # student i -> [(course type, courses)]
+        self.course_students = [set() for c in range(C)]
+        if In.PENALTIES.get("student", 0):
+            for val in In.student_data:
+                if not val.courses_attend:
+                    continue
+                i = len(self.students)
+                self.students.append(val)
+                ls = []
+                for Cn in val.courses_attend:
+                    cs = In.courses_of_type(Cn)
+                    if not cs:
+                        In.log.error(f"stud_bad: no specific course found for {Cn}")
+                    ls.append((Cn, cs))
+                    for c in cs:
+                        self.course_students[c].add(i)
+                self.student_courses.append(ls)
+
+        self.parts = {}  # key -> (part, part_sums(part))
+        self.totals = dict.fromkeys(SUMS, 0)
+        for t in range(T):
+            self.update(("teacher", t))
+        for c in range(C):
+            self.update(("course", c))
+        for i in range(len(self.students)):
+            self.update(("student", i))
+        for g in range(len(self.groups)):
+            self.update(("group", g))
+        for s, r in list(self.occupants):
+            self.update(("room", s, r))
+
+    def objective(self):
+        In = self.In
+        P = In.PENALTIES
+        x = self.totals["heavy"] * P["heavy"] + self.totals["teacher"]
+        x += self.totals["student"] * P.get("student", 0) // 100
+        if P.get("courses_closed", 0):
+            x += (TOTAL_COURSESLOTS - self.n_active) * P["courses_closed"]
+        if self.published is not None:
+            x += self.totals["repair_course"] * P["repair_course"]
+            x += self.totals["repair_teacher"] * P["repair_teacher"]
+        return x
+
+    def n_violations(self):
+        return self.totals["violations"]
+
+    def violations(self):
+        return [
+            x for part, _ in self.parts.values() for x in part.get("violations", ())
+        ]
+
+    # in the structure of Model.penalties
+    def penalties(self):
+        In = self.In
+        penalties = {"heavy": {}, "very_heavy": {}, "custom": {}, "nice": {}}
+        for part, _ in self.parts.values():
+            penalties["heavy"].update(part.get("heavy", {}))
+        for name, coeff in In.PENALTIES.items():
+            if coeff == 0:
+                continue
+            if name == "teacher":
+                penalties["teacher"] = {
+                    Tn: self.parts[("teacher", t)][0]["teacher"]
+                    for t, Tn in enumerate(In.teachers)
+                }
+            elif name == "courses_closed":
+                penalties["courses_closed"] = TOTAL_COURSESLOTS - self.n_active
+            elif name == "student":
+                penalties["student"] = {
+                    val.name: self.parts[("student", i)][0]["student"]
+                    for i, val in enumerate(self.students)
+                }
+        if self.published is not None:
+            penalties["repair"] = {
+                "course": self.totals["repair_course"],
+                "teacher": self.totals["repair_teacher"],
+            }
+        return penalties
+
+    # the current schedule with status, objective, penalties and violations
+    def result(self):
+        In = self.In
+        R = Result(In)
+        R.slot[:] = self.slot
+        R.room[:] = self.room
+        R.teachers[:] = self.teachers
+        R.set_penalties(self.penalties(), In)
+        R.objective = self.objective()
+        R.violations = self.violations()
+        R.status = "INFEASIBLE" if R.violations else "FEASIBLE"
+        R.bound = None
+        return R
+
+    # Moves:
+    #   ("move", c, s, r)      course c to slot s and room r (-1, -1 closes it)
+    #   ("swap", c1, c2)       courses c1 and c2 exchange their slots and rooms
+    #   ("teacher", c, i, t)   t becomes the i-th teacher of course c (lead and
+    #                          follow first in couple courses), -1 removes it
+
+    # apply move, returns the change of the objective and of the number of
+    # broken hard constraints
+    def apply(self, move):
+        objective, n = self.objective(), self.n_violations()
+        _, keys = self.change(move)
+        for key in keys:
+            self.update(key)
+        return self.objective() - objective, self.n_violations() - n
+
+    # the same as apply, but the schedule stays as it is
+    def delta(self, move):
+        objective, n = self.objective(), self.n_violations()
+        inverse, keys = self.change(move)
+        old = {key: self.update(key) for key in keys}
+        d = self.objective() - objective, self.n_violations() - n
+        self.change(inverse)
+        for key, part in old.items():
+            self.set_part(key, part)
+        return d
+
+    # change the arrays, returns the inverse move and the affected parts
+    def change(self, move):
+        if move[0] == "move":
+            return self.place(*move[1:])
+        if move[0] == "swap":
+            c1, c2 = move[1:]
+            s1, r1 = self.slot[c1], self.room[c1]
+            keys = self.place(c1, self.slot[c2], self.room[c2])[1]
+            keys |= self.place(c2, s1, r1)[1]
+            return move, keys
+        if move[0] == "teacher":
+            return self.set_teacher(*move[1:])
+        raise ValueError(f"Unknown move {move[0]}")
+
+    def place(self, c, s, r):
+        c, s, r = int(c), int(s), int(r)
+        s0, r0 = int(self.slot[c]), int(self.room[c])
+        Ts = [int(t) for t in self.teachers[c] if t >= 0]
+        for t in Ts:
+            if s0 >= 0:
+                self.ts[t, s0] -= 1
+            if s >= 0:
+                self.ts[t, s] += 1
+        keys = {("course", c)}
+        if s0 >= 0:
+            self.occupants[(s0, r0)].remove(c)
+            keys.add(("room", s0, r0))
+        if s >= 0:
+            self.occupants.setdefault((s, r), []).append(c)
+            keys.add(("room", s, r))
+        self.n_active += (s >= 0) - (s0 >= 0)
+        self.slot[c], self.room[c] = s, r
+        if c == self.tt:  # "tt" penalties of all teachers
+            Ts = range(len(self.In.teachers))
+        keys.update(("teacher", t) for t in Ts)
+        keys.update(("student", i) for i in self.course_students[c])
+        keys.update(("group", g) for g in self.course_groups[c])
+        return ("move", c, s0, r0), keys
+
+    def set_teacher(self, c, i, t):
+        c, i, t = int(c), int(i), int(t)
+        t0 = int(self.teachers[c, i])
+        s = self.slot[c]
+        keys = {("course", c)}
+        for x, d in ((t0, -1), (t, 1)):
+            if x >= 0:
+                self.tc[x, c] += d
+                if s >= 0:
+                    self.ts[x, s] += d
+                keys.add(("teacher", x))
+                keys.update(("teacher", o) for o in self.related[x])
+        self.teachers[c, i] = t
+        return ("teacher", c, i, t0), keys
+
+    # recompute the part of key, returns the previous one
+    def update(self, key):
+        part = getattr(self, f"{key[0]}_part")(*key[1:])
+        return self.set_part(key, (part, part_sums(part)))
+
+    def set_part(self, key, entry):
+        old = self.parts.get(key)
+        if old is not None:
+            for k, v in old[1].items():
+                self.totals[k] -= v
+        if entry is None:
+            del self.parts[key]
+        else:
+            for k, v in entry[1].items():
+                self.totals[k] += v
+            self.parts[key] = entry
+        return old
+
+    def course_part(self, c):
+        In = self.In
+        Cn = In.courses[c]
+        active = self.slot[c] >= 0
+        violations = []
+        Ts = self.teachers[c][self.teachers[c] >= 0]
+        if len(set(Ts.tolist())) != len(Ts):
+            violations.append(f"{Cn}: a teacher twice")
+        if Cn in In.courses_regular:
+            n = 2
+            if self.is_lead[Ts].sum() > 1 or self.is_follow[Ts].sum() > 1:
+                violations.append(f"{Cn}: two teachers of the same role")
+        elif Cn in In.courses_solo:
+            n = 1
+        elif Cn in In.courses_threesome:
+            n = 3
+        else:
+            n = 0
+        if len(Ts) != (n if active else 0):
+            violations.append(f"{Cn}: {len(Ts)} teachers")
+        roles = [(In.ct_possible, Ts, "")]
+        if self.couple[c]:
+            roles.append((In.ct_possible_lead, self.teachers[c, :1], " as lead"))
+            roles.append((In.ct_possible_follow, self.teachers[c, 1:2], " as follow"))
+        for possible, ts, role in roles:
+            for t in ts[ts >= 0]:
+                if Cn in possible and In.teachers[t] not in possible[Cn]:
+                    violations.append(f"{In.teachers[t]} cannot teach {Cn}{role}")
+        if Cn in In.cr_not and self.room[c] == In.Rooms[In.cr_not[Cn]]:
+            violations.append(f"{Cn} in {In.cr_not[Cn]}")
+        if Cn in In.cr_strict and active and self.room[c] != In.Rooms[In.cr_strict[Cn]]:
+            violations.append(f"{Cn} not in {In.cr_strict[Cn]}")
+
+        heavy = {}
+        if Cn in In.courses_must_open:
+            heavy[f"mustopen-{Cn}"] = int(not active)
+        if Cn in In.courses_not_open:
+            heavy[f"notopen-{Cn}"] = int(active)
+        if Cn in In.courses_slots_strict:
+            heavy[f"cs-strict-{Cn}"] = int(self.slot[c] != In.courses_slots_strict[Cn])
+        part = {"violations": violations, "heavy": heavy}
+
+        if self.published is not None:
+            P = self.published
+            # Hamming distance of the decision variables, see Model.add_repair
+            place, place0 = (self.slot[c], self.room[c]), (P.slot[c], P.room[c])
+            course = 0 if place == place0 else active + (P.slot[c] >= 0)
+            if self.couple[c]:
+                teacher = sum(
+                    0 if x == x0 else (x >= 0) + (x0 >= 0)
+                    for x, x0 in zip(self.teachers[c, :2], P.teachers[c, :2])
+                )
+            else:
+                new = set(Ts.tolist())
+                old = set(P.teachers[c][P.teachers[c] >= 0].tolist())
+                teacher = len(new ^ old)
+            part["repair"] = {"course": int(course), "teacher": int(teacher)}
+        return part
+
+    # constraints, heavy rules and penalties of teacher t, see Model.init_teacher
+    # and Model.init_teacher_penalties
+    def teacher_part(self, t):
+        In = self.In
+        Td = In.teacher_data[t]
+        Tn = Td.name
+        nT = len(In.times)
+        taught = self.ts[t] > 0
+        days = taught.reshape(len(In.days), nT)
+        n = int(self.tc[t].sum())
+        violations = []
+        for s in np.flatnonzero(self.ts[t] > 1):
+            violations.append(f"{Tn} teaches {self.ts[t, s]} courses in {In.slots[s]}")
+        if Td.slots:
+            for s in np.flatnonzero(taught):
+                if not Td.slots_possible >> int(s) & 1:
+                    violations.append(f"{Tn} cannot teach in {In.slots[s]}")
+        venues = {}
+        for c in np.flatnonzero(self.tc[t]):
+            if self.slot[c] >= 0:
+                d = self.slot[c] // nT
+                venues.setdefault(d, set()).add(self.venue[self.room[c]])
+        for d, vs in venues.items():
+            if len(vs) > 1:
+                violations.append(f"{Tn} teaches in two venues on {In.days[d]}")
+
+        heavy = {}
+        heavy[f"{Tn}-ncourses"] = int(n > Td.util_max)
+        heavy[f"{Tn}-ndays"] = int(days.any(axis=1).sum() > Td.days_max)
+        for t2, names in self.tt_not[t]:
+            both = (self.tc[t] > 0) & (self.tc[t2] > 0)
+            heavy.update(zip(names, both.astype(int).tolist()))
+        part = {"violations": violations, "heavy": heavy}
+        if not self.coeff:
+            return part
+
+        icw, bad, perfect, slots_bad = self.teacher_prefs[t]
+        diff = n - Td.util_ideal
+        diff_pos, diff_neg = max(diff, 0), max(-diff, 0)
+        days_extra = int(days.any(axis=1).sum()) - (n - 1) // nT - 1 if n else 0
+        heavy[f"3more-{Tn}"] = int(diff_pos > 2)
+        heavy[f"2less-{Tn}"] = int(diff_neg > 1)
+        heavy[f"2extradays-{Tn}"] = int(days_extra >= 2)
+
+        p = {}
+        p["1more"] = icw["1more"] if diff_pos >= 1 else 0
+        p["2more"] = diff_pos * icw["2more"] if diff_pos >= 2 else 0
+        p["1less"] = diff_neg * icw["1less"]
+        p["3c1d"] = int(days[:, :3].all(axis=1).sum()) * icw["3c1d"]
+        p["2c2d"] = days_extra * icw["2c2d"]
+        p["not_teaching"] = icw["not_teaching"] if n == 0 else 0
+        if self.tt is not None and "tt" in icw:
+            s = self.slot[self.tt]
+            # not available: teaches or bad slot preferences
+            na = s >= 0 and (taught[s] or not Td.slots_possible >> int(s) & 1)
+            p["tt"] = icw["tt"] if not self.tc[t, self.tt] and na else 0
+        split = days[:, 0] & ~days[:, 1] & days[:, 2]
+        p["split"] = int(split.sum()) * icw["split"]
+        p["bad_time"] = icw["bad_time"] * int(taught[slots_bad].sum())
+        p["bad_course"] = icw["bad_course"] * int(self.tc[t, bad].sum())
+        p["no_perfect"] = icw["no_perfect"] if not self.tc[t, perfect].any() else 0
+        together = (self.tc[t] > 0) & (self.tc[Td.together].sum(axis=0) > 0)
+        p["no_person"] = icw["no_person"] if not together.any() else 0
+        if icw["special"]:
+            p["special"] = 0  # special wishes are not expressed in the input
+        part["teacher"] = p
+        return part
+
+    def student_part(self, i):
+        val = self.students[i]
+        weight = 100 // len(val.courses_attend)
+        d = {}
+        for Cn, cs in self.student_courses[i]:
+            can = any(
+                self.slot[c] >= 0 and val.slots_possible >> int(self.slot[c]) & 1
+                for c in cs
+            )
+            d[Cn] = 0 if can else weight
+        return {"student": d}
+
+    # courses_different, courses_diffday and courses_same, see Model.init
+    def group_part(self, g):
+        In = self.In
+        nT = len(In.times)
+        kind, Cs = self.groups[g]
+        cs = [In.Courses[Cn] for Cn in Cs]
+        slot = self.slot[cs]
+        day, tim = slot // nT, slot % nT
+        violations = []
+        if kind == "different":
+            active = slot >= 0
+            for i in range(len(cs)):
+                for j in range(i):
+                    if (
+                        active[i]
+                        and active[j]
+                        and (day[i] == day[j] or tim[i] == tim[j])
+                    ):
+                        violations.append(
+                            f"{Cs[j]} and {Cs[i]} not on different days and times"
+                        )
+        elif kind == "diffday":
+            # inactive courses count as the first day, as in the model
+            days = np.maximum(day, 0).tolist()
+            if len(set(days)) != len(days):
+                violations.append(f"{', '.join(Cs)} not on different days")
+        elif (
+            (slot < 0).any()
+            or len(set(day.tolist())) > 1
+            or len(set(self.venue[self.room[cs]].tolist())) > 1
+            or (len(cs) == nT and len(set(tim.tolist())) != nT)
+            or (len(cs) == nT - 1 and abs(tim[0] - tim[1]) != 1)
+        ):
+            violations.append(f"{', '.join(Cs)} not one after another")
+        return {"violations": violations}
+
+    # at most one course in room r in slot s
+    def room_part(self, s, r):
+        In = self.In
+        cs = self.occupants.get((s, r), [])
+        return {
+            "violations": [
+                f"{In.courses[cs[0]]} and {In.courses[c]} in {In.slots[s]} {In.rooms[r]}"
+                for c in cs[1:]
+            ]
+        }
+
+
+# check schedule R and set its status (INFEASIBLE if it breaks a hard
+# constraint), objective, penalties and violations, e.g. for print_result
+def evaluate(In, R, published=None):
+    start = time.perf_counter()
+    E = Evaluator(In, R, published)
+    R.set_penalties(E.penalties(), In)
+    R.objective = E.objective()
+    R.violations = E.violations()
+    R.status = "INFEASIBLE" if R.violations else "FEASIBLE"
+    R.bound = None
+    R.wall_time = time.perf_counter() - start
+    return R
@@ -0,0 +1,79 @@
+import random
+import time
+
+import numpy as np
+
+from swing_schedule.evaluate import Evaluator
+
+# Local search after the solver stopped at its time limit: improving teacher
+# substitutions, swaps of courses and moves to free rooms (see Evaluator)
+# are taken until none is left or the time is up. Moves breaking a hard
+# constraint are never taken.
+
+POLISH_SHARE = 0.05  # of the time limit, see solve()
+
+
+# moves worth trying in the current schedule of E
+def candidate_moves(E):
+    In = E.In
+    ls = []
+    active = np.flatnonzero(E.slot >= 0).tolist()
+    teachers = set(range(len(In.teachers)))
+    for c in active:
+        Cn = In.courses[c]
+        for i in np.flatnonzero(E.teachers[c] >= 0).tolist():
+            possible = teachers
+            lists = [In.ct_possible]
+            if E.couple[c] and i < 2:
+                lists.append((In.ct_possible_lead, In.ct_possible_follow)[i])
+            for x in lists:
+                if Cn in x:
+                    possible = possible & {
+                        In.Teachers[T] for T in x[Cn] if T in In.Teachers
+                    }
+            for t in sorted(possible - set(E.teachers[c].tolist())):
+                ls.append(("teacher", c, i, t))
+    for k, c1 in enumerate(active):
+        for c2 in active[k + 1 :]:
+            ls.append(("swap", c1, c2))
+    free = [
+        (s, r)
+        for s in range(len(In.slots))
+        for r in range(len(In.rooms))
+        if not E.occupants.get((s, r))
+    ]
+    for c in active:
+        for s, r in free:
+            ls.append(("move", c, s, r))
+    return ls
+
+
+# improve schedule R for at most time_limit seconds, returns the improved
+# Result (see Evaluator.result) with polish set to the objective before, the
+# number of moves taken and the time spent
+def polish(In, R, time_limit, published=None, seed=0):
+    start = time.perf_counter()
+    E = Evaluator(In, R, published)
+    rnd = random.Random(seed)
+    n_moves = 0
+    improved = True
+    while improved and time.perf_counter() - start < time_limit:
+        improved = False
+        moves = candidate_moves(E)
+        rnd.shuffle(moves)
+        for move in moves:
+            if time.perf_counter() - start >= time_limit:
+                break
+            d, d_violations = E.delta(move)
+            if d < 0 and d_violations <= 0:
+                E.apply(move)
+                n_moves += 1
+                improved = True
+    P = E.result()
+    P.polish = {
+        "objective": R.objective,
+        "moves": n_moves,
+        "time": time.perf_counter() - start,
+    }
+    In.log.debug(f"polish: {R.objective} -> {P.objective}, {n_moves} moves")
+    return P
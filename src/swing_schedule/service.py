@@ -0,0 +1,380 @@
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+from collections import OrderedDict
+
+from swing_schedule import cache
+from swing_schedule.evaluate import evaluate
+from swing_schedule.swing_schedule import (
+    LOG,
+    Incumbents,
+    Input,
+    Model,
+    ScheduleError,
+    schedule_diff,
+    schedule_entries,
+    schedule_from_json,
+    schedule_json,
+    schedule_result,
+)
+
+# The service keeps parsed inputs, built models and their best schedules in
+# memory, with cache (--cache) inputs and models are cached on disk as well.
+# Requests and replies are JSON objects, one per line, e.g.
+#
+#   {"id": 1, "op": "solve", "teachers": "t.csv", "students": "s.csv", "time_limit": 10}
+#   {"id": 2, "op": "evaluate", "teachers": "t.csv", "schedule": [...]}
+#   {"id": 3, "op": "what-if", "teachers": "t.csv", "changes": {"excluded_teachers": ["X"]}}
+#   {"id": 4, "op": "cancel", "target": 1}
+#
+# Input fields are those of Input.init: teachers, students, penalties and
+# excluded_teachers. Schedules use the format of --save-schedule. A client
+# can only cancel its own requests, and at most MAX_SOLVES solves (and
+# what-ifs) run at once, more are refused.
+#
+# Replies carry the request id and an event:
+#   "incumbent" - a better schedule was found (solve, what-if)
+#   "result"    - the final reply with status, objective, schedule and penalties
+#   "error"     - the request failed
+
+LRU_SIZE = 8
+MAX_SOLVES = 2  # every solve uses all the cores
+
+
+# a request with missing or malformed fields
+class RequestError(Exception):
+    pass
+
+
+# types of the request fields and how to name them in errors
+FIELDS = {
+    "teachers": (str, "a file name"),
+    "students": (str, "a file name"),
+    "penalties": (dict, "an object"),
+    "excluded_teachers": (list, "a list"),
+    "time_limit": ((int, float), "a number"),
+    "schedule": (list, "a list"),
+    "changes": (dict, "an object"),
+    "radius": (int, "an integer"),
+}
+
+
+# the field name of req, default if it is missing or null
+def field(req, name, default=None, required=False):
+    value = req.get(name)
+    if value is None:
+        if required:
+            raise RequestError(f"missing {name}")
+        return default
+    types, what = FIELDS[name]
+    if not isinstance(value, types) or isinstance(value, bool):
+        raise RequestError(f"{name} must be {what}")
+    return value
+
+
+def result_json(R, In):
+    return {
+        "status": getattr(R, "status", "FEASIBLE"),
+        "objective": R.objective,
+        "schedule": schedule_json(R, In),
+        "penalties": R.penalties,
+    }
+
+
+class Service:
+    def init(self, size=LRU_SIZE, log=None, max_solves=MAX_SOLVES, cache=False):
+        self.size = size
+        self.cache = cache
+        self.log = log if log is not None else LOG
+        # input key -> {"input": Input, "model": Model, "result": best Result}
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # input key -> lock held while the entry is being built, so that
+        # concurrent requests for the same input build it once
+        self.building = {}
+        # (client, request id) -> solver of a running solve, ids are only
+        # unique per client
+        self.running = {}
+        self.max_solves = max_solves
+        self.solves = threading.BoundedSemaphore(max_solves)
+
+    def key(self, req):
+        return cache.key(
+            "service",
+            cache.file_digest(field(req, "teachers", required=True)),
+            cache.file_digest(field(req, "students")),
+            sorted(field(req, "excluded_teachers", [])),
+            sorted(field(req, "penalties", {}).items()),
+            cache.package_version(),
+        )
+
+    # parsed input and built model of the request, least recently used are dropped
+    def entry(self, req):
+        key = self.key(req)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            building = self.building.setdefault(key, threading.Lock())
+        with building:
+            with self.lock:
+                if key in self.entries:  # built while waiting
+                    self.entries.move_to_end(key)
+                    return self.entries[key]
+            try:
+                In = Input(self.log)
+                In.init(
+                    field(req, "teachers"),
+                    penalties=field(req, "penalties", {}),
+                    students_csv=field(req, "students"),
+                    excluded_teachers=field(req, "excluded_teachers", []),
+                    cache=self.cache,
+                )
+                M = Model()
+                M.build(In, cache=self.cache)
+                entry = {"input": In, "model": M, "result": None}
+                with self.lock:
+                    self.entries[key] = entry
+                    while len(self.entries) > self.size:
+                        self.entries.popitem(last=False)
+            finally:
+                with self.lock:
+                    if self.building.get(key) is building:
+                        del self.building[key]
+        return entry
+
+    # client identifies the connection, e.g. for cancel
+    def handle(self, req, reply, client=None):
+        rid = req.get("id")
+        done = False
+        try:
+            self.dispatch(rid, req, reply, client)
+            done = True
+        finally:
+            # a bug, threading.excepthook prints the traceback and the client
+            # still gets a reply
+            if not done:
+                reply({"id": rid, "event": "error", "message": "Internal error"})
+
+    def dispatch(self, rid, req, reply, client):
+        op = req.get("op")
+        try:
+            if op == "solve":
+                self.solve((client, rid), req, reply)
+            elif op == "evaluate":
+                self.evaluate(rid, req, reply)
+            elif op == "what-if":
+                self.what_if((client, rid), req, reply)
+            elif op == "cancel":
+                self.cancel((client, rid), req, reply)
+            else:
+                reply({"id": rid, "event": "error", "message": f"Unknown op {op}"})
+        except RequestError as e:
+            reply({"id": rid, "event": "error", "message": f"Bad request: {e}"})
+        except ScheduleError as e:  # while reading the input or building the model
+            reply({"id": rid, "event": "error", "message": str(e)})
+        except (OSError, KeyError, TypeError, ValueError) as e:  # a bad request
+            reply({"id": rid, "event": "error", "message": f"{type(e).__name__}: {e}"})
+
+    # run M, stream improving schedules and return the best one (or None),
+    # request is (client, request id)
+    def run(self, request, M, reply, time_limit=None):
+        if not self.solves.acquire(blocking=False):
+            raise ScheduleError(
+                f"Too many solves ({self.max_solves}) running, try again later"
+            )
+        try:
+            return self.run_solver(request, M, reply, time_limit)
+        finally:
+            self.solves.release()
+
+    def run_solver(self, request, M, reply, time_limit):
+        rid = request[1]
+        best = {}
+
+        # the reply is sent from a background thread, a slow client must not
+        # slow the search down
+        def send(R, timestamp):
+            reply(
+                {
+                    "id": rid,
+                    "event": "incumbent",
+                    "objective": R.objective,
+                    "wall_time": R.wall_time,
+                }
+            )
+
+        incumbents = Incumbents(send)
+
+        def on_result(R):
+            best["result"] = R
+            incumbents.add(R)
+
+        def on_done(status):
+            best["status"] = status
+
+        solver, thread = M.start(on_result, on_done, time_limit=time_limit)
+        with self.lock:
+            self.running[request] = solver
+        thread.join()
+        incumbents.close()
+        with self.lock:
+            self.running.pop(request, None)
+        R = best.get("result")
+        if R is not None:
+            R.status = best["status"]
+            R.bound = solver.BestObjectiveBound()
+            R.time_limit = time_limit
+        return R, best["status"]
+
+    def solve(self, request, req, reply):
+        rid = request[1]
+        time_limit = field(req, "time_limit")
+        entry = self.entry(req)
+        In = entry["input"]
+        stored = entry["result"]
+        # the same rule as for the results cache in Model.solve
+        if stored is not None and (
+            stored.status == "OPTIMAL"
+            or (
+                time_limit is not None
+                and (stored.time_limit is None or stored.time_limit >= time_limit)
+            )
+        ):
+            reply(
+                {"id": rid, "event": "result", "cached": True} | result_json(stored, In)
+            )
+            return
+        M = entry["model"]
+        if stored is not None:
+            M = M.clone()
+            M.add_hints(stored)
+        R, status = self.run(request, M, reply, time_limit)
+        if R is None and stored is not None:  # e.g. cancelled before improving it
+            R = stored
+        if R is None:
+            reply({"id": rid, "event": "error", "message": f"No schedule: {status}"})
+            return
+        if stored is None or status == "OPTIMAL" or R.objective < stored.objective:
+            entry["result"] = R
+        reply({"id": rid, "event": "result"} | result_json(R, In))
+
+    # penalties of the given schedule, INFEASIBLE with the broken hard
+    # constraints in "violations", no solver is needed
+    def evaluate(self, rid, req, reply):
+        schedule = field(req, "schedule", required=True)
+        In = self.entry(req)["input"]
+        R = evaluate(In, schedule_from_json(In, schedule))
+        reply(
+            {"id": rid, "event": "result", "violations": R.violations}
+            | result_json(R, In)
+        )
+
+    # changed input repaired from the best known schedule of the original one
+    def what_if(self, request, req, reply):
+        rid = request[1]
+        changes = field(req, "changes", {})
+        radius = field(req, "radius")
+        time_limit = field(req, "time_limit")
+        base = self.entry(req)
+        if base["result"] is None:
+            reply({"id": rid, "event": "error", "message": "Solve the input first"})
+            return
+        changed = dict(req) | changes
+        entry = self.entry(changed)
+        In = entry["input"]
+        P = schedule_result(In, schedule_entries(base["result"], base["input"]))
+        M = entry["model"].clone()
+        M.add_repair(P, radius)
+        R, status = self.run(request, M, reply, time_limit)
+        if R is None:
+            reply({"id": rid, "event": "error", "message": f"No schedule: {status}"})
+            return
+        reply(
+            {"id": rid, "event": "result", "changes": schedule_diff(P, R, In)}
+            | result_json(R, In)
+        )
+
+    # stops a running solve or what-if of the same client
+    def cancel(self, request, req, reply):
+        client, rid = request
+        if "target" not in req:
+            raise RequestError("missing target")
+        with self.lock:
+            solver = self.running.get((client, req["target"]))
+        if solver is not None:
+            solver.StopSearch()
+        reply({"id": rid, "event": "result", "cancelled": solver is not None})
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        lock = threading.Lock()
+
+        def reply(msg):
+            with lock:
+                try:
+                    self.wfile.write((json.dumps(msg) + "\n").encode())
+                    self.wfile.flush()
+                except OSError:
+                    pass  # the client is gone, the request still finishes
+
+        # requests run in parallel, so that a solve can be cancelled
+        threads = []
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+            except ValueError as e:
+                reply({"event": "error", "message": f"Bad request: {e}"})
+                continue
+            if not isinstance(req, dict):
+                reply({"event": "error", "message": "Bad request: not an object"})
+                continue
+            thread = threading.Thread(
+                target=self.server.service.handle,
+                args=(req, reply, self),
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+
+
+# a socket left behind by a server that is gone is replaced, anything else at
+# path is an error
+def remove_stale_socket(path, log):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(st.st_mode):
+        log.error(f"{path} exists and is not a socket")
+    with socket.socket(socket.AF_UNIX) as s:
+        try:
+            s.connect(path)
+        except ConnectionRefusedError:
+            pass
+        else:
+            log.error(f"Another server is running on {path}")
+    log.warning(f"Removing stale socket {path}")
+    os.unlink(path)
+
+
+def serve(path, size=LRU_SIZE, log=None, cache=False):
+    log = log if log is not None else LOG
+    remove_stale_socket(path, log)
+    service = Service()
+    service.init(size, log, cache=cache)
+    with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+        server.service = service
+        log.info(f"Serving on {path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
@@ -1,38 +1,103 @@
 #!/usr/bin/env python3
 
-import sys
-import csv
 import argparse
+import copy
+import csv
+import datetime
+import json
+import operator
+import os
 import pprint
 import re
+import sys
+import threading
+import time
+import types
+import zlib
+from dataclasses import dataclass, field
+
+# OR-Tools takes long to import, so it is imported only when a model is built
+# or loaded, see import_ortools. NumPy is imported with the first Result, see
+# import_numpy, so that checking the input needs neither.
+cp_model = None
+cp_model_helper = None
+np = None
+
+
+def import_ortools():
+    global cp_model, cp_model_helper
+    if cp_model is None:
+        from ortools.sat.python import cp_model, cp_model_helper
 
-from ortools.sat.python import cp_model
 
-VERBOSE = False
+def import_numpy():
+    global np
+    if np is None:
+        import numpy as np
+
+
+# solver callback calling on_solution(callback) for every improving solution
+def solution_callback(on_solution):
+    class SolutionCallback(cp_model.CpSolverSolutionCallback):
+        def OnSolutionCallback(self):
+            on_solution(self)
+
+    return SolutionCallback()
+
+
+# raised by error(), the CLI prints the message and exits with 1
+class ScheduleError(Exception):
+    pass
+
+
+# logging context of Input and Model, so that differently configured
+# instances can live in one process
+class Log:
+    def __init__(self, verbose=False, quiet=False):
+        self.verbose = verbose
+        self.quiet = quiet  # no info and warnings, e.g. in the library
+
+    def debug(self, m):
+        if not self.verbose:
+            return
+        print(f"DEBUG: {m}")
+
+    def info(self, m):
+        if self.quiet:
+            return
+        print(f"INFO: {m}")
+
+    def warning(self, m):
+        if self.quiet:
+            return
+        print(f"WARNING: {m}")
+
+    def error(self, m):
+        raise ScheduleError(m)
+
+
+# default log, used by the functions below and instances created without a log
+LOG = Log()
 
 
 def set_verbose():
-    global VERBOSE
-    VERBOSE = True
+    LOG.verbose = True
 
 
 def debug(m):
-    if not VERBOSE:
-        return
-    print(f"DEBUG: {m}")
+    LOG.debug(m)
 
 
 def info(m):
-    print(f"INFO: {m}")
+    LOG.info(m)
 
 
 def warn(m):
-    print(f"WARNING: {m}")
+    LOG.warning(m)
 
 
 def error(m):
-    print(f"ERROR: {m}")
-    sys.exit(1)
+    LOG.error(m)
 
 
 def stop():
@@ -40,35 +105,215 @@ def stop():
     sys.exit(100)
 
 
+# Hands results over from the solution callback to a background thread, so
+# that the search never waits for formatting or I/O. Only the latest result
+# is kept and handle(R, timestamp) is called at most once per interval. Other
+# errors than OSError of handle are bugs, they end the thread with a traceback.
+class Incumbents:
+    def __init__(self, handle, interval=0, log=None):
+        self.handle = handle
+        self.interval = interval
+        self.log = log if log is not None else LOG
+        self.latest = None
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    # called from the solution callback, never blocks for long
+    def add(self, R):
+        with self.cond:
+            self.latest = (R, time.time())
+            self.cond.notify()
+
+    # handle the latest result (if not yet handled) and stop the thread
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+
+    def loop(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.latest is not None or self.closed)
+                if self.latest is None:
+                    return
+                item, self.latest = self.latest, None
+            try:
+                self.handle(*item)
+            except OSError as e:  # e.g. a full disk, the search goes on
+                self.log.warning(f"Cannot handle incumbent: {e}")
+            if self.interval:
+                with self.cond:
+                    self.cond.wait_for(lambda: self.closed, timeout=self.interval)
+
+
+# slot availability is kept in integer bitmasks, bit s stands for slot s
+def slot_mask(prefs, pred):
+    mask = 0
+    for s, v in enumerate(prefs):
+        if pred(v):
+            mask |= 1 << s
+    return mask
+
+
+def bits(mask):
+    # indices of set bits, lowest first
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def mask_str(mask, n):
+    return "".join("1" if mask >> i & 1 else "0" for i in range(n))
+
+
+class Record:
+    __slots__ = ()
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{k}={getattr(self, k)!r}" for k in self.__slots__ if hasattr(self, k)
+        )
+        return f"{self.__class__.__name__}({fields})"
+
+
+class Teacher(Record):
+    # the fields marked derived are set by Input.init_rest
+    __slots__ = (
+        "courses_pref",  # derived, preference about teaching course C (HARD if 0)
+        "courses_teach_primary",
+        "courses_teach_secondary",
+        "days_max",  # derived, HARD the teacher can teach maximum N days
+        "english",
+        "ic",  # inconvenience weights
+        "name",
+        "ncourses_ideal",
+        "ncourses_max",
+        "ndays_max",
+        "role",
+        "slots",  # slot preferences (0-3), HARD if 0
+        "slots_bad",  # derived, bitmask of slots with preference 1
+        "slots_perfect",  # derived, bitmask of slots with preference 3
+        "slots_possible",  # derived, bitmask of slots with preference > 0
+        "teach_not_together",
+        "teach_together",
+        "together",  # derived, SOFT wants to teach a course with teachers (indices)
+        "util_ideal",  # derived, the teacher wants to teach N courses
+        "util_max",  # derived, HARD the teacher can teach maximum N courses
+    )
+
+    def __init__(self, name):
+        self.name = name
+        self.role = None
+        self.english = False
+        self.ncourses_ideal = 0
+        self.ncourses_max = 0
+        self.ndays_max = 0
+        self.slots = []
+        self.ic = {}
+        self.courses_teach_primary = {}
+        self.courses_teach_secondary = []
+        self.teach_together = []
+        self.teach_not_together = []
+        self.util_ideal = 0
+        self.util_max = 0
+        self.days_max = 0
+        self.courses_pref = {}
+        self.together = []
+        self.slots_possible = 0
+        self.slots_bad = 0
+        self.slots_perfect = 0
+
+
+class Student(Record):
+    __slots__ = (
+        "courses_attend",
+        "name",
+        "provided_id",
+        "role",
+        "slots",  # 0 for impossible slots, 2 otherwise
+        "slots_possible",  # bitmask of slots with preference > 0
+    )
+
+    def __init__(self, name):
+        self.name = name
+        self.provided_id = None
+        self.role = None
+        self.slots = []
+        self.courses_attend = []
+        self.slots_possible = 0
+
+
 class Input:
+    def __init__(self, log=None):
+        self.log = log if log is not None else LOG
+        # see add_extra_course
+        self.courses_extra = {}
+
     def init(
         self,
         teachers_csv,
-        penalties={},
+        penalties=None,
         students_csv=None,
-        extra_courses=[],
-        excluded_teachers=[],
+        extra_courses=(),
+        excluded_teachers=(),
+        cache=False,
     ):
+        self.cache_key = None
+        if cache and teachers_csv is not None:
+            from swing_schedule import cache as input_cache
+
+            self.cache_key = input_cache.key(
+                "input",
+                input_cache.file_digest(teachers_csv),
+                input_cache.file_digest(students_csv),
+                list(extra_courses),
+                sorted(excluded_teachers),
+                self.courses_extra,
+                input_cache.package_version(),
+            )
+            state = input_cache.load("input", self.cache_key, self.log)
+            if state is not None:
+                self.log.info("Input loaded from cache")
+                self.__dict__.update(state)
+                self.init_penalties(penalties)
+                return
         self.init_constants()
         self.init_form(teachers_csv, students_csv, extra_courses, excluded_teachers)
         self.init_teachers()
         self.init_rest()
+        if self.cache_key is not None:
+            state = dict(self.__dict__)
+            del state["log"]
+            input_cache.store("input", self.cache_key, state, self.log)
         self.init_penalties(penalties)
 
     def init_form(
-        self, teachers_csv, students_csv=None, extra_courses=[], excluded_teachers=[]
+        self, teachers_csv, students_csv=None, extra_courses=(), excluded_teachers=()
     ):
         self.init_teachers_form(teachers_csv, extra_courses, excluded_teachers)
+        self.students = []
+        # student records indexed the same way as self.students
+        self.student_data = []
         if students_csv is not None:
             self.init_students_form(students_csv)
-        debug(pprint.pformat(self.input_data))
+        self.log.debug(pprint.pformat(self.input_data))
 
-    courses_extra = {}
+    # shallow copy logging to log, the data is shared
+    def with_log(self, log):
+        In = copy.copy(self)
+        In.log = log
+        return In
 
     def add_extra_course(self, course, typ, teachers):
-        debug(f"add_extra_course: {course} type {typ} teachers {', '.join(teachers)}")
+        self.log.debug(
+            f"add_extra_course: {course} type {typ} teachers {', '.join(teachers)}"
+        )
         if typ not in ("open", "solo", "regular"):
-            error(f"add_extra_course: unknown type {typ}")
+            self.log.error(f"add_extra_course: unknown type {typ}")
         self.courses_extra[course] = {}
         self.courses_extra[course]["type"] = typ
         self.courses_extra[course]["teachers"] = teachers
@@ -160,7 +405,7 @@ class Input:
             "Zumba s Tomem",
         ]
         for C, d in self.courses_extra.items():
-            debug(f"init_constants: extra course {C}")
+            self.log.debug(f"init_constants: extra course {C}")
             typ = d["type"]
             if typ == "open":
                 self.courses_open.append(C)
@@ -171,57 +416,69 @@ class Input:
             elif typ == "regular":
                 self.courses_regular.append(C)
             else:
-                error(f"init_constants: unknown extra course {C} type {typ}")
-        self.courses_open = list(set(self.courses_open) - set(self.COURSES_IGNORE))
-        debug(f"init_constants: courses_open: {', '.join(self.courses_open)}")
-        self.courses_solo = list(set(self.courses_solo) - set(self.COURSES_IGNORE))
-        debug(f"init_constants: courses_solo: {', '.join(self.courses_solo)}")
-        self.courses_threesome = list(
-            set(self.courses_threesome) - set(self.COURSES_IGNORE)
+                self.log.error(f"init_constants: unknown extra course {C} type {typ}")
+        # in the order of the input, so that the model is the same in every
+        # process (see Model.signature)
+        self.courses_open = self.courses_without_ignored(self.courses_open)
+        self.log.debug(f"init_constants: courses_open: {', '.join(self.courses_open)}")
+        self.courses_solo = self.courses_without_ignored(self.courses_solo)
+        self.log.debug(f"init_constants: courses_solo: {', '.join(self.courses_solo)}")
+        self.courses_threesome = self.courses_without_ignored(self.courses_threesome)
+        self.log.debug(
+            f"init_constants: courses_threesome: {', '.join(self.courses_threesome)}"
         )
-        debug(f"init_constants: courses_threesome: {', '.join(self.courses_threesome)}")
-        self.courses_regular = list(
-            set(self.courses_regular) - set(self.COURSES_IGNORE)
+        self.courses_regular = self.courses_without_ignored(self.courses_regular)
+        self.log.debug(
+            f"init_constants: courses_regular: {', '.join(self.courses_regular)}"
         )
-        debug(f"init_constants: courses_regular: {', '.join(self.courses_regular)}")
         self.courses = (
             self.courses_regular
             + self.courses_solo
             + self.courses_threesome
             + self.courses_open
         )
-        debug(f"init_constants: courses: {', '.join(self.courses)}")
+        self.log.debug(f"init_constants: courses: {', '.join(self.courses)}")
         self.Courses = {}
         for i, c in enumerate(self.courses):
             self.Courses[c] = i
 
+        # generic (form) course name -> indices of matching specific courses
+        self.course_types = {}
+        for C in self.courses:
+            words = re.sub(" /[A-Za-z0-9-]+$", "", C).split(" ")
+            for i in range(1, len(words) + 1):
+                self.courses_of_type(" ".join(words[:i]))
+        self.log.debug(f"init_constants: course_types: {self.course_types}")
+
+    # courses without duplicates and COURSES_IGNORE, in their order
+    def courses_without_ignored(self, courses):
+        return [C for C in dict.fromkeys(courses) if C not in self.COURSES_IGNORE]
+
     def init_teachers(self):
-        debug("Initializing teachers")
-        debug(f"Active teachers: {self.teachers}")
+        self.log.debug("Initializing teachers")
+        self.log.debug(f"Active teachers: {self.teachers}")
         self.teachers_lead = [
-            T for T in self.teachers if self.input_data[T]["role"] == "lead"
+            T for T in self.teachers if self.input_data[T].role == "lead"
         ]
-        debug(f"Leaders: {self.teachers_lead}")
+        self.log.debug(f"Leaders: {self.teachers_lead}")
         self.teachers_lead_primary = [
-            T
-            for T in self.teachers
-            if self.input_data[T]["role"] in ("lead", "both/lead")
+            T for T in self.teachers if self.input_data[T].role in ("lead", "both/lead")
         ]
-        debug(f"Primary leaders: {self.teachers_lead_primary}")
+        self.log.debug(f"Primary leaders: {self.teachers_lead_primary}")
         self.teachers_follow = [
-            T for T in self.teachers if self.input_data[T]["role"] == "follow"
+            T for T in self.teachers if self.input_data[T].role == "follow"
         ]
-        debug(f"Follows: {self.teachers_follow}")
+        self.log.debug(f"Follows: {self.teachers_follow}")
         self.teachers_follow_primary = [
             T
             for T in self.teachers
-            if self.input_data[T]["role"] in ("follow", "both/follow")
+            if self.input_data[T].role in ("follow", "both/follow")
         ]
-        debug(f"Primary follows: {self.teachers_follow_primary}")
+        self.log.debug(f"Primary follows: {self.teachers_follow_primary}")
         self.teachers_both = [
-            T for T in self.teachers if self.input_data[T]["role"].startswith("both/")
+            T for T in self.teachers if self.input_data[T].role.startswith("both/")
         ]
-        debug(f"Both: {self.teachers_both}")
+        self.log.debug(f"Both: {self.teachers_both}")
         assert set(self.teachers) >= set(
             self.teachers_lead + self.teachers_follow + self.teachers_both
         )
@@ -232,6 +489,8 @@ class Input:
         self.Teachers = {}
         for i, t in enumerate(self.teachers):
             self.Teachers[t] = i
+        # teacher records indexed the same way as self.teachers
+        self.teacher_data = [self.input_data[T] for T in self.teachers]
 
         # caring only about teachers for now
         self.people = self.teachers  # FIXME
@@ -239,7 +498,7 @@ class Input:
     def translate_teacher_name(self, name):
         result = name.strip()
         result = result.replace(" ", "-")
-        debug(f"Translated '{name}' to '{result}'")
+        self.log.debug(f"Translated '{name}' to '{result}'")
         return result
 
     def is_course_type(self, Cspecn, Cgen):
@@ -281,65 +540,159 @@ class Input:
         # debug(f"is_course_type: '{Cspecn}' '{Cspec}' '{Cgen}' {result}")
         return result
 
+    def courses_of_type(self, Cgen):
+        # names not known in advance (student answers etc.) are resolved once
+        cs = self.course_types.get(Cgen)
+        if cs is None:
+            cs = tuple(
+                c
+                for c, Cspec in enumerate(self.courses)
+                if self.is_course_type(Cspec, Cgen)
+            )
+            self.course_types[Cgen] = cs
+        return cs
+
     def check_course(self, course):
-        for Cspec in self.courses:
-            if self.is_course_type(Cspec, course):
-                # debug(f"check_course: course preference {course} maps, e.g to {Cspec}")
-                return True
-        warn(f"check_course: unknown course: '{course}'")  # TODO
+        if self.courses_of_type(course):
+            # debug(f"check_course: course preference {course} maps, e.g to {Cspec}")
+            return True
+        self.log.warning(f"check_course: unknown course: '{course}'")  # TODO
         return False
 
-    def read_teachers_input(self, infile=None, extra_courses=[], excluded_teachers=[]):
-        debug(f"read_teachers_input: Excluded teachers: {', '.join(excluded_teachers)}")
+    # teachers' form questions
+    TQ_SLOTS = "What days and times are convenient for you?"
+    TQ_COURSES = "What courses would you like to teach in your primary role?"
+    TQ_IC = "How inconvenient are following situations for you?"
+    TQ = types.MappingProxyType(
+        {
+            "who": "Who are you?",
+            "ncourses_ideal": "How many courses would you ideally like to teach?",
+            "ncourses_max": "How many courses are you able to teach at most?",
+            "ndays_max": "How many days are you able to teach at most?",
+            "english": "Are you fine with teaching in English?",
+            "role": "What is your dancing role?",
+            "courses_teach_secondary": "What courses would you like to teach in your secondary role?",
+            "teach_together": "Who would you like to teach with?",
+            "teach_not_together": "Are there any people you cannot teach with?",
+        }
+    )
+    ICW = types.MappingProxyType(
+        {  # inconvenience weigths
+            "no problemo": 0,
+            "slightly": 1,
+            "quite": 3,
+            "very": 6,
+        }
+    )
+    ICN = types.MappingProxyType(
+        {  # inconvenience names
+            'Teaching undesirable course ("1 - only if needed")': "bad_course",
+            'Teaching in undesirable time ("1 - only if needed")': "bad_time",
+            "Not teaching with any preferred person": "no_person",
+            "Teaching 2 courses in 2 days": "2c2d",
+            "Teaching 3 courses in 1 day": "3c1d",
+            "Waiting between courses": "split",
+            'Not teaching any "3 - perfect!" course': "no_perfect",
+            "Teaching 1 more course than desired": "1more",
+            "Teaching 2 more courses than desired": "2more",
+            "Teaching 1 less course than desired": "1less",
+            "Not teaching at all": "not_teaching",
+            #                "Teaching during Teachers' Training": "tt",
+            "Not respecting an explicit wish from the last question": "special",
+        }
+    )
+
+    # translate the header of teachers' form to column indices
+    def compile_teachers_schema(self, header, extra_courses=()):
+        columns = {}
+        for i, col in enumerate(header):
+            self.log.debug(f"Column: {col}")
+            columns[col] = i  # the last one wins, as with csv.DictReader
+
+        missing = []
+
+        def index(col):
+            if col not in columns:
+                missing.append(col)
+                return None
+            return columns[col]
+
+        schema = {}
+        for k, col in self.TQ.items():
+            schema[k] = index(col)
+        schema["slots"] = [index(f"{self.TQ_SLOTS} [{S}]") for S in self.slots]
+        schema["ic_names"] = list(self.ICN.values())
+        schema["ic"] = [index(f"{self.TQ_IC} [{ic_name}]") for ic_name in self.ICN]
+
+        # check courses offered by the form
+        input_courses = []  # courses
+        for col in header:
+            if col.startswith(self.TQ_COURSES):
+                course = col.split("[")[1].split("]")[0]
+                if course in self.COURSES_IGNORE:
+                    continue
+                if self.check_course(course):
+                    input_courses.append(course)
+        for C in extra_courses:
+            if C not in input_courses:
+                input_courses.append(C)
+        self.log.debug(f"Input courses (F): {sorted(input_courses)}")
+        self.log.debug(f"Input courses (C): {sorted(self.courses)}")
+        # does not make sense (general vs. specific course names)
+        # debug(f"Input courses (diff): {set(self.courses)-set(input_courses)-set(self.COURSES_IGNORE)}")
+        schema["courses"] = input_courses
+        schema["courses_teach_primary"] = []
+        for C in input_courses:
+            if C.startswith("Airsteps"):
+                C_answer = "Airsteps"
+            else:
+                C_answer = C
+            schema["courses_teach_primary"].append(
+                index(f"{self.TQ_COURSES} [{C_answer}]")
+            )
+
+        if missing:
+            self.log.error(f"Teachers' form: missing columns: {'; '.join(missing)}")
+        schema["width"] = len(header)
+        return schema
+
+    def read_teachers_input(self, infile=None, extra_courses=(), excluded_teachers=()):
+        self.log.debug(
+            f"read_teachers_input: Excluded teachers: {', '.join(excluded_teachers)}"
+        )
         if infile:
-            debug(f"Opening {infile}")
+            self.log.debug(f"Opening {infile}")
             f = open(infile, mode="r")
         else:  # use stdin
             f = sys.stdin
 
         result = {}
         self.teachers = []
-        input_courses = []  # courses
         n = 0
 
-        reader = csv.DictReader(f)
+        reader = csv.reader(f)
+        header = next(reader, [])
+        schema = self.compile_teachers_schema(header, extra_courses)
+        input_courses = schema["courses"]
         for row in reader:
             n += 1
-            if n == 1:
-                # check courses when handling the first row
-                columns = list(row.keys())
-                for col in columns:
-                    debug(f"Column: {col}")
-                    if col.startswith(
-                        "What courses would you like to teach in your primary role?"
-                    ):
-                        course = col.split("[")[1].split("]")[0]
-                        if course in self.COURSES_IGNORE:
-                            continue
-                        if self.check_course(course):
-                            input_courses.append(course)
-                for C in extra_courses:
-                    if C not in input_courses:
-                        input_courses.append(C)
-                debug(f"Input courses (F): {sorted(input_courses)}")
-                debug(f"Input courses (C): {sorted(self.courses)}")
-                # does not make sense (general vs. specific course names)
-                # debug(f"Input courses (diff): {set(self.courses)-set(input_courses)-set(self.COURSES_IGNORE)}")
+            if len(row) < schema["width"]:
+                row += [""] * (schema["width"] - len(row))
             # handle the input data
-            debug("")
-            who = row["Who are you?"]
+            self.log.debug("")
+            who = row[schema["who"]]
             if who.startswith("IGNORE") or not any(
-                row.values()
+                row
             ):  # explicitly ignored row or empty row
-                debug(f"read_teachers_input: skipping row {row}")
+                self.log.debug(f"read_teachers_input: skipping row {row}")
                 continue
             if who in excluded_teachers:
-                info(f"Skipping teacher {who}")
+                self.log.info(f"Skipping teacher {who}")
                 continue
             name = self.translate_teacher_name(who)
-            debug(f"Reading: name {name}")
+            self.log.debug(f"Reading: name {name}")
             if name in result:
-                warn(f"Re-reading answers for {name}")
+                self.log.warning(f"Re-reading answers for {name}")
                 del result[name]
             #            # check that we know the teacher
             #            found = False
@@ -350,66 +703,22 @@ class Input:
             #            if not found:
             #                debug(f"Teachers: {self.TEACHERS}")
             #                error(f"Unknown teacher {name}")
-            d = {}
-            d["type"] = "teacher"
-            d["ncourses_ideal"] = int(
-                row["How many courses would you ideally like to teach?"]
-            )
-            d["ncourses_max"] = int(
-                row["How many courses are you able to teach at most?"]
-            )
-            d["ndays_max"] = int(row["How many days are you able to teach at most?"])
-            if d["ndays_max"] == 0 or d["ncourses_max"] == 0:
+            d = Teacher(name)
+            d.ncourses_ideal = int(row[schema["ncourses_ideal"]])
+            d.ncourses_max = int(row[schema["ncourses_max"]])
+            d.ndays_max = int(row[schema["ndays_max"]])
+            if d.ndays_max == 0 or d.ncourses_max == 0:
                 # skip
-                info(f"Skipping {who} - does not want to teach courses")
+                self.log.info(f"Skipping {who} - does not want to teach courses")
                 continue
-            if row["Are you fine with teaching in English?"] == "Yes":
-                d["english"] = True
-            else:
-                d["english"] = False
-            slots = []
-            for day in ["Mon", "Tue", "Wed", "Thu"]:
-                for time in ["17:30", "18:50", "20:10"]:
-                    slots.append(
-                        int(
-                            row[
-                                f"What days and times are convenient for you? [{day} {time}]"
-                            ][0]
-                        )
-                    )
-            d["slots"] = slots
-            ICW = {  # inconvenience weigths
-                "no problemo": 0,
-                "slightly": 1,
-                "quite": 3,
-                "very": 6,
-            }
-            ICN = {  # inconvenience names
-                'Teaching undesirable course ("1 - only if needed")': "bad_course",
-                'Teaching in undesirable time ("1 - only if needed")': "bad_time",
-                "Not teaching with any preferred person": "no_person",
-                "Teaching 2 courses in 2 days": "2c2d",
-                "Teaching 3 courses in 1 day": "3c1d",
-                "Waiting between courses": "split",
-                'Not teaching any "3 - perfect!" course': "no_perfect",
-                "Teaching 1 more course than desired": "1more",
-                "Teaching 2 more courses than desired": "2more",
-                "Teaching 1 less course than desired": "1less",
-                "Not teaching at all": "not_teaching",
-                #                "Teaching during Teachers' Training": "tt",
-                "Not respecting an explicit wish from the last question": "special",
-            }
-            ic = {}  # inconvenience data
-            for ic_name, ic_id in ICN.items():
-                val = ICW[
-                    row[
-                        f"How inconvenient are following situations for you? [{ic_name}]"
-                    ]
-                ]
-                ic[ic_id] = val
+            d.english = row[schema["english"]] == "Yes"
+            d.slots = [int(row[i][0]) for i in schema["slots"]]
+            ic = dict(
+                zip(schema["ic_names"], [self.ICW[row[i]] for i in schema["ic"]])
+            )  # inconvenience data
 
             # role
-            role = row["What is your dancing role?"]
+            role = row[schema["role"]]
             if role == "Lead only":
                 role = "lead"
             elif role == "Follow only":
@@ -419,49 +728,31 @@ class Input:
             elif role.startswith("Primarily follow"):
                 role = "both/follow"
             else:
-                error(f"Unknown role {role}")
-            d["role"] = role
-
-            courses_teach_primary = {}
-            for C in input_courses:
-                # debug(f"course {C}")
-                #                if C == "Rhythm Pilots":
-                #                    pass
-                #                elif C == "Charleston 2": # TODO
-                #                    pass
-                #                else:
-                if C.startswith("Airsteps"):
-                    C_answer = "Airsteps"
-                else:
-                    C_answer = C
-                answer = row[
-                    f"What courses would you like to teach in your primary role? [{C_answer}]"
-                ]
+                self.log.error(f"Unknown role {role}")
+            d.role = role
+
+            prefs = []
+            for C, i in zip(input_courses, schema["courses_teach_primary"]):
+                answer = row[i]
                 if not answer:
-                    warn(f"{name} provided no answer for {C}, defaulting to 0")
-                    answer_num = 0
-                elif len(answer) >= 1:
-                    first = answer[0]
-                    if first in ("0", "1", "2", "3"):
-                        answer_num = int(first)
-                    else:
-                        error(f"Unexpected first char in answer: '{answer}'")
+                    self.log.warning(
+                        f"{name} provided no answer for {C}, defaulting to 0"
+                    )
+                    prefs.append(0)
+                elif answer[0] in ("0", "1", "2", "3"):
+                    prefs.append(int(answer[0]))
                 else:
-                    # should not happen
-                    error(f"Unexpected answer: '{answer}'")
-                courses_teach_primary[C] = answer_num
-                # courses_teach_primary[C] = int(row[f"What courses would you like to teach? [{C}]"][0])
+                    self.log.error(f"Unexpected first char in answer: '{answer}'")
+            courses_teach_primary = dict(zip(input_courses, prefs))
             for C, ed in self.courses_extra.items():
                 if name in ed["teachers"]:
                     courses_teach_primary[C] = 2
                 else:
                     courses_teach_primary[C] = 0
-            d["courses_teach_primary"] = courses_teach_primary
-            d["courses_teach_secondary"] = [
+            d.courses_teach_primary = courses_teach_primary
+            d.courses_teach_secondary = [
                 c.strip()
-                for c in row[
-                    "What courses would you like to teach in your secondary role?"
-                ].split(",")
+                for c in row[schema["courses_teach_secondary"]].split(",")
                 if c
             ]
             # FIXME new structure
@@ -496,69 +787,64 @@ class Input:
             #                d["courses_attend"].append("Solo - improvisation")
             #            for c in d["courses_attend"]:
             #                self.check_course(c)
-            teach_together = row["Who would you like to teach with?"]
-            d["teach_together"] = [
+            teach_together = row[schema["teach_together"]]
+            d.teach_together = [
                 self.translate_teacher_name(name.strip())
                 for name in teach_together.split(",")
                 if name
             ]
-            if name in d["teach_together"]:
-                d["teach_together"].remove(name)
-            d["teach_not_together"] = [
+            if name in d.teach_together:
+                d.teach_together.remove(name)
+            d.teach_not_together = [
                 self.translate_teacher_name(name)
-                for name in row["Are there any people you cannot teach with?"].split(
-                    ","
-                )
+                for name in row[schema["teach_not_together"]].split(",")
                 if name
             ]
-            if name in d["teach_not_together"]:
-                d["teach_not_together"].remove(name)
+            if name in d.teach_not_together:
+                d.teach_not_together.remove(name)
             if name not in self.teachers:
-                debug(f"Adding {name} to result")
+                self.log.debug(f"Adding {name} to result")
                 self.teachers.append(name)
             else:
-                warn(f"Teacher {name} already known, probably re-reading")
-
-            def ic_filter(old):
-                # TODO
-                new = old
-                if old["no_perfect"] and 3 not in courses_teach_primary.values():
-                    warn(f"ic_filter: {name}: no perfect course, zeroing.")
-                    new["no_perfect"] = 0
-                return old
+                self.log.warning(f"Teacher {name} already known, probably re-reading")
 
-            d["ic"] = ic_filter(ic)
+            # TODO
+            if ic["no_perfect"] and 3 not in courses_teach_primary.values():
+                self.log.warning(f"ic_filter: {name}: no perfect course, zeroing.")
+                ic["no_perfect"] = 0
+            d.ic = ic
             result[name] = d
-        debug(f"Number of lines: {n}")
-        debug(f"Result: {'|'.join(result)}")
+        self.log.debug(f"Number of lines: {n}")
+        self.log.debug(f"Result: {'|'.join(result)}")
         if len(self.teachers) != len(set(self.teachers)):
-            error(
+            self.log.error(
                 f"Unexpected teachers, probably duplicates in {', '.join(sorted(self.teachers))}"
             )
         # self.teachers = list(set(self.teachers))
-        debug(f"Active teachers: {self.teachers}")
+        self.log.debug(f"Active teachers: {self.teachers}")
 
         if f is not sys.stdin:
             f.close()
 
-        # print(f"Column names: {columns}")
         return result
 
-    def init_teachers_form(self, infile=None, extra_courses=[], excluded_teachers=[]):
+    def init_teachers_form(self, infile=None, extra_courses=(), excluded_teachers=()):
         teachers_data = self.read_teachers_input(
             infile, extra_courses, excluded_teachers
         )
-        debug("TEACHERS' ANSWERS:")
-        debug(pprint.pformat(teachers_data))
+        self.log.debug("TEACHERS' ANSWERS:")
+        self.log.debug(pprint.pformat(teachers_data))
         self.input_data = teachers_data
 
     def init_students_form(self, infile):
-        debug("Reading students' preferences")
+        self.log.debug("Reading students' preferences")
         students_data = self.read_students_input(infile)
-        debug("STUDENTS' ANSWERS:")
-        debug(pprint.pformat(students_data))
+        self.log.debug("STUDENTS' ANSWERS:")
+        self.log.debug(pprint.pformat(students_data))
         for k in students_data:
             self.input_data[k] = students_data[k]
+        self.students = list(students_data)
+        self.student_data = list(students_data.values())
 
     def translate_course_cs_en(self, course):
         if course == "Autentický pohyb":
@@ -567,10 +853,9 @@ class Input:
             Cstud = course
 
         result = None
-        for C in self.courses:
-            if self.is_course_type(C, Cstud):
-                # debug(f"student course {course} maps, e.g., to {C}")
-                result = Cstud
+        if self.courses_of_type(Cstud):
+            # debug(f"student course {course} maps, e.g., to {C}")
+            result = Cstud
         # if course in self.courses:
         # result = course
         #        elif course == "LH 4 - techničtější":
@@ -585,11 +870,11 @@ class Input:
             result = Cstud
         if not result:
             result = "IGNORE"
-            warn(f"Unknown student course '{course}'")
+            self.log.warning(f"Unknown student course '{course}'")
         return result
 
     def read_students_input(self, csv_file):
-        debug(f"Opening students CSV: {csv_file}")
+        self.log.debug(f"Opening students CSV: {csv_file}")
         f = open(csv_file, mode="r")
         reader = csv.DictReader(f)
 
@@ -599,79 +884,72 @@ class Input:
             n += 1
             if n == 1:
                 # check courses when handling the first row
-                debug("First row")
+                self.log.debug("First row")
             # handle the input data
             name = f"stud{n}"
-            debug(f"Reading student: {name}")
-            d = {}
-            d["type"] = "student"
+            self.log.debug(f"Reading student: {name}")
+            d = Student(name)
             provided_id = row["Kdo jsi, pokud to chceš říct?"]
             if provided_id:
-                d["provided_id"] = provided_id
+                d.provided_id = provided_id
             if provided_id == "IGNORE":
                 continue
             slots = []
             for day in ("Pondělí", "Úterý", "Středa", "Čtvrtek"):
                 daycell = row[f"Jaké dny a časy ti absolutně NEvyhovují? [{day}]"]
-                for time in ("17:30 - 18:40", "18:50 - 20:00", "20:10 - 21:20"):
-                    if time in daycell:
+                for slot_time in ("17:30 - 18:40", "18:50 - 20:00", "20:10 - 21:20"):
+                    if slot_time in daycell:
                         slots.append(0)
                     else:
                         slots.append(2)
-            debug(f"Slots: {''.join(str(s) for s in slots)}")
-            d["slots"] = slots
+            self.log.debug(f"Slots: {''.join(str(s) for s in slots)}")
+            d.slots = slots
 
             answer = row["V jaké roli si zapisuješ kurzy?"]
             if answer in ("Lead", "Follow"):
-                d["role"] = answer.lower()
+                d.role = answer.lower()
             else:
-                warn(f"Ignoring non-standard role '{answer}'")
+                self.log.warning(f"Ignoring non-standard role '{answer}'")
                 continue
 
             answer = row["Jaké kurzy si chceš zapsat?"]
             courses_attend = [c.strip() for c in answer.split(",") if c]
-            debug(f"Chosen courses: '{','.join(courses_attend)}'")
+            self.log.debug(f"Chosen courses: '{','.join(courses_attend)}'")
             if not courses_attend:
-                warn(f"No prefered courses for student {name}, ignoring the student")
+                self.log.warning(
+                    f"No prefered courses for student {name}, ignoring the student"
+                )
                 continue
                 # courses_attend = []
             if len(courses_attend) > 3:
-                warn(f"Student {name} wants more than 3 courses")
+                self.log.warning(f"Student {name} wants more than 3 courses")
             courses_attend = [
                 self.translate_course_cs_en(Ccs) for Ccs in courses_attend
             ]
             courses_attend = [C for C in courses_attend if C != "IGNORE"]
-            d["courses_attend"] = []
             for C in courses_attend:
                 if C in self.COURSES_IGNORE:
-                    debug(f"read_students_input: ignoring course explicitly {C}")
+                    self.log.debug(
+                        f"read_students_input: ignoring course explicitly {C}"
+                    )
                 elif not self.check_course(C):
-                    debug(f"read_students_input: ignoring course implicitly {C}")
+                    self.log.debug(
+                        f"read_students_input: ignoring course implicitly {C}"
+                    )
                 else:
-                    d["courses_attend"].append(C)
-            debug(f"read_students_input: courses_attend: {d['courses_attend']}")
+                    d.courses_attend.append(C)
+            self.log.debug(f"read_students_input: courses_attend: {d.courses_attend}")
             result[name] = d
 
-        debug(f"Student CSV rows: {n}")
+        self.log.debug(f"Student CSV rows: {n}")
 
         return result
 
     # SPECIFIC HARD CONSTRAINTS
     def init_rest(self):
-        # HARD teacher T can teach maximum N courses
-        self.t_util_max = {}
-        # teacher T wants to teach N courses
-        self.t_util_ideal = {}
-        # HARD teacher T can teach maximum N days
-        self.t_days_max = {}
+        # per-teacher limits and preferences are kept in self.teacher_data
         # HARD teacher T1 must not teach a course with teacher T2
         self.tt_not_together = []
-        # SOFT teacher T wants to teach a course with teachers Ts
-        self.tt_together = {}
-        # HARD teacher T cannot do anything in slots Ss
-        self.ts_pref = {}
-        # teacher T preference about teaching course C (HARD if 0)
-        self.tc_pref = {}
         # course C can be taught only by Ts
         self.ct_possible = {}
         self.ct_possible_lead = {}
@@ -679,7 +957,7 @@ class Input:
         # assert(set(self.teachers) == set(self.teachers_active))
         for C in self.courses:
             if C not in self.courses_open:
-                self.ct_possible[C] = list(set(self.teachers))
+                self.ct_possible[C] = list(self.teachers)
             if C in self.courses_regular:
                 # we will start with primary people and add sceondary later
                 self.ct_possible_lead[C] = list(self.teachers_lead_primary)
@@ -713,35 +991,34 @@ class Input:
         # self.custom_penalties = []
 
         # translate input data to variables understood by the rest of the script
-        for T in set(self.teachers):
-            debug(f"Person {T}")
-            data = self.input_data[T]
-            if data["type"] != "teacher":
-                error(f"Bad person type? {T}")
+        for data in self.teacher_data:
+            T = data.name
+            self.log.debug(f"Person {T}")
+            if not isinstance(data, Teacher):
+                self.log.error(f"Bad person type? {T}")
                 continue
-            self.t_util_max[T] = data["ncourses_max"]
-            self.t_days_max[T] = data["ndays_max"]
-            if self.t_util_max[T] == 0 or self.t_days_max[T] == 0:
+            data.util_max = data.ncourses_max
+            data.days_max = data.ndays_max
+            if data.util_max == 0 or data.days_max == 0:
                 # could be warning, it is probably legit to just say 0 max_courses/madays
                 # but if it happens, logic should be moved to CSV parsing
-                error(f"Removing (probably too late) the inactive teacher: {T}")
+                self.log.error(
+                    f"Removing (probably too late) the inactive teacher: {T}"
+                )
                 self.teachers.remove(T)
             else:
-                self.t_util_ideal[T] = data["ncourses_ideal"]
-                courses_teach_primary = data["courses_teach_primary"]
+                data.util_ideal = data.ncourses_ideal
+                courses_teach_primary = data.courses_teach_primary
                 courses_pref = {}
                 for Cgen, v in courses_teach_primary.items():
                     # debug(f"Cgen: {Cgen}")
-                    for Cspec in (
-                        self.courses_regular
-                        + self.courses_solo
-                        + self.courses_threesome
-                    ):
+                    for c in self.courses_of_type(Cgen):
+                        Cspec = self.courses[c]
                         # debug(f"Cspec 1: {Cspec}")
-                        if self.is_course_type(Cspec, Cgen):
+                        if Cspec not in self.courses_open:
                             # debug(f"Cspec 2: {Cspec}")
                             courses_pref[Cspec] = v
-                            debug(f"courses_pref[{Cspec}] = {v}")
+                            self.log.debug(f"courses_pref[{Cspec}] = {v}")
                             if v == 0:
                                 # debug(f"Cspec 3: {Cspec}")
                                 # HARD preference
@@ -759,7 +1036,9 @@ class Input:
                                                 T not in self.ct_possible_follow[Cspec]
                                             )
                                     else:
-                                        error(f"No primary role for teacher {T}")
+                                        self.log.error(
+                                            f"No primary role for teacher {T}"
+                                        )
                                 elif Cspec in (
                                     self.courses_solo + self.courses_threesome
                                 ):
@@ -767,56 +1046,147 @@ class Input:
                                         self.ct_possible[Cspec].remove(T)
                                         assert T not in self.ct_possible[Cspec]
                                 else:
-                                    error(
+                                    self.log.error(
                                         f"Course {Cspec} is neither regular nor solo/threesome"
                                     )
                             elif v <= 3:
                                 pass
                             else:
-                                error(
+                                self.log.error(
                                     f"Unexpected primary course preference value: teacher {T} course {Cgen} value {v}"
                                 )
-                for Cgen in data["courses_teach_secondary"]:
-                    for (
-                        Cspec
-                    ) in self.courses_regular:  # does not make sense for solo courses
-                        if self.is_course_type(Cspec, Cgen):
+                for Cgen in data.courses_teach_secondary:
+                    for c in self.courses_of_type(Cgen):
+                        Cspec = self.courses[c]
+                        # does not make sense for solo courses
+                        if Cspec in self.courses_regular:
                             if T in self.teachers_lead_primary:
                                 if T not in self.ct_possible_follow[Cspec]:
-                                    debug(f"Appending to {Cspec}: follow {T}")
+                                    self.log.debug(f"Appending to {Cspec}: follow {T}")
                                     self.ct_possible_follow[Cspec].append(T)
                                     assert T in self.ct_possible_follow[Cspec]
                             elif T in self.teachers_follow_primary:
                                 if T not in self.ct_possible_lead[Cspec]:
-                                    debug(f"Appending to {Cspec}: lead {T}")
+                                    self.log.debug(f"Appending to {Cspec}: lead {T}")
                                     self.ct_possible_lead[Cspec].append(T)
                                     assert T in self.ct_possible_lead[Cspec]
                             else:
-                                error(f"No primary role for teacher {T}")
-                self.tc_pref[T] = courses_pref
-                for d in data["teach_not_together"]:
-                    if d in self.input_data:
+                                self.log.error(f"No primary role for teacher {T}")
+                data.courses_pref = courses_pref
+                for d in data.teach_not_together:
+                    if d in self.Teachers:
                         self.tt_not_together.append((T, d))
                     else:
-                        debug(f"Inactive teacher {d} (tt_not_together), ignoring")
+                        self.log.debug(
+                            f"Inactive teacher {d} (tt_not_together), ignoring"
+                        )
                 ls = []
-                for d in data["teach_together"]:
-                    if d in self.input_data:
-                        ls.append(d)
+                for d in data.teach_together:
+                    if d in self.Teachers:
+                        ls.append(self.Teachers[d])
                     else:
-                        debug(f"Inactive teacher {d} (tt_together), ignoring")
-                self.tt_together[T] = ls
-            self.ts_pref[T] = data["slots"]
-            assert len(self.ts_pref[T]) == len(self.slots)
-        debug("CT_POSSIBLE:")
+                        self.log.debug(f"Inactive teacher {d} (tt_together), ignoring")
+                data.together = ls
+            assert len(data.slots) == len(self.slots)
+        self.log.debug("CT_POSSIBLE:")
         for C in self.courses_regular + self.courses_solo + self.courses_threesome:
-            debug(f"ct_possible {C}: {', '.join(self.ct_possible[C])}")
+            self.log.debug(f"ct_possible {C}: {', '.join(self.ct_possible[C])}")
             if C in self.courses_regular:
-                debug(f"ct_possible_lead {C}: {', '.join(self.ct_possible_lead[C])}")
-                debug(
+                self.log.debug(
+                    f"ct_possible_lead {C}: {', '.join(self.ct_possible_lead[C])}"
+                )
+                self.log.debug(
                     f"ct_possible_follow {C}: {', '.join(self.ct_possible_follow[C])}"
                 )
             # attendance done directly through input_data
+        self.init_masks()
+
+    def init_masks(self):
+        for Td in self.teacher_data:
+            Td.slots_possible = slot_mask(Td.slots, lambda v: v > 0)
+            Td.slots_bad = slot_mask(Td.slots, lambda v: v == 1)
+            Td.slots_perfect = slot_mask(Td.slots, lambda v: v == 3)
+        for Sd in self.student_data:
+            Sd.slots_possible = slot_mask(Sd.slots, lambda v: v != 0)
+        self.slots_all = (1 << len(self.slots)) - 1
+        # slot S -> bitmask of teachers / students available in S
+        self.slot_teachers = [0] * len(self.slots)
+        for t, Td in enumerate(self.teacher_data):
+            for s in bits(Td.slots_possible):
+                self.slot_teachers[s] |= 1 << t
+        self.slot_students = [0] * len(self.slots)
+        for i, Sd in enumerate(self.student_data):
+            for s in bits(Sd.slots_possible):
+                self.slot_students[s] |= 1 << i
+        # course C -> bitmask of students who want to attend it
+        self.course_students = [0] * len(self.courses)
+        for i, Sd in enumerate(self.student_data):
+            for C in Sd.courses_attend:
+                for c in self.courses_of_type(C):
+                    self.course_students[c] |= 1 << i
+
+    def common_free_slots(self, t1, t2):
+        # e.g. lead and follow of one course
+        d = self.teacher_data
+        return d[t1].slots_possible & d[t2].slots_possible
+
+    def teachers_free(self, s):
+        return self.slot_teachers[s]
+
+    def students_free_for(self, c, s=None):
+        # students who want course C and (optionally) can attend it in slot S
+        if s is None:
+            return self.course_students[c]
+        return self.course_students[c] & self.slot_students[s]
+
+    # problems of the input found without building the model
+    def validate(self):
+        problems = []
+        for Td in self.teacher_data:
+            T = Td.name
+            # courses not offered now are fine, just reported
+            for Cgen in list(Td.courses_teach_primary) + Td.courses_teach_secondary:
+                self.check_course(Cgen)
+            if not Td.slots_possible:
+                problems.append(f"Teacher {T}: no possible slot")
+            if Td.util_ideal > Td.util_max:
+                problems.append(
+                    f"Teacher {T}: ideally {Td.util_ideal} courses, at most {Td.util_max}"
+                )
+            if not any(
+                T in self.ct_possible_lead[C] or T in self.ct_possible_follow[C]
+                for C in self.courses_regular
+            ) and not any(
+                T in self.ct_possible[C]
+                for C in self.courses_solo + self.courses_threesome
+            ):
+                problems.append(f"Teacher {T}: cannot teach any course")
+        for C in self.courses:
+            if C in self.courses_open:
+                continue
+            if C in self.courses_regular:
+                ls = []
+                if not self.ct_possible_lead[C]:
+                    ls.append("lead")
+                if not self.ct_possible_follow[C]:
+                    ls.append("follow")
+            elif C in self.courses_threesome:
+                ls = ["teachers"] if len(self.ct_possible[C]) < 3 else []
+            else:
+                ls = [] if self.ct_possible[C] else ["teacher"]
+            if ls:
+                m = f"Course {C}: no possible {' and '.join(ls)}"
+                if C in self.courses_must_open:
+                    problems.append(m)
+                else:
+                    self.log.info(m)
+        for Sd in self.student_data:
+            for C in Sd.courses_attend:
+                if not self.courses_of_type(C):
+                    problems.append(f"Student {Sd.name}: unknown course '{C}'")
+            if not Sd.slots_possible:
+                problems.append(f"Student {Sd.name}: no possible slot")
+        return problems
 
     def init_penalties(self, penalties):
         # "name" -> coeff
@@ -848,27 +1218,317 @@ class Input:
             "heavy": 1000000,
             "very_heavy": 100000000,
             "teacher": 1000,
+            # repair mode, per changed variable (a moved course changes two)
+            "repair_course": 200,
+            "repair_teacher": 100,
         }
         # self.BOOSTER = 2
 
         # user input penalties
-        for k, v in penalties.items():
+        for k, v in (penalties or {}).items():
             if k not in self.PENALTIES:
-                error(f"Unknown penalty {k}")
+                self.log.error(f"Unknown penalty {k}")
             else:
                 self.PENALTIES[k] = v
 
 
+# A schedule in course-indexed integer arrays, -1 stands for none:
+#   slot[c], room[c]      where course c takes place, -1 if it does not open
+#   teachers[c]           its teachers, lead and follow first in couple courses
+#   teacher_penalties[t, k]  the penalty of teacher t of kind
+#                            TEACHER_PENALTIES[k]
+# Solved results carry status, objective, bound, wall_time and penalties
+# (the values of Model.penalties) as well.
 class Result:
+    MAX_TEACHERS = 3  # threesome courses
+    # the keys of Model.penalties["teacher"][T], see Model.init_teacher_penalties
+    TEACHER_PENALTIES = (
+        "1more",
+        "2more",
+        "1less",
+        "3c1d",
+        "2c2d",
+        "not_teaching",
+        "tt",
+        "split",
+        "bad_time",
+        "bad_course",
+        "no_perfect",
+        "no_person",
+        "special",
+    )
+
+    def __init__(self, In):
+        import_numpy()
+        self.n_slots = len(In.slots)
+        self.n_rooms = len(In.rooms)
+        self.n_teachers = len(In.teachers)
+        self.couple = np.array([C in In.courses_regular for C in In.courses])
+        self.slot = np.full(len(In.courses), -1)
+        self.room = np.full(len(In.courses), -1)
+        self.teachers = np.full((len(In.courses), self.MAX_TEACHERS), -1)
+        self.teacher_penalties = np.zeros(
+            (self.n_teachers, len(self.TEACHER_PENALTIES)), dtype=int
+        )
+        self.penalties = {}
+
+    # Results loaded from the cache need NumPy as well
+    def __setstate__(self, state):
+        import_numpy()
+        self.__dict__.update(state)
+
+    # set penalties and teacher_penalties from the values of Model.penalties
+    def set_penalties(self, penalties, In):
+        self.penalties = penalties
+        for T, d in penalties.get("teacher", {}).items():
+            t = In.Teachers[T]
+            for k, kind in enumerate(self.TEACHER_PENALTIES):
+                self.teacher_penalties[t, k] = d.get(kind, 0)
+
+    # set from the values of the decision variables of Model
+    def set_variables(self, src, tc, tc_lead, tc_follow):
+        for s, r, c in np.argwhere(src):
+            self.slot[c] = s
+            self.room[c] = r
+        for c in np.flatnonzero(self.slot >= 0):
+            if self.couple[c]:
+                Ts = [tc_lead[:, c].argmax(), tc_follow[:, c].argmax()]
+            else:
+                Ts = np.flatnonzero(tc[:, c])
+            self.teachers[c, : len(Ts)] = Ts
+
+    # values of the decision variables of Model, e.g. for hints
+    def variables(self):
+        C = len(self.slot)
+        src = np.zeros((self.n_slots, self.n_rooms, C), dtype=int)
+        cs = np.flatnonzero(self.slot >= 0)
+        src[self.slot[cs], self.room[cs], cs] = 1
+        tc = np.zeros((self.n_teachers, C), dtype=int)
+        cs, i = np.nonzero(self.teachers >= 0)
+        tc[self.teachers[cs, i], cs] = 1
+        V = {"src": src, "tc": tc}
+        for i, name in enumerate(("tc_lead", "tc_follow")):
+            V[name] = np.zeros_like(tc)
+            cs = np.flatnonzero(self.couple & (self.teachers[:, i] >= 0))
+            V[name][self.teachers[cs, i], cs] = 1
+        return V
+
+    # open courses ordered by slot and room
+    def courses(self):
+        cs = np.flatnonzero(self.slot >= 0)
+        return cs[np.lexsort((cs, self.room[cs], self.slot[cs]))]
+
+
+# proto index of a model variable, used when storing Model
+class VarIndex(int):
     pass
 
 
+def vars_to_indices(x):
+    if isinstance(x, cp_model.IntVar):
+        return VarIndex(x.Index())
+    if isinstance(x, dict):
+        return {k: vars_to_indices(v) for k, v in x.items()}
+    if isinstance(x, list):
+        return [vars_to_indices(v) for v in x]
+    return x
+
+
+# values of the variables in x, values is the solution of the response proto
+def solution_values(values, x):
+    if isinstance(x, cp_model.IntVar):
+        return values[x.Index()]
+    if isinstance(x, dict):
+        return {k: solution_values(values, v) for k, v in x.items()}
+    if isinstance(x, list):
+        return [solution_values(values, v) for v in x]
+    return x
+
+
+def indices_to_vars(model, x):
+    if isinstance(x, VarIndex):
+        return model.GetIntVarFromProtoIndex(x)
+    if isinstance(x, dict):
+        return {k: indices_to_vars(model, v) for k, v in x.items()}
+    if isinstance(x, list):
+        return [indices_to_vars(model, v) for v in x]
+    return x
+
+
+# share of the constraints and variables of a model left behind by updates at
+# which it is rebuilt from scratch instead, see Model.build
+MAX_GARBAGE = 0.25
+CHECKPOINT_INTERVAL = 10  # seconds, see Model.run_checkpointed
+RESUME_MIN_TIME = 1  # seconds to finish a resumed solve out of time
+
+
 class Model:
+    # Input attributes given by the teachers' answers, see teacher_block
+    TEACHER_ANSWERS = (
+        "cache_key",
+        "input_data",
+        "teacher_data",
+        "ct_possible",
+        "ct_possible_lead",
+        "ct_possible_follow",
+        "tt_not_together",
+        "slot_teachers",
+        "course_types",
+    )
+
+    # construct the whole model (including the objective) or load it from cache
+    #
+    # The cached model is keyed by everything but the teachers' answers. When
+    # only some teachers changed their answers, just their blocks are rebuilt.
+    def build(self, In, cache=False):
+        self.log = In.log
+        self.cache_key = None
+        self.num_workers = None  # of the solver, all cores by default
+        if cache and In.cache_key is not None:
+            from swing_schedule import cache as model_cache
+
+            key, teacher_keys = self.signature(In)
+            state = model_cache.load("model", key, self.log)
+            changed = []
+            if state is not None:
+                self.load_state(In, state)
+                changed = [
+                    T for T in In.teachers if self.teacher_keys[T] != teacher_keys[T]
+                ]
+                if changed:
+                    self.log.info(
+                        f"Model loaded from cache, rebuilding {', '.join(changed)}"
+                    )
+                    self.update(changed)
+                else:
+                    self.log.info("Model loaded from cache")
+            if state is not None and self.garbage > MAX_GARBAGE * self.size():
+                # the stored proto would keep growing with every update
+                self.log.info("Rebuilding the whole model to drop replaced parts")
+                state = None
+            if state is None:
+                self.init(In)
+                self.init_penalties()
+                self.block(("objective",), self.final_penalties)
+            if state is None or changed:
+                self.teacher_keys = teacher_keys
+                model_cache.store("model", key, self.dump_state(), self.log)
+            # identifies the exact model, e.g. for the results cache
+            self.cache_key = model_cache.key(key, sorted(teacher_keys.items()))
+            return
+        self.init(In)
+        self.init_penalties()
+        self.block(("objective",), self.final_penalties)
+
+    def signature(self, In):
+        from swing_schedule import cache as model_cache
+
+        common = {
+            k: v
+            for k, v in In.__dict__.items()
+            if k not in self.TEACHER_ANSWERS and k != "log"
+        }
+        key = model_cache.key(
+            "model",
+            model_cache.package_version(),
+            sorted(common.items()),
+            # roles affect constraints of all courses
+            [Td.role for Td in In.teacher_data],
+        )
+        teacher_keys = {Td.name: model_cache.key(Td) for Td in In.teacher_data}
+        return key, teacher_keys
+
+    # number of constraints and variables of the model
+    def size(self):
+        proto = self.model.Proto()
+        return len(proto.constraints) + len(proto.variables)
+
+    # run build(*args) and remember the constraints, variables and rules it adds
+    def block(self, name, build, *args):
+        proto = self.model.Proto()
+        start = len(proto.constraints)
+        variables = len(proto.variables)
+        rules_before = {typ: len(self.penalties[typ]) for typ in self.RULES}
+        build(*args)
+        rules = [
+            (typ, rule)
+            for typ in self.RULES
+            for rule in list(self.penalties[typ])[rules_before[typ] :]
+        ]
+        added = len(proto.variables) - variables
+        self.blocks[name] = (start, len(proto.constraints), added, rules)
+
+    # remove everything added by block(name, ...)
+    #
+    # The proto cannot drop its items, so the constraints of the block are left
+    # empty and its variables unconstrained (presolve drops both). They are
+    # counted in garbage, see build.
+    def clear_block(self, name):
+        start, end, added, rules = self.blocks.pop(name)
+        constraints = self.model.Proto().constraints
+        for i in range(start, end):
+            constraints[i].copy_from(cp_model_helper.ConstraintProto())
+        self.garbage += end - start + added
+        for typ, rule in rules:
+            del self.penalties[typ][rule]
+
+    # rebuild the blocks given by the answers of teachers Ts
+    def update(self, Ts):
+        In = self.In
+        self.clear_block(("objective",))
+        for T in Ts:
+            t = In.Teachers[T]
+            self.log.debug(f"Model: rebuilding teacher {T}")
+            self.clear_block(("teacher", T))
+            self.block(("teacher", T), self.init_teacher, t)
+            if ("teacher_penalties", T) in self.blocks:
+                self.clear_block(("teacher_penalties", T))
+                self.block(
+                    ("teacher_penalties", T),
+                    self.init_teacher_penalties,
+                    t,
+                    In.PENALTIES["teacher"],
+                )
+        self.block(("objective",), self.final_penalties)
+
+    def dump_state(self):
+        state = {}
+        for k, v in self.__dict__.items():
+            if k not in ("In", "model", "log"):
+                state[k] = vars_to_indices(v)
+        # the proto can only be (de)serialized in the text format
+        state["model"] = zlib.compress(str(self.model.Proto()).encode(), 1)
+        return state
+
+    def load_state(self, In, state):
+        import_ortools()
+        self.In = In
+        self.log = In.log
+        proto = cp_model_helper.CpModelProto()
+        proto.parse_text_format(zlib.decompress(state["model"]).decode())
+        self.model = cp_model.CpModel(proto)
+        for k, v in state.items():
+            if k != "model":
+                setattr(self, k, indices_to_vars(self.model, v))
+
+    # independent copy, e.g. to add hints or constraints for a single solve
+    def clone(self):
+        M = Model()
+        M.In = self.In
+        M.model = self.model.Clone()
+        for k, v in self.__dict__.items():
+            if k not in ("In", "model"):
+                setattr(M, k, indices_to_vars(M.model, vars_to_indices(v)))
+        return M
+
     def init(self, In):
+        import_ortools()
         self.In = In
+        self.log = In.log
 
         model = cp_model.CpModel()
         self.model = model
+        self.indices = None  # see index_arrays
 
         # course C takes place in slot S in room R
         self.src = {}
@@ -1098,22 +1758,8 @@ class Model:
         #                model.Add(sum(self.ps[(p,s)] for s in range(d*len(In.times), (d+1)*len(In.times))) >= 1).OnlyEnforceIf(self.pd[(p,d)])
         #                model.Add(sum(self.ps[(p,s)] for s in range(d*len(In.times), (d+1)*len(In.times))) == 0).OnlyEnforceIf(self.pd[(p,d)].Not())
         #
-        # when do we consider person occupied according to slot preferences
-        occ_thres = 0
         for s in range(len(In.slots)):
-            for P in In.people:
-                # FIXME
-                p = In.Teachers[P]  # only teachers are people for now
-                model.Add(In.ts_pref[P][s] <= occ_thres).OnlyEnforceIf(
-                    self.ps_occupied[(p, s)]
-                )
-                model.Add(In.ts_pref[P][s] > occ_thres).OnlyEnforceIf(
-                    self.ps_occupied[(p, s)].Not()
-                )
-
-        for s in range(len(In.slots)):
-            for P in In.people:
-                p = In.Teachers[P]  # only teachers are people for now
+            for p in range(len(In.teachers)):  # only teachers are people for now
                 model.AddBoolOr(
                     [self.ts[(p, s)], self.ps_occupied[(p, s)]]
                 ).OnlyEnforceIf(self.ps_na[(p, s)])
@@ -1230,7 +1876,9 @@ class Model:
         for c in range(len(In.courses)):
             # TODO this is probably the crucial spot to solve courses discrepancy
             if In.courses[c] not in In.COURSES_IGNORE:
-                debug(f"Not ignoring one-place-time constraing for {In.courses[c]}")
+                self.log.debug(
+                    f"Not ignoring one-place-time constraing for {In.courses[c]}"
+                )
                 model.Add(
                     sum(
                         self.src[(s, r, c)]
@@ -1249,7 +1897,9 @@ class Model:
                 ).OnlyEnforceIf(self.c_active[c].Not())
             else:
                 # assert that In.courses contains only non-ignored courses
-                error(f"Ignoring one-place-time constraing for {In.courses[c]}")
+                self.log.error(
+                    f"Ignoring one-place-time constraing for {In.courses[c]}"
+                )
 
         # at one time in one room, there is maximum one course
         for s in range(len(In.slots)):
@@ -1257,49 +1907,28 @@ class Model:
                 model.Add(sum(self.src[(s, r, c)] for c in range(len(In.courses))) <= 1)
 
         # every regular course is taught by two teachers and solo course by one teacher
+        teachers_lead = [t for t, Td in enumerate(In.teacher_data) if Td.role == "lead"]
+        teachers_follow = [
+            t for t, Td in enumerate(In.teacher_data) if Td.role == "follow"
+        ]
         for c in range(len(In.courses)):
+            n_teachers = sum(self.tc[(t, c)] for t in range(len(In.teachers)))
             if In.courses[c] in In.COURSES_IGNORE:
                 # assert that In.courses contains only non-ignored courses
-                error(f"Course {In.courses[c]} should be ignored")
+                self.log.error(f"Course {In.courses[c]} should be ignored")
             elif In.courses[c] in In.courses_regular:
-                model.Add(
-                    sum(
-                        self.tc[(In.Teachers[T], c)]
-                        for T in In.teachers
-                        if T in In.teachers_lead
-                    )
-                    <= 1
-                )
-                model.Add(
-                    sum(
-                        self.tc[(In.Teachers[T], c)]
-                        for T in In.teachers
-                        if T in In.teachers_follow
-                    )
-                    <= 1
-                )
-                model.Add(
-                    sum(self.tc[(In.Teachers[T], c)] for T in In.teachers) == 2
-                ).OnlyEnforceIf(self.c_active[c])
-                model.Add(
-                    sum(self.tc[(In.Teachers[T], c)] for T in In.teachers) == 0
-                ).OnlyEnforceIf(self.c_active[c].Not())
+                model.Add(sum(self.tc[(t, c)] for t in teachers_lead) <= 1)
+                model.Add(sum(self.tc[(t, c)] for t in teachers_follow) <= 1)
+                model.Add(n_teachers == 2).OnlyEnforceIf(self.c_active[c])
+                model.Add(n_teachers == 0).OnlyEnforceIf(self.c_active[c].Not())
             elif In.courses[c] in In.courses_solo:
-                model.Add(
-                    sum(self.tc[(In.Teachers[T], c)] for T in In.teachers) == 1
-                ).OnlyEnforceIf(self.c_active[c])
-                model.Add(
-                    sum(self.tc[(In.Teachers[T], c)] for T in In.teachers) == 0
-                ).OnlyEnforceIf(self.c_active[c].Not())
+                model.Add(n_teachers == 1).OnlyEnforceIf(self.c_active[c])
+                model.Add(n_teachers == 0).OnlyEnforceIf(self.c_active[c].Not())
             elif In.courses[c] in In.courses_threesome:
-                model.Add(
-                    sum(self.tc[(In.Teachers[T], c)] for T in In.teachers) == 3
-                ).OnlyEnforceIf(self.c_active[c])
-                model.Add(
-                    sum(self.tc[(In.Teachers[T], c)] for T in In.teachers) == 0
-                ).OnlyEnforceIf(self.c_active[c].Not())
+                model.Add(n_teachers == 3).OnlyEnforceIf(self.c_active[c])
+                model.Add(n_teachers == 0).OnlyEnforceIf(self.c_active[c].Not())
             elif In.courses[c] in In.courses_open:
-                model.Add(sum(self.tc[(In.Teachers[T], c)] for T in In.teachers) == 0)
+                model.Add(n_teachers == 0)
             else:
                 assert False
 
@@ -1311,111 +1940,55 @@ class Model:
         self.penalties["custom"] = {}
         self.penalties["nice"] = {}
 
-        for T in In.teachers:
-            debug(f"Teacher max: {T} {In.t_util_max.get(T, -1)}")
-            # unspecified teachers teach no courses
-            self.add_heavy(
-                f"{T}-ncourses",
-                sum(self.tc[(In.Teachers[T], c)] for c in range(len(In.courses)))
-                <= In.t_util_max.get(T, 0),
-            )
-            self.add_heavy(
-                f"{T}-ndays",
-                sum(self.td[(In.Teachers[T], d)] for d in range(len(In.days)))
-                <= In.t_days_max.get(T, 0),
-            )
+        self.blocks = {}
+        self.garbage = 0  # constraints and variables left by clear_block
+        for t, T in enumerate(In.teachers):
+            self.block(("teacher", T), self.init_teacher, t)
 
-        info(f"Courses that must open: {', '.join(In.courses_must_open)}")
+        self.log.info(f"Courses that must open: {', '.join(In.courses_must_open)}")
         for C in In.courses_must_open:
             self.add_heavy(f"mustopen-{C}", self.c_active[In.Courses[C]] == 1)
 
         for C in In.courses_not_open:
             self.add_heavy(f"notopen-{C}", self.c_active[In.Courses[C]] == 0)
 
-        teachers_all = set(range(len(In.teachers)))
-        for C, Ts in In.ct_possible.items():
-            c = In.Courses[C]
-            teachers_can = []
-            for T in Ts:
-                t = In.Teachers[T]
-                teachers_can.append(t)
-            teachers_not = teachers_all - set(teachers_can)
-            # no other teacher can teach C
-            model.Add(sum(self.tc[(t, c)] for t in teachers_not) == 0)
-        for C, Ts in In.ct_possible_lead.items():
-            c = In.Courses[C]
-            teachers_can = []
-            for T in Ts:
-                t = In.Teachers[T]
-                teachers_can.append(t)
-            teachers_not = teachers_all - set(teachers_can)
-            # no other teacher can teach C
-            model.Add(sum(self.tc_lead[(t, c)] for t in teachers_not) == 0)
-        for C, Ts in In.ct_possible_follow.items():
-            c = In.Courses[C]
-            teachers_can = []
-            for T in Ts:
-                t = In.Teachers[T]
-                teachers_can.append(t)
-            teachers_not = teachers_all - set(teachers_can)
-            # no other teacher can teach C
-            model.Add(sum(self.tc_follow[(t, c)] for t in teachers_not) == 0)
-
-        for T1, T2 in set(In.tt_not_together):
-            for c in range(len(In.courses)):
-                # model.Add(sum(self.tc[(t,c)] for t in [In.Teachers[T1], In.Teachers[T2]]) < 2)
-                self.add_heavy(
-                    f"tt_not/{T1}+{T2}/{In.courses[c]}".replace(" ", "-"),
-                    sum(self.tc[(t, c)] for t in [In.Teachers[T1], In.Teachers[T2]])
-                    < 2,
-                )
-
         # TODO: this should be loosened, also wrt. attending
         # teacher T does not teach in two venues in the same day
         for t in range(len(In.teachers)):
             for d in range(len(In.days)):
                 model.Add(sum(self.tdv[(t, d, v)] for v in range(len(In.venues))) <= 1)
 
-        # teachers HARD slot preferences
-        for T in In.teachers:
-            if T in In.ts_pref:  # TODO what about people without preferences?
-                for s, v in enumerate(In.ts_pref[T]):
-                    if v == 0:
-                        model.Add(self.ts[(In.Teachers[T], s)] == 0)
-            else:
-                warn(f"No slot preferences for teacher {T}")
-
         # strict course -> slot mapping
-        debug(f"In.courses_slots_strict: {In.courses_slots_strict}")
+        self.log.debug(f"In.courses_slots_strict: {In.courses_slots_strict}")
         for C, s in In.courses_slots_strict.items():
             self.add_heavy(f"cs-strict-{C}", self.cs[In.Courses[C]] == s)
 
         # same courses should not happen in same days and also not in same times
         # it should probably not be a strict limitation, but it is much easier to write
         # TODO could be turned into heavy penalty, but probably later in the process (after init_penalties)
-        debug("courses_different")
+        self.log.debug("courses_different")
         for Cs in In.courses_different:
-            debug(f"courses_different: Cs: {Cs}")
+            self.log.debug(f"courses_different: Cs: {Cs}")
             daylist = []  # days
             timelist = []  # times
             courselist = []
             # assert(2 <= len(Cs) <= min(len(In.days), len(In.times)))
             assert 2 <= len(Cs)
             if len(Cs) > 3:
-                error(
+                self.log.error(
                     "courses_different does not work for more than 3 courses, to be fixed"
                 )
             for C in Cs:
                 c = In.Courses[C]
-                debug(f"courses_different: C: {C} ({c})")
+                self.log.debug(f"courses_different: C: {C} ({c})")
                 day = model.NewIntVar(-1, len(In.days) - 1, "")
                 time = model.NewIntVar(-1, len(In.times) - 1, "")
                 model.AddDivisionEquality(day, self.cs[c], len(In.times))
                 model.AddModuloEquality(time, self.cs[c], len(In.times))
-                debug(f"courses_different: courselist: {courselist}")
+                self.log.debug(f"courses_different: courselist: {courselist}")
                 for i in range(len(courselist)):
                     co = courselist[i]
-                    debug(f"courses_different: co: {co} ({In.courses[co]})")
+                    self.log.debug(f"courses_different: co: {co} ({In.courses[co]})")
                     D = daylist[i]
                     T = timelist[i]
                     model.Add(day != D).OnlyEnforceIf(
@@ -1427,7 +2000,7 @@ class Model:
                 courselist.append(c)
                 daylist.append(day)
                 timelist.append(time)
-            debug("")
+            self.log.debug("")
             # old version of these constraints
             # model.AddAllDifferent(daylist)
             # model.AddAllDifferent(timelist)
@@ -1498,8 +2071,57 @@ class Model:
         self.custom_penalties = {}
         # self.heavy_penalties = {}
 
+    # constraints given by the answers of teacher T
+    def init_teacher(self, t):
+        In = self.In
+        model = self.model
+        Td = In.teacher_data[t]
+        T = Td.name
+
+        self.log.debug(f"Teacher max: {T} {Td.util_max}")
+        # unspecified teachers teach no courses
+        self.add_heavy(
+            f"{T}-ncourses",
+            sum(self.tc[(t, c)] for c in range(len(In.courses))) <= Td.util_max,
+        )
+        self.add_heavy(
+            f"{T}-ndays",
+            sum(self.td[(t, d)] for d in range(len(In.days))) <= Td.days_max,
+        )
+
+        # T cannot teach C (in the role) unless listed in ct_possible
+        for C, Ts in In.ct_possible.items():
+            if T not in Ts:
+                model.Add(self.tc[(t, In.Courses[C])] == 0)
+        for C, Ts in In.ct_possible_lead.items():
+            if T not in Ts:
+                model.Add(self.tc_lead[(t, In.Courses[C])] == 0)
+        for C, Ts in In.ct_possible_follow.items():
+            if T not in Ts:
+                model.Add(self.tc_follow[(t, In.Courses[C])] == 0)
+
+        for T2 in sorted({T2 for T1, T2 in In.tt_not_together if T1 == T}):
+            for c in range(len(In.courses)):
+                # model.Add(sum(self.tc[(t,c)] for t in [In.Teachers[T1], In.Teachers[T2]]) < 2)
+                self.add_heavy(
+                    f"tt_not/{T}+{T2}/{In.courses[c]}".replace(" ", "-"),
+                    self.tc[(t, c)] + self.tc[(In.Teachers[T2], c)] < 2,
+                )
+
+        # person is occupied according to slot preferences in "0 - not possible" slots
+        # FIXME only teachers are people for now
+        for s in range(len(In.slots)):
+            model.Add(self.ps_occupied[(t, s)] == (Td.slots_possible >> s & 1 == 0))
+
+        # teachers HARD slot preferences
+        if Td.slots:  # TODO what about people without preferences?
+            for s in bits(In.slots_all & ~Td.slots_possible):
+                model.Add(self.ts[(t, s)] == 0)
+        else:
+            self.log.warning(f"No slot preferences for teacher {T}")
+
     def init_penalties(self):
-        debug("Model: init_penalties")
+        self.log.debug("Model: init_penalties")
         In = self.In
         M = self
         model = self.model
@@ -1507,292 +2129,21 @@ class Model:
         # OPTIMIZATION
 
         self.wish = {}
-        for T in In.Teachers:
+        for T in In.teachers:
             self.wish[T] = model.NewBoolVar("")
 
         penalties_analysis = {}  # deeper analysis functions for penalties # TODO remove
 
         for name, coeff in In.PENALTIES.items():
             if coeff == 0:
-                warn(f"Penalties: skipping '{name}'")
+                self.log.warning(f"Penalties: skipping '{name}'")
                 continue
             if name == "teacher":
                 self.penalties["teacher"] = {}
-                total_teacher = coeff
-
-                for T in In.Teachers:
-                    t = In.Teachers[T]
-                    self.penalties["teacher"][T] = {}
-
-                    # precompute real penalty weigths
-                    ic = In.input_data[T]["ic"]
-                    total_ic = sum(ic.values())
-                    if total_ic == 0:
-                        # this is the case when a person does not mind anything
-                        total_ic = 1
-                    icw = {}  # weigths
-                    for k, v in ic.items():
-                        icw[k] = total_teacher * v // total_ic
-                        debug(f"teacher {T} pen. {k}: {ic[k]} -> {icw[k]}")
-
-                    # utilization
-
-                    # utilization - general
-                    util_ideal = In.t_util_ideal[T]
-                    MAX_DIFF = 10  # set according to preferences form
-                    util_diff = model.NewIntVar(-MAX_DIFF, MAX_DIFF, "")
-                    model.Add(util_diff == M.teach_num[t] - util_ideal)
-
-                    # utilization - 1more
-                    util_diff_pos = model.NewIntVar(0, MAX_DIFF, "")
-                    model.AddMaxEquality(util_diff_pos, [0, util_diff])
-                    more1_max = icw["1more"]
-                    more1 = model.NewIntVar(0, more1_max, "")
-                    zero1 = model.NewBoolVar("")
-                    model.Add(util_diff_pos <= 0).OnlyEnforceIf(zero1)
-                    model.Add(util_diff_pos >= 1).OnlyEnforceIf(zero1.Not())
-                    model.Add(more1 == 0).OnlyEnforceIf(zero1)
-                    model.Add(more1 == more1_max).OnlyEnforceIf(zero1.Not())
-                    self.penalties["teacher"][T]["1more"] = more1
-                    # utilization - 2more
-                    more2_max = icw["2more"] * MAX_DIFF
-                    more2 = model.NewIntVar(0, more2_max, "")
-                    zero2 = model.NewBoolVar("")
-                    model.Add(util_diff_pos <= 1).OnlyEnforceIf(zero2)
-                    model.Add(util_diff_pos >= 2).OnlyEnforceIf(zero2.Not())
-                    model.Add(more2 == 0).OnlyEnforceIf(zero2)
-                    model.Add(more2 == util_diff_pos * icw["2more"]).OnlyEnforceIf(
-                        zero2.Not()
-                    )
-                    self.penalties["teacher"][T]["2more"] = more2
-
-                    # utilization - definitely not more than 2 extra courses
-                    M.add_heavy(f"3more-{T}", util_diff_pos <= 2)
-
-                    # utilization - 1 less
-                    util_diff_neg_neg = model.NewIntVar(-MAX_DIFF, 0, "")
-                    util_diff_neg = model.NewIntVar(0, MAX_DIFF, "")
-                    model.AddMinEquality(util_diff_neg_neg, [0, util_diff])
-                    model.AddAbsEquality(util_diff_neg, util_diff_neg_neg)
-                    less1 = model.NewIntVar(0, icw["1less"] * MAX_DIFF, "")
-                    model.Add(less1 == util_diff_neg * icw["1less"])
-                    self.penalties["teacher"][T]["1less"] = less1
-
-                    # utilization - definitely not less than 1 desired course
-                    M.add_heavy(f"2less-{T}", util_diff_neg <= 1)
-
-                    # 3c1d - three courses in one day
-                    p31 = model.NewIntVar(0, len(In.days) * icw["3c1d"], "")
-                    days_three_list = []
-                    for d in range(len(In.days)):
-                        # day is full (teacher teaches in all three slots)
-                        day_three = model.NewBoolVar("")
-                        model.Add(
-                            sum(M.ts[(t, s)] for s in [d * 3 + i for i in (0, 1, 2)])
-                            == 3
-                        ).OnlyEnforceIf(day_three)
-                        model.Add(
-                            sum(M.ts[(t, s)] for s in [d * 3 + i for i in (0, 1, 2)])
-                            < 3
-                        ).OnlyEnforceIf(day_three.Not())
-                        days_three_list.append(day_three)
-                    model.Add(p31 == sum(days_three_list) * icw["3c1d"])
-                    self.penalties["teacher"][T]["3c1d"] = p31
-
-                    # 2c2d - courses in more days than needed
-                    teaches_days = model.NewIntVar(0, len(In.days), "TD:%i" % t)
-                    model.Add(
-                        teaches_days == sum(M.td[(t, d)] for d in range(len(In.days)))
-                    )
-                    teaches_minus_1 = model.NewIntVar(0, len(In.slots), "Tm1:%i" % t)
-                    teaches_some = model.NewBoolVar("Ts:%i" % t)
-                    model.Add(M.teach_num[t] >= 1).OnlyEnforceIf(teaches_some)
-                    model.Add(M.teach_num[t] == 0).OnlyEnforceIf(teaches_some.Not())
-                    model.Add(teaches_minus_1 == M.teach_num[t] - 1).OnlyEnforceIf(
-                        teaches_some
+                for t, T in enumerate(In.teachers):
+                    self.block(
+                        ("teacher_penalties", T), self.init_teacher_penalties, t, coeff
                     )
-                    model.Add(teaches_minus_1 == 0).OnlyEnforceIf(teaches_some.Not())
-                    should_teach_days_minus_1 = model.NewIntVar(
-                        0, len(In.days), "TDs:%i" % t
-                    )
-                    model.AddDivisionEquality(
-                        should_teach_days_minus_1, teaches_minus_1, len(In.times)
-                    )  # -1 to compensate rounding down
-                    days_extra = model.NewIntVar(0, len(In.days), "Tdd:%i" % t)
-                    model.Add(
-                        days_extra == teaches_days - should_teach_days_minus_1 - 1
-                    ).OnlyEnforceIf(teaches_some)  # -1 to compensate rounding down
-                    model.Add(days_extra == 0).OnlyEnforceIf(teaches_some.Not())
-                    p22 = model.NewIntVar(0, icw["2c2d"] * len(In.days), "")
-                    model.Add(p22 == icw["2c2d"] * days_extra)
-                    self.penalties["teacher"][T]["2c2d"] = p22
-
-                    self.add_heavy(f"2extradays-{T}", days_extra < 2)
-
-                    # not_teaching
-                    p_not_teaching = model.NewIntVar(0, icw["not_teaching"], "")
-                    model.Add(
-                        p_not_teaching == teaches_some.Not() * icw["not_teaching"]
-                    )
-                    self.penalties["teacher"][T]["not_teaching"] = p_not_teaching
-
-                    # teaching or not being available during Teachers Training
-                    if "Teachers Training" in In.Courses and "tt" in icw:
-                        tt_map = []
-                        c = In.Courses["Teachers Training"]
-                        for s in range(len(In.slots)):
-                            hit = model.NewBoolVar("")
-                            model.Add(M.cs[c] == s).OnlyEnforceIf(hit)
-                            model.Add(M.cs[c] != s).OnlyEnforceIf(hit.Not())
-                            tt_map.append(hit)
-
-                        w = icw["tt"]
-                        ls = []
-                        for s in range(len(In.slots)):
-                            hit = model.NewBoolVar("")
-                            model.AddBoolAnd(
-                                [tt_map[s], M.ps_na[(t, s)]]
-                            ).OnlyEnforceIf(hit)
-                            model.AddBoolOr(
-                                [tt_map[s].Not(), M.ps_na[(t, s)].Not()]
-                            ).OnlyEnforceIf(hit.Not())
-                            ls.append(hit)
-                        teaches_tt = model.NewBoolVar("")
-                        c = In.Courses["Teachers Training"]
-                        model.Add(M.tc[(t, c)] == 1).OnlyEnforceIf(teaches_tt)
-                        model.Add(M.tc[(t, c)] == 0).OnlyEnforceIf(teaches_tt.Not())
-                        teaches_tt_time = model.NewBoolVar("")
-                        model.Add(teaches_tt_time == sum(ls)).OnlyEnforceIf(
-                            teaches_tt.Not()
-                        )
-                        model.Add(teaches_tt_time == 0).OnlyEnforceIf(teaches_tt)
-                        p_tt = model.NewIntVar(0, w, "")
-                        model.Add(p_tt == teaches_tt_time * w)
-                        self.penalties["teacher"][T]["tt"] = p_tt
-
-                    # split
-                    days_split = model.NewIntVar(0, len(In.days), "TDsplit:%i" % t)
-                    tsplits = []
-                    for d in range(len(In.days)):
-                        # tsplit == True iff teacher t teaches just the first and the last course in day d
-                        tsubsplits = []
-                        for i in range(len(In.times)):
-                            tsubsplit = model.NewBoolVar(
-                                "tsubsplit:t%id%ii%i" % (t, d, i)
-                            )
-                            model.Add(
-                                sum(M.ts[(t, s)] for s in [d * len(In.times) + i]) == 1
-                            ).OnlyEnforceIf(tsubsplit)
-                            model.Add(
-                                sum(M.ts[(t, s)] for s in [d * len(In.times) + i]) == 0
-                            ).OnlyEnforceIf(tsubsplit.Not())
-                            tsubsplits.append(tsubsplit)
-                        tsplit = model.NewBoolVar("tsplit:t%id%i" % (t, d))
-                        model.AddBoolAnd(
-                            [tsubsplits[0], tsubsplits[1].Not(), tsubsplits[2]]
-                        ).OnlyEnforceIf(tsplit)
-                        model.AddBoolOr(
-                            [tsubsplits[0].Not(), tsubsplits[1], tsubsplits[2].Not()]
-                        ).OnlyEnforceIf(tsplit.Not())
-                        tsplits.append(tsplit)
-                    model.Add(days_split == sum(tsplits))
-                    p_split = model.NewIntVar(0, icw["split"] * len(In.days), "")
-                    model.Add(p_split == icw["split"] * days_split)
-                    self.penalties["teacher"][T]["split"] = p_split
-
-                    # bad_time
-                    prefs = In.ts_pref[T]
-                    slots_bad = [s for s in range(len(In.slots)) if prefs[s] == 1]
-                    p_slot_bad = model.NewIntVar(0, icw["bad_time"] * 10, "")
-                    model.Add(
-                        p_slot_bad
-                        == icw["bad_time"] * sum(M.ts[(t, s)] for s in slots_bad)
-                    )
-                    self.penalties["teacher"][T]["bad_time"] = p_slot_bad
-
-                    # bad_course
-                    # teacher T strongly prefers some courses over others
-                    courses_bad = [
-                        C
-                        for C in In.courses_regular
-                        + In.courses_solo
-                        + In.courses_threesome
-                        if In.tc_pref[T].get(C, -1) == 1
-                    ]
-                    p_course_bad = model.NewIntVar(0, icw["bad_course"] * 10, "")
-                    debug(f"courses_bad {T}: {courses_bad}")
-                    model.Add(
-                        p_course_bad
-                        == icw["bad_course"]
-                        * sum(
-                            M.tc[(In.Teachers[T], In.Courses[C])] for C in courses_bad
-                        )
-                    )
-                    self.penalties["teacher"][T]["bad_course"] = p_course_bad
-
-                    # no_perfect
-                    courses_perfect = [
-                        C
-                        for C in In.courses_regular
-                        + In.courses_solo
-                        + In.courses_threesome
-                        if In.tc_pref[T].get(C, -1) == 3
-                    ]
-                    p_no_perfect = model.NewIntVar(0, icw["no_perfect"], "")
-                    debug(f"courses_perfect {T}: {courses_perfect}")
-                    teaches_perfect = model.NewIntVar(0, 10, "")
-                    model.Add(
-                        teaches_perfect
-                        == sum(
-                            M.tc[(In.Teachers[T], In.Courses[C])]
-                            for C in courses_perfect
-                        )
-                    )
-                    zero = model.NewBoolVar("")
-                    model.Add(teaches_perfect == 0).OnlyEnforceIf(zero)
-                    model.Add(teaches_perfect >= 1).OnlyEnforceIf(zero.Not())
-                    model.Add(p_no_perfect == icw["no_perfect"] * zero)
-                    self.penalties["teacher"][T]["no_perfect"] = p_no_perfect
-
-                    # no_person
-                    debug(f"teach_together: {T} + {In.tt_together[T]}")
-                    success_list = []
-                    for c in range(len(In.courses)):
-                        hit_self = model.NewBoolVar("")
-                        hit_other = model.NewBoolVar("")
-                        success = model.NewBoolVar("")
-                        model.Add(M.tc[(t, c)] == 1).OnlyEnforceIf(hit_self)
-                        model.Add(M.tc[(t, c)] == 0).OnlyEnforceIf(hit_self.Not())
-                        model.Add(
-                            sum(M.tc[(In.Teachers[To], c)] for To in In.tt_together[T])
-                            >= 1
-                        ).OnlyEnforceIf(hit_other)
-                        model.Add(
-                            sum(M.tc[(In.Teachers[To], c)] for To in In.tt_together[T])
-                            == 0
-                        ).OnlyEnforceIf(hit_other.Not())
-                        model.AddBoolAnd([hit_self, hit_other]).OnlyEnforceIf(success)
-                        model.AddBoolOr(
-                            [hit_self.Not(), hit_other.Not()]
-                        ).OnlyEnforceIf(success.Not())
-                        success_list.append(success)
-                    nobody = model.NewBoolVar("")
-                    model.Add(sum(success_list) == 0).OnlyEnforceIf(nobody)
-                    model.Add(sum(success_list) >= 1).OnlyEnforceIf(nobody.Not())
-                    if not In.tt_together[T]:
-                        debug(
-                            f"teach_together: no preference => no penalty for {T}"
-                        )  # TODO
-                    p_no_person = model.NewIntVar(0, icw["no_person"], "")
-                    model.Add(p_no_person == icw["no_person"] * nobody)
-                    self.penalties["teacher"][T]["no_person"] = p_no_person
-
-                    # special
-                    if icw["special"]:
-                        debug(f"Special wish for {T}")
-                        p_special = model.NewIntVar(0, icw["special"], "")
-                        model.Add(p_special == icw["special"] * self.wish[T])
-                        self.penalties["teacher"][T]["special"] = p_special
 
             elif name == "courses_closed":  # penalty if too little courses are opened
                 total_courseslots = 4 * 3 * 2  # days, times, rooms
@@ -1805,49 +2156,44 @@ class Model:
             elif name == "student":  # penalty if student cannot attend desired course
                 self.penalties["student"] = {}
 
-                for S, val in In.input_data.items():
-                    if val["type"] != "student":
-                        debug(f"stud_bad: skipping {S}, not a student")
-                        continue
-                    debug(f"stud_bad: student {S}")
-                    if not val["courses_attend"]:
-                        warn(f"stud_bad: skipping {S}, no courses_attend")
+                for val in In.student_data:
+                    S = val.name
+                    self.log.debug(f"stud_bad: student {S}")
+                    if not val.courses_attend:
+                        self.log.warning(f"stud_bad: skipping {S}, no courses_attend")
                         continue
-                    if "provided_id" in val:
-                        debug(f"stud_bad: provided_id '{val['provided_id']}'")
+                    if val.provided_id is not None:
+                        self.log.debug(f"stud_bad: provided_id '{val.provided_id}'")
                     else:
-                        debug("stud_bad: no id provided")
-                    debug(f"courses_attend: {val['courses_attend']}")
-                    course_weigth = 100 // len(val["courses_attend"])
+                        self.log.debug("stud_bad: no id provided")
+                    self.log.debug(f"courses_attend: {val.courses_attend}")
+                    course_weigth = 100 // len(val.courses_attend)
 
-                    courses_bad = []
                     penalties_student = {}
-                    for C in val["courses_attend"]:
-                        Cs = [
-                            Cspec for Cspec in In.courses if In.is_course_type(Cspec, C)
-                        ]
-                        if not Cs:
-                            error(f"stud_bad: no specific course found for {C}")
+                    for C in val.courses_attend:
+                        cs = In.courses_of_type(C)
+                        if not cs:
+                            self.log.error(
+                                f"stud_bad: no specific course found for {C}"
+                            )
                             continue
-                        slots_available = [
-                            s for s in range(len(In.slots)) if val["slots"][s] != 0
-                        ]
+                        slots_available = list(bits(val.slots_possible))
                         course_cannot = model.NewBoolVar("")
                         model.Add(
                             sum(
-                                M.src[(s, r, In.Courses[CC])]
+                                M.src[(s, r, c)]
                                 for s in slots_available
                                 for r in range(len(In.rooms))
-                                for CC in Cs
+                                for c in cs
                             )
                             == 0
                         ).OnlyEnforceIf(course_cannot)
                         model.Add(
                             sum(
-                                M.src[(s, r, In.Courses[CC])]
+                                M.src[(s, r, c)]
                                 for s in slots_available
                                 for r in range(len(In.rooms))
-                                for CC in Cs
+                                for c in cs
                             )
                             >= 1
                         ).OnlyEnforceIf(course_cannot.Not())
@@ -1856,17 +2202,263 @@ class Model:
                         penalties_student[C] = p_stud_course
 
                     if len(penalties_student) == 0:
-                        error(f"No student penalties for {S}")
+                        self.log.error(f"No student penalties for {S}")
                     self.penalties["student"][S] = penalties_student
 
         self.penalties_analysis = penalties_analysis
 
-        debug("Model: penalties initialized")
+        self.log.debug("Model: penalties initialized")
+
+    # soft preferences of teacher T, coeff is the weight of all of them
+    def init_teacher_penalties(self, t, coeff):
+        In = self.In
+        M = self
+        model = self.model
+        Td = In.teacher_data[t]
+        T = Td.name
+        total_teacher = coeff
+        self.penalties["teacher"][T] = {}
+
+        # precompute real penalty weigths
+        ic = Td.ic
+        total_ic = sum(ic.values())
+        if total_ic == 0:
+            # this is the case when a person does not mind anything
+            total_ic = 1
+        icw = {}  # weigths
+        for k, v in ic.items():
+            icw[k] = total_teacher * v // total_ic
+            self.log.debug(f"teacher {T} pen. {k}: {ic[k]} -> {icw[k]}")
+
+        # utilization
+
+        # utilization - general
+        util_ideal = Td.util_ideal
+        MAX_DIFF = 10  # set according to preferences form
+        util_diff = model.NewIntVar(-MAX_DIFF, MAX_DIFF, "")
+        model.Add(util_diff == M.teach_num[t] - util_ideal)
+
+        # utilization - 1more
+        util_diff_pos = model.NewIntVar(0, MAX_DIFF, "")
+        model.AddMaxEquality(util_diff_pos, [0, util_diff])
+        more1_max = icw["1more"]
+        more1 = model.NewIntVar(0, more1_max, "")
+        zero1 = model.NewBoolVar("")
+        model.Add(util_diff_pos <= 0).OnlyEnforceIf(zero1)
+        model.Add(util_diff_pos >= 1).OnlyEnforceIf(zero1.Not())
+        model.Add(more1 == 0).OnlyEnforceIf(zero1)
+        model.Add(more1 == more1_max).OnlyEnforceIf(zero1.Not())
+        self.penalties["teacher"][T]["1more"] = more1
+        # utilization - 2more
+        more2_max = icw["2more"] * MAX_DIFF
+        more2 = model.NewIntVar(0, more2_max, "")
+        zero2 = model.NewBoolVar("")
+        model.Add(util_diff_pos <= 1).OnlyEnforceIf(zero2)
+        model.Add(util_diff_pos >= 2).OnlyEnforceIf(zero2.Not())
+        model.Add(more2 == 0).OnlyEnforceIf(zero2)
+        model.Add(more2 == util_diff_pos * icw["2more"]).OnlyEnforceIf(zero2.Not())
+        self.penalties["teacher"][T]["2more"] = more2
+
+        # utilization - definitely not more than 2 extra courses
+        M.add_heavy(f"3more-{T}", util_diff_pos <= 2)
+
+        # utilization - 1 less
+        util_diff_neg_neg = model.NewIntVar(-MAX_DIFF, 0, "")
+        util_diff_neg = model.NewIntVar(0, MAX_DIFF, "")
+        model.AddMinEquality(util_diff_neg_neg, [0, util_diff])
+        model.AddAbsEquality(util_diff_neg, util_diff_neg_neg)
+        less1 = model.NewIntVar(0, icw["1less"] * MAX_DIFF, "")
+        model.Add(less1 == util_diff_neg * icw["1less"])
+        self.penalties["teacher"][T]["1less"] = less1
+
+        # utilization - definitely not less than 1 desired course
+        M.add_heavy(f"2less-{T}", util_diff_neg <= 1)
+
+        # 3c1d - three courses in one day
+        p31 = model.NewIntVar(0, len(In.days) * icw["3c1d"], "")
+        days_three_list = []
+        for d in range(len(In.days)):
+            # day is full (teacher teaches in all three slots)
+            day_three = model.NewBoolVar("")
+            model.Add(
+                sum(M.ts[(t, s)] for s in [d * 3 + i for i in (0, 1, 2)]) == 3
+            ).OnlyEnforceIf(day_three)
+            model.Add(
+                sum(M.ts[(t, s)] for s in [d * 3 + i for i in (0, 1, 2)]) < 3
+            ).OnlyEnforceIf(day_three.Not())
+            days_three_list.append(day_three)
+        model.Add(p31 == sum(days_three_list) * icw["3c1d"])
+        self.penalties["teacher"][T]["3c1d"] = p31
+
+        # 2c2d - courses in more days than needed
+        teaches_days = model.NewIntVar(0, len(In.days), "TD:%i" % t)
+        model.Add(teaches_days == sum(M.td[(t, d)] for d in range(len(In.days))))
+        teaches_minus_1 = model.NewIntVar(0, len(In.slots), "Tm1:%i" % t)
+        teaches_some = model.NewBoolVar("Ts:%i" % t)
+        model.Add(M.teach_num[t] >= 1).OnlyEnforceIf(teaches_some)
+        model.Add(M.teach_num[t] == 0).OnlyEnforceIf(teaches_some.Not())
+        model.Add(teaches_minus_1 == M.teach_num[t] - 1).OnlyEnforceIf(teaches_some)
+        model.Add(teaches_minus_1 == 0).OnlyEnforceIf(teaches_some.Not())
+        should_teach_days_minus_1 = model.NewIntVar(0, len(In.days), "TDs:%i" % t)
+        model.AddDivisionEquality(
+            should_teach_days_minus_1, teaches_minus_1, len(In.times)
+        )  # -1 to compensate rounding down
+        days_extra = model.NewIntVar(0, len(In.days), "Tdd:%i" % t)
+        model.Add(
+            days_extra == teaches_days - should_teach_days_minus_1 - 1
+        ).OnlyEnforceIf(teaches_some)  # -1 to compensate rounding down
+        model.Add(days_extra == 0).OnlyEnforceIf(teaches_some.Not())
+        p22 = model.NewIntVar(0, icw["2c2d"] * len(In.days), "")
+        model.Add(p22 == icw["2c2d"] * days_extra)
+        self.penalties["teacher"][T]["2c2d"] = p22
+
+        self.add_heavy(f"2extradays-{T}", days_extra < 2)
+
+        # not_teaching
+        p_not_teaching = model.NewIntVar(0, icw["not_teaching"], "")
+        model.Add(p_not_teaching == teaches_some.Not() * icw["not_teaching"])
+        self.penalties["teacher"][T]["not_teaching"] = p_not_teaching
+
+        # teaching or not being available during Teachers Training
+        if "Teachers Training" in In.Courses and "tt" in icw:
+            tt_map = []
+            c = In.Courses["Teachers Training"]
+            for s in range(len(In.slots)):
+                hit = model.NewBoolVar("")
+                model.Add(M.cs[c] == s).OnlyEnforceIf(hit)
+                model.Add(M.cs[c] != s).OnlyEnforceIf(hit.Not())
+                tt_map.append(hit)
+
+            w = icw["tt"]
+            ls = []
+            for s in range(len(In.slots)):
+                hit = model.NewBoolVar("")
+                model.AddBoolAnd([tt_map[s], M.ps_na[(t, s)]]).OnlyEnforceIf(hit)
+                model.AddBoolOr([tt_map[s].Not(), M.ps_na[(t, s)].Not()]).OnlyEnforceIf(
+                    hit.Not()
+                )
+                ls.append(hit)
+            teaches_tt = model.NewBoolVar("")
+            c = In.Courses["Teachers Training"]
+            model.Add(M.tc[(t, c)] == 1).OnlyEnforceIf(teaches_tt)
+            model.Add(M.tc[(t, c)] == 0).OnlyEnforceIf(teaches_tt.Not())
+            teaches_tt_time = model.NewBoolVar("")
+            model.Add(teaches_tt_time == sum(ls)).OnlyEnforceIf(teaches_tt.Not())
+            model.Add(teaches_tt_time == 0).OnlyEnforceIf(teaches_tt)
+            p_tt = model.NewIntVar(0, w, "")
+            model.Add(p_tt == teaches_tt_time * w)
+            self.penalties["teacher"][T]["tt"] = p_tt
+
+        # split
+        days_split = model.NewIntVar(0, len(In.days), "TDsplit:%i" % t)
+        tsplits = []
+        for d in range(len(In.days)):
+            # tsplit == True iff teacher t teaches just the first and the last course in day d
+            tsubsplits = []
+            for i in range(len(In.times)):
+                tsubsplit = model.NewBoolVar("tsubsplit:t%id%ii%i" % (t, d, i))
+                model.Add(
+                    sum(M.ts[(t, s)] for s in [d * len(In.times) + i]) == 1
+                ).OnlyEnforceIf(tsubsplit)
+                model.Add(
+                    sum(M.ts[(t, s)] for s in [d * len(In.times) + i]) == 0
+                ).OnlyEnforceIf(tsubsplit.Not())
+                tsubsplits.append(tsubsplit)
+            tsplit = model.NewBoolVar("tsplit:t%id%i" % (t, d))
+            model.AddBoolAnd(
+                [tsubsplits[0], tsubsplits[1].Not(), tsubsplits[2]]
+            ).OnlyEnforceIf(tsplit)
+            model.AddBoolOr(
+                [tsubsplits[0].Not(), tsubsplits[1], tsubsplits[2].Not()]
+            ).OnlyEnforceIf(tsplit.Not())
+            tsplits.append(tsplit)
+        model.Add(days_split == sum(tsplits))
+        p_split = model.NewIntVar(0, icw["split"] * len(In.days), "")
+        model.Add(p_split == icw["split"] * days_split)
+        self.penalties["teacher"][T]["split"] = p_split
+
+        # bad_time
+        slots_bad = list(bits(Td.slots_bad))
+        p_slot_bad = model.NewIntVar(0, icw["bad_time"] * 10, "")
+        model.Add(p_slot_bad == icw["bad_time"] * sum(M.ts[(t, s)] for s in slots_bad))
+        self.penalties["teacher"][T]["bad_time"] = p_slot_bad
+
+        # bad_course
+        # teacher T strongly prefers some courses over others
+        courses_bad = [
+            C
+            for C in In.courses_regular + In.courses_solo + In.courses_threesome
+            if Td.courses_pref.get(C, -1) == 1
+        ]
+        p_course_bad = model.NewIntVar(0, icw["bad_course"] * 10, "")
+        self.log.debug(f"courses_bad {T}: {courses_bad}")
+        model.Add(
+            p_course_bad
+            == icw["bad_course"] * sum(M.tc[(t, In.Courses[C])] for C in courses_bad)
+        )
+        self.penalties["teacher"][T]["bad_course"] = p_course_bad
 
-    # finalize penalties
-    def final_penalties(self):
+        # no_perfect
+        courses_perfect = [
+            C
+            for C in In.courses_regular + In.courses_solo + In.courses_threesome
+            if Td.courses_pref.get(C, -1) == 3
+        ]
+        p_no_perfect = model.NewIntVar(0, icw["no_perfect"], "")
+        self.log.debug(f"courses_perfect {T}: {courses_perfect}")
+        teaches_perfect = model.NewIntVar(0, 10, "")
+        model.Add(
+            teaches_perfect == sum(M.tc[(t, In.Courses[C])] for C in courses_perfect)
+        )
+        zero = model.NewBoolVar("")
+        model.Add(teaches_perfect == 0).OnlyEnforceIf(zero)
+        model.Add(teaches_perfect >= 1).OnlyEnforceIf(zero.Not())
+        model.Add(p_no_perfect == icw["no_perfect"] * zero)
+        self.penalties["teacher"][T]["no_perfect"] = p_no_perfect
+
+        # no_person
+        self.log.debug(f"teach_together: {T} + {[In.teachers[o] for o in Td.together]}")
+        success_list = []
+        for c in range(len(In.courses)):
+            hit_self = model.NewBoolVar("")
+            hit_other = model.NewBoolVar("")
+            success = model.NewBoolVar("")
+            model.Add(M.tc[(t, c)] == 1).OnlyEnforceIf(hit_self)
+            model.Add(M.tc[(t, c)] == 0).OnlyEnforceIf(hit_self.Not())
+            model.Add(sum(M.tc[(o, c)] for o in Td.together) >= 1).OnlyEnforceIf(
+                hit_other
+            )
+            model.Add(sum(M.tc[(o, c)] for o in Td.together) == 0).OnlyEnforceIf(
+                hit_other.Not()
+            )
+            model.AddBoolAnd([hit_self, hit_other]).OnlyEnforceIf(success)
+            model.AddBoolOr([hit_self.Not(), hit_other.Not()]).OnlyEnforceIf(
+                success.Not()
+            )
+            success_list.append(success)
+        nobody = model.NewBoolVar("")
+        model.Add(sum(success_list) == 0).OnlyEnforceIf(nobody)
+        model.Add(sum(success_list) >= 1).OnlyEnforceIf(nobody.Not())
+        if not Td.together:
+            self.log.debug(
+                f"teach_together: no preference => no penalty for {T}"
+            )  # TODO
+        p_no_person = model.NewIntVar(0, icw["no_person"], "")
+        model.Add(p_no_person == icw["no_person"] * nobody)
+        self.penalties["teacher"][T]["no_person"] = p_no_person
+
+        # special
+        if icw["special"]:
+            self.log.debug(f"Special wish for {T}")
+            p_special = model.NewIntVar(0, icw["special"], "")
+            model.Add(p_special == icw["special"] * self.wish[T])
+            self.penalties["teacher"][T]["special"] = p_special
+
+    # finalize penalties, weights replace some of In.PENALTIES (see set_weights)
+    def final_penalties(self, weights=None):
         In = self.In
         model = self.model
+        W = In.PENALTIES | (weights or {})
 
         penalties_values = []
         for top, d in self.penalties.items():
@@ -1878,36 +2470,38 @@ class Model:
                 for S, dict_penalties in d.items():
                     penalties_students.append(sum(dict_penalties.values()))
                 penalty_students_weighted = model.NewIntVar(
-                    0, len(d) * In.PENALTIES["student"] * 100, ""
+                    0, len(d) * W["student"] * 100, ""
                 )
                 model.Add(
-                    penalty_students_weighted
-                    == sum(penalties_students) * In.PENALTIES["student"]
+                    penalty_students_weighted == sum(penalties_students) * W["student"]
                 )
-                # penalty_students_weighted = sum(penalties_students) * In.PENALTIES["student"]
+                # penalty_students_weighted = sum(penalties_students) * W["student"]
                 penalty_students_adjusted = model.NewIntVar(
-                    0, len(d) * In.PENALTIES["student"], ""
+                    0, len(d) * W["student"], ""
                 )
                 model.AddDivisionEquality(
                     penalty_students_adjusted, penalty_students_weighted, 100
                 )
                 penalties_values.append(penalty_students_adjusted)
             elif top == "courses_closed":
-                penalties_values.append(d * In.PENALTIES["courses_closed"])
+                penalties_values.append(d * W["courses_closed"])
             elif top == "heavy":
-                penalties_values.append(sum(d.values()) * In.PENALTIES["heavy"])
+                penalties_values.append(sum(d.values()) * W["heavy"])
             elif top == "very_heavy":
-                penalties_values.append(sum(d.values()) * In.PENALTIES["very_heavy"])
+                penalties_values.append(sum(d.values()) * W["very_heavy"])
             elif top == "custom":
-                penalties_values.append(sum(d.values()) * In.PENALTIES["custom"])
+                penalties_values.append(sum(d.values()) * W["custom"])
             elif top == "nice":
-                penalties_values.append(sum(d.values()) * In.PENALTIES["nice"])
+                penalties_values.append(sum(d.values()) * W["nice"])
+            elif top == "repair":
+                for k, v in d.items():
+                    penalties_values.append(v * W[f"repair_{k}"])
             else:
-                error(f"Unknown penalty domain: {top}")
+                self.log.error(f"Unknown penalty domain: {top}")
 
         model.Minimize(sum(penalties_values))
 
-        debug("Model: penalties finalized")
+        self.log.debug("Model: penalties finalized")
 
     def print_stats(self):
         print(self.model.ModelStats())
@@ -1924,18 +2518,20 @@ class Model:
     def add_nice(self, name, *args):
         self.add_rule("nice", name, *args)
 
+    RULES = ("heavy", "very_heavy", "custom", "nice")
+
     def add_rule(self, typ, name, *args):
         model = self.model
 
         # debug(f"Adding rule type '{typ}' name '{name}' args '{args}'")
-        debug(f"Adding rule type '{typ}' name '{name}'")
-        debug(f"Current penalties of type '{typ}': {self.penalties[typ]}")
+        self.log.debug(f"Adding rule type '{typ}' name '{name}'")
+        self.log.debug(f"Current penalties of type '{typ}': {self.penalties[typ]}")
         if not name:
             # TODO probably not possible..
             name = f"{typ}-{len(self.penalties[typ])}"
 
         if name in self.penalties[typ]:
-            error(f"Type {typ} penalty {name} already exists")
+            self.log.error(f"Type {typ} penalty {name} already exists")
             p = self.penalties[typ][name]
         else:
             # debug(f"Type {typ} penalty {name} does not exist yet")
@@ -1944,6 +2540,103 @@ class Model:
 
         model.Add(*args).OnlyEnforceIf(p.Not())
 
+    # proto indices of the decision variables in arrays of their shape, so that
+    # extract_result gets all values at once
+    def index_arrays(self):
+        if self.indices is None:
+            import_numpy()
+            In = self.In
+            S, R = len(In.slots), len(In.rooms)
+            C, T = len(In.courses), len(In.teachers)
+
+            def indices(x, shape):
+                keys = np.ndindex(*shape)
+                return np.array([x[k].Index() for k in keys]).reshape(shape)
+
+            self.indices = {
+                "src": indices(self.src, (S, R, C)),
+                "tc": indices(self.tc, (T, C)),
+                "tc_lead": indices(self.tc_lead, (T, C)),
+                "tc_follow": indices(self.tc_follow, (T, C)),
+                "ts": indices(self.ts, (T, S)),
+            }
+        return self.indices
+
+    # start the search from a known schedule
+    def add_hints(self, R):
+        model = self.model
+        model.ClearHints()
+        V = R.variables()
+        for name in ("src", "tc", "tc_lead", "tc_follow"):
+            for k, x in getattr(self, name).items():
+                model.AddHint(x, int(V[name][k]))
+
+    # allow only schedule P (see schedule_result), e.g. to evaluate it
+    def fix(self, P):
+        model = self.model
+        V = P.variables()
+        for name in ("src", "tc", "tc_lead", "tc_follow"):
+            for k, x in getattr(self, name).items():
+                model.Add(x == int(V[name][k]))
+
+    # Hamming distance from schedule P (see schedule_result) of the course
+    # placement and of the teacher assignment variables, and the number of
+    # the latter
+    def distance(self, P):
+        In = self.In
+        V = P.variables()
+        dist_course = sum(v if not V["src"][k] else 1 - v for k, v in self.src.items())
+        teacher_vars = []
+        for c, C in enumerate(In.courses):
+            for t in range(len(In.teachers)):
+                if C in In.courses_regular:
+                    teacher_vars.append((self.tc_lead[(t, c)], V["tc_lead"][t, c]))
+                    teacher_vars.append((self.tc_follow[(t, c)], V["tc_follow"][t, c]))
+                else:
+                    teacher_vars.append((self.tc[(t, c)], V["tc"][t, c]))
+        dist_teacher = sum(v if not p else 1 - v for v, p in teacher_vars)
+        return dist_course, dist_teacher, len(teacher_vars)
+
+    # prefer schedules close to the published schedule P (see read_schedule),
+    # radius limits the number of changed variables
+    def add_repair(self, P, radius=None):
+        model = self.model
+
+        # weighted Hamming distance from P
+        dist_course, dist_teacher, n_teacher = self.distance(P)
+        changed_course = model.NewIntVar(0, len(self.src), "repair-course")
+        model.Add(changed_course == dist_course)
+        changed_teacher = model.NewIntVar(0, n_teacher, "repair-teacher")
+        model.Add(changed_teacher == dist_teacher)
+        self.penalties["repair"] = {
+            "course": changed_course,
+            "teacher": changed_teacher,
+        }
+        if radius is not None:
+            model.Add(changed_course + changed_teacher <= radius)
+
+        self.add_hints(P)
+        self.clear_block(("objective",))
+        self.block(("objective",), self.final_penalties)
+        if self.cache_key is not None:
+            from swing_schedule import cache as model_cache
+
+            self.cache_key = model_cache.key(
+                self.cache_key, "repair", P.entries, radius
+            )
+
+    # allow only schedules differing from schedule P in at least distance
+    # variables (a moved course or a swapped teacher counts twice)
+    def add_distance(self, P, distance):
+        dist_course, dist_teacher, _ = self.distance(P)
+        self.model.Add(dist_course + dist_teacher >= distance)
+        if self.cache_key is not None:
+            from swing_schedule import cache as model_cache
+
+            self.cache_key = model_cache.key(
+                self.cache_key, "distance", schedule_entries(P, self.In), distance
+            )
+
     def add_wish(self, T, *args):
         model = self.model
 
@@ -1951,352 +2644,1076 @@ class Model:
 
         model.Add(*args).OnlyEnforceIf(p.Not())
 
-    # INNER CLASS
-    class ContinuousSolutionPrinter(cp_model.CpSolverSolutionCallback):
-        def __init__(self, M, In):
-            self.count = 0
-            self.M = M
-            self.In = In
-            cp_model.CpSolverSolutionCallback.__init__(self)
+    # objective with other weights of penalty domains, e.g. {"student": 0}
+    def set_weights(self, weights):
+        self.clear_block(("objective",))
+        self.block(("objective",), self.final_penalties, weights)
+        if self.cache_key is not None:
+            from swing_schedule import cache as model_cache
 
-        def OnSolutionCallback(self):
-            print_solution(self, self.M, self.In)
-            return
+            self.cache_key = model_cache.key(
+                self.cache_key, "weights", sorted(weights.items())
+            )
 
-    def solve(self):
-        if VERBOSE:
-            self.print_stats()
-            print()
-        else:
-            info("Solving...")
+    # limit the sum of student penalties (unweighted) to eps
+    def add_student_limit(self, eps):
+        if "student" not in self.penalties:
+            self.log.error("No student penalties to limit")
+        self.model.Add(
+            sum(v for d in self.penalties["student"].values() for v in d.values())
+            <= eps
+        )
+        if self.cache_key is not None:
+            from swing_schedule import cache as model_cache
 
-        solver = cp_model.CpSolver()
-        # solver.parameters.max_time_in_seconds = 20.0
-        if VERBOSE:
-            status = solver.SolveWithSolutionCallback(
-                self.model, self.ContinuousSolutionPrinter(self, self.In)
-            )
-        else:
-            status = solver.Solve(self.model)
-            print("SOLVED")
-            print_solution(solver, self, self.In)
-            # x = self.ContinuousSolutionPrinter(self, self.In)
-            # x.OnSolutionCallback()
+            self.cache_key = model_cache.key(self.cache_key, "student_limit", eps)
 
-        statusname = solver.StatusName(status)
-        print(
-            f"Solving finished in {solver.WallTime()} seconds with status {status} - {statusname}"
+    def new_solver(self, time_limit=None):
+        solver = cp_model.CpSolver()
+        # Ctrl-C is for the application (see run_interruptible), a solver
+        # catching it may leave SIGINT killing the process after a solve
+        # stopped from another thread
+        solver.parameters.catch_sigint_signal = False
+        if time_limit is not None:
+            solver.parameters.max_time_in_seconds = time_limit
+        if self.num_workers is not None:
+            solver.parameters.num_workers = self.num_workers
+        return solver
+
+    # solve with solver, on_result(R) is called for every improving solution,
+    # returns the status name, solver.StopSearch() from another thread cancels
+    def run(self, solver, on_result):
+        callback = solution_callback(
+            lambda sol: on_result(extract_result(sol, self, self.In))
+        )
+        return solver.StatusName(solver.Solve(self.model, callback))
+
+    # run, writing the best schedule and bound to the checkpoint of key at
+    # most once per CHECKPOINT_INTERVAL, elapsed is the time of previous runs
+    def run_checkpointed(self, solver, on_result, key, elapsed):
+        start = time.time()
+        best = {}
+
+        def write(R, timestamp):
+            bound = max(R.bound, best.get("bound", R.bound))
+            self.store_checkpoint(key, R, bound, elapsed + timestamp - start)
+
+        checkpoints = Incumbents(write, CHECKPOINT_INTERVAL, self.log)
+
+        def on_incumbent(R):
+            best["result"] = R
+            checkpoints.add(R)
+            if on_result is not None:
+                on_result(R)
+
+        def on_bound(bound):
+            best["bound"] = bound
+            if "result" in best:
+                checkpoints.add(best["result"])
+
+        solver.best_bound_callback = on_bound
+        try:
+            return self.run(solver, on_incumbent)
+        finally:
+            checkpoints.close()
+
+    # R with bound as the checkpoint of key, elapsed is the total search time
+    def store_checkpoint(self, key, R, bound, elapsed):
+        from swing_schedule import cache as result_cache
+
+        result_cache.store(
+            "checkpoint",
+            key,
+            {
+                "entries": schedule_entries(R, self.In),
+                "objective": R.objective,
+                "bound": bound,
+                "elapsed": elapsed,
+            },
+            self.log,
         )
-        if statusname not in ["FEASIBLE", "OPTIMAL"]:
-            error(f"Solution NOT found - status {statusname}")
 
+    # search() solving with solver in a background thread, so that Ctrl-C
+    # stops the search instead of the process, returns (status name,
+    # interrupted). A second Ctrl-C raises KeyboardInterrupt.
+    def run_interruptible(self, solver, search):
+        if threading.current_thread() is not threading.main_thread():
+            return search(), False  # only the main thread gets signals
+        done = {}
+        finished = threading.Event()  # Thread.join breaks when interrupted
+
+        def target():
+            try:
+                done["status"] = search()
+            finally:
+                finished.set()
+
+        threading.Thread(target=target, daemon=True).start()
+        interrupted = False
+        try:
+            finished.wait()
+        except KeyboardInterrupt:
+            interrupted = True
+            self.log.info("Interrupted, stopping the search (Ctrl-C again to abort)")
+            solver.StopSearch()
+            finished.wait()
+        # the thread printed its exception if it has no status
+        return done.get("status", "UNKNOWN"), interrupted
+
+    # solve in a background thread, on_result(R) is called for every improving
+    # solution and on_done(status name) at the end, solver.StopSearch() cancels
+    def start(self, on_result, on_done, time_limit=None):
+        solver = self.new_solver(time_limit)
+        thread = threading.Thread(
+            target=lambda: on_done(self.run(solver, on_result)), daemon=True
+        )
+        thread.start()
+        return solver, thread
+
+    # solve the model, on_result(R) is called for every improving solution
+    #
+    # Nothing is printed, the best Result is returned with status, bound,
+    # time_limit, cached and interrupted set. Raises ScheduleError if there is
+    # none.
+    #
+    # With cache, the best schedule and bound are checkpointed while solving.
+    # resume continues an interrupted solve from its checkpoint, the time
+    # limit is then the total search time of all the runs.
+    #
+    # deadline (a time.time() timestamp) stops the search at that wall-clock
+    # time, whichever of it and time_limit comes first. Ctrl-C stops the
+    # search too, the best schedule so far is returned and, with cache, kept
+    # as the checkpoint to resume from.
+    def solve(
+        self, time_limit=None, cache=False, on_result=None, resume=False, deadline=None
+    ):
+        key = None
+        stored = None
+        if cache and self.cache_key is not None:
+            from swing_schedule import cache as result_cache
+
+            # time limit is not a part of the key so that a longer run can
+            # improve a stored FEASIBLE result
+            key = result_cache.key("result", self.cache_key)
+            stored = result_cache.load("result", key, self.log)
+        if stored is not None and (
+            stored.status == "OPTIMAL"
+            or (
+                time_limit is not None
+                and (stored.time_limit is None or stored.time_limit >= time_limit)
+            )
+        ):
+            self.log.info(f"Result loaded from cache ({stored.status})")
+            stored.cached = True
+            stored.interrupted = False
+            return stored
 
-def print_solution(sol, model, input_):
+        if self.log.verbose:
+            self.print_stats()
+            print()
+        self.log.info("Solving...")
+
+        elapsed = 0  # search time of the interrupted runs
+        checkpoint = None
+        if resume:
+            if key is None:
+                self.log.error("Resuming needs the cache")
+            checkpoint = result_cache.load("checkpoint", key, self.log)
+            if checkpoint is None:
+                self.log.info("No checkpoint to resume from")
+        if checkpoint is not None:
+            elapsed = checkpoint["elapsed"]
+            self.log.info(
+                f"Resuming from checkpoint {checkpoint['objective']}"
+                f" (bound {checkpoint['bound']}) after {elapsed:.1f}s"
+            )
+            self.add_hints(schedule_result(self.In, checkpoint["entries"]))
+        elif stored is not None:
+            self.log.info(f"Improving cached {stored.status} result {stored.objective}")
+            self.add_hints(stored)
+
+        run_limit = time_limit
+        if time_limit is not None and elapsed:
+            run_limit = max(time_limit - elapsed, RESUME_MIN_TIME)
+        shortened = False
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                self.log.error("The deadline has passed before solving")
+            if run_limit is None or remaining < run_limit:
+                self.log.info(f"Solving for {remaining:.1f}s until the deadline")
+                run_limit = remaining
+                shortened = True
+        solver = self.new_solver(run_limit)
+
+        def search():
+            if key is not None:
+                return self.run_checkpointed(solver, on_result, key, elapsed)
+            if on_result is not None:
+                return self.run(solver, on_result)
+            return solver.StatusName(solver.Solve(self.model))
+
+        statusname, interrupted = self.run_interruptible(solver, search)
+        if statusname not in ("FEASIBLE", "OPTIMAL"):
+            self.log.error(f"Solution NOT found - status {statusname}")
+
+        R = extract_result(solver, self, self.In)
+        R.status = statusname
+        R.bound = solver.BestObjectiveBound()
+        R.wall_time += elapsed
+        R.time_limit = time_limit
+        cut = interrupted or (shortened and statusname == "FEASIBLE")
+        if cut:  # a run with the full time limit may do better
+            R.time_limit = R.wall_time
+        R.cached = False
+        R.interrupted = interrupted
+        if key is not None:
+            if cut:
+                self.store_checkpoint(key, R, R.bound, R.wall_time)
+            else:
+                result_cache.remove("checkpoint", key, self.log)
+            if (
+                stored is None
+                or R.status == "OPTIMAL"
+                or R.objective < stored.objective
+            ):
+                result_cache.store("result", key, R, self.log)
+            elif not cut:
+                # the longer run did not help, do not try it again
+                stored.time_limit = time_limit
+                result_cache.store("result", key, stored, self.log)
+        return R
+
+
+# Result of the solution (see Result)
+#
+# Called for every incumbent, so all values are read from the response at
+# once using the index arrays of the model.
+def extract_result(sol, model, input_):
     In = input_
     M = model
-    R = Result()
-    R.src = {}
-    for s in range(len(In.slots)):
-        for r in range(len(In.rooms)):
-            for c in range(len(In.courses)):
-                R.src[(s, r, c)] = sol.Value(M.src[(s, r, c)])
-    debug(pprint.pformat(R))
-    R.tc = {}
-    R.tc_lead = {}
-    R.tc_follow = {}
-    for t in range(len(In.teachers)):
+    indices = M.index_arrays()
+    values = sol.response_proto.solution
+    R = Result(In)
+    R.set_variables(
+        **{
+            name: solution_array(values, indices[name])
+            for name in ("src", "tc", "tc_lead", "tc_follow")
+        }
+    )
+    R.set_penalties(solution_values(values, M.penalties), In)
+    R.objective = sol.ObjectiveValue()
+    R.bound = sol.BestObjectiveBound()
+    R.wall_time = sol.WallTime()
+    if In.log.verbose:
+        ts = solution_array(values, indices["ts"])
+        for P in In.people:
+            p = In.Teachers[P]
+            ts_mask = slot_mask(ts[p], bool)
+            # not available: teaches or bad slot preferences
+            os = In.slots_all & ~In.teacher_data[p].slots_possible
+            na = ts_mask | os
+            In.log.debug(f"PSPD: na {mask_str(na, len(In.slots))}")
+            In.log.debug(f"PSPD: os {mask_str(os, len(In.slots))}")
+            In.log.debug(f"PSPD: ts {mask_str(ts_mask, len(In.slots))}")
+        In.log.debug("Courses slots and rooms")
         for c in range(len(In.courses)):
-            R.tc[(t, c)] = sol.Value(M.tc[(t, c)])
-            R.tc_lead[(t, c)] = sol.Value(M.tc_lead[(t, c)])
-            R.tc_follow[(t, c)] = sol.Value(M.tc_follow[(t, c)])
-    for P in In.people:
-        p = In.Teachers[P]  # FIXME
-        na = "".join(
-            ["1" if sol.Value(M.ps_na[(p, s)]) else "0" for s in range(len(In.slots))]
-        )
-        #     ps = "".join(
-        #         [
-        #             "1" if sol.Value(M.ps[(p, s)]) else "0"
-        #             for s in range(len(In.slots))
-        #         ]
-        #     )
-        ts = "".join(
-            ["1" if sol.Value(M.ts[(p, s)]) else "0" for s in range(len(In.slots))]
-        )
-        os = "".join(
-            [
-                "1" if sol.Value(M.ps_occupied[(p, s)]) else "0"
-                for s in range(len(In.slots))
-            ]
+            In.log.debug(f"{In.courses[c]: <30}: {R.slot[c]} {R.room[c]}")
+        In.log.debug(pprint.pformat(vars(R)))
+    return R
+
+
+# values at indices (an array of proto indices) as an array of the same shape
+def solution_array(values, indices):
+    flat = indices.ravel().tolist()
+    if len(flat) == 1:  # itemgetter of one item does not return a tuple
+        return np.array([values[flat[0]]]).reshape(indices.shape)
+    return np.array(operator.itemgetter(*flat)(values)).reshape(indices.shape)
+
+
+# print(f"Branches: {s.NumBranches()}")
+# print(f"Conflicts: {s.NumConflicts()}")
+def print_result(R, In, utilization=True, file=None):
+    objective = R.objective
+    print(f"Wall time: {R.wall_time:.1f}s", file=file)
+    penalties = R.penalties
+    if objective:
+        print(f"Objective value: {objective}", file=file)
+    for c in R.courses():
+        C = In.courses[c]
+        Ts = [In.teachers[t] for t in R.teachers[c] if t >= 0]
+        if C in In.courses_open:
+            Ts = ["OPEN"]
+        elif C in In.courses_threesome:
+            assert len(Ts) == 3
+        if len(Ts) == 2:
+            Ts_print = f"{Ts[0]:<10}+ {Ts[1]}"
+        elif len(Ts) == 3:
+            Ts_print = f"{Ts[0]}+{Ts[1]}+{Ts[2]}"  # TODO
+        else:
+            Ts_print = f"{Ts[0]}"
+        S, Rm = In.slots[R.slot[c]], In.rooms[R.room[c]]
+        print(f"  {S: <11}{Rm: <4}{Ts_print: <22}{C}", file=file)
+    if penalties:
+        print("PENALTIES:", file=file)
+        total = 0
+
+        n_heavy = 0
+        ls = []
+        w = In.PENALTIES["heavy"]
+        for name, v in penalties["heavy"].items():
+            y = v  # TODO
+            if y != 0:
+                n_heavy += y
+                ls.append(name)
+        if not ls:
+            ls.append("none")
+        total_heavy = n_heavy * w
+        print(f"Heavy ({n_heavy}*{w}={total_heavy}): {', '.join(ls)}", file=file)
+        total += total_heavy
+
+        n_very_heavy = 0
+        ls = []
+        w = In.PENALTIES["very_heavy"]
+        for name, v in penalties["very_heavy"].items():
+            y = v  # TODO
+            if y != 0:
+                n_very_heavy += y
+                ls.append(name)
+        if not ls:
+            ls.append("none")
+        total_very_heavy = n_very_heavy * w
+        print(
+            f"VERY Heavy ({n_very_heavy}*{w}={total_very_heavy}): {', '.join(ls)}",
+            file=file,
         )
-        # for s in range(len(slots)):
-        # debug(f"sum(sol.Value(M.cs[(In.Courses[C],s)]) for C in attend_courses)")
-        #    As = "".join(
-        #        [
-        #            "1"
-        #            if any(
-        #                [
-        #                    sol.Value(M.cs[(In.Courses[C])]) == s
-        #                    for C in attend_courses
-        #                ]
-        #            )
-        #            else "0"
-        #            for s in range(len(In.slots))
-        #        ]
-        #    )
-        #    days = "".join(
-        #        [
-        #            "1" if sol.Value(M.pd[(p, d)]) else "0"
-        #            for d in range(len(In.days))
-        #        ]
-        #    )
-        debug(f"PSPD: na {na}")
-        debug(f"PSPD: os {os}")
-        debug(f"PSPD: ts {ts}")
-        # debug(f"PSPD: As {As}")
-        # debug(f"PSPD: ps {ps}")
-        # debug(f"ps/pd analysis: {P :<9} os {os} ts {ts} as {As} ps {ps} na {na} num {sol.Value(M.occupied_num[p])} days {days}")
-    #                m += " slots "
-    #                for s in range(len(In.slots)):
-    #                    if sol.Value(M.ps[(p,s)]):
-    #                        m += "1"
-    #                    else:
-    #                        m += "0"
-    #                m += " num "
-    #                m += f"{sol.Value(M.occupied_num[p])}"
-    #                m += " days "
-    #                for d in range(len(In.days)):
-    #                    if sol.Value(M.pd[(p,d)]):
-    #                        m += "1"
-    #                    else:
-    #                        m += "0"
-    #                debug(m)
-    debug("Courses openness and indices")
-    R.c_active = []
-    R.cs = []
-    for c in range(len(In.courses)):
-        R.c_active.append(sol.Value(M.c_active[c]))
-        debug(f"{In.courses[c]: <30}: {sol.Value(M.c_active[c])} {sol.Value(M.cs[c])}")
-        R.cs.append(sol.Value(M.cs[c]))
-    R.penalties = M.penalties
-    #            R.penalties = {}
-    #            # FIXME how to access penalties?
-    #            for (name, ls) in M.penalties.items():
-    #                v = sum([sol.Value(p) for p in ls])
-    #                coeff = In.PENALTIES[name]
-    #                R.penalties[name] = (coeff, v)
-    #            R.custom_penalties = {}
-    #            for name, v in M.custom_penalties.items():
-    #                R.custom_penalties[name] = .Value(v)
-    #            R.heavy_penalties = {}
-    #            for name, v in M.heavy_penalties.items():
-    #                R.heavy_penalties[name] = elf.Value(v)
-    print(f"Wall time: {sol.WallTime():.1f}s")
-
-    # print(f"Branches: {s.NumBranches()}")
-    # print(f"Conflicts: {s.NumConflicts()}")
-    def print_solution(R, penalties_analysis, objective=None, utilization=True):
-        src = R.src
-        tc = R.tc
-        tc_lead = R.tc_lead
-        tc_follow = R.tc_follow
-        penalties = R.penalties
-        if objective:
-            print(f"Objective value: {objective}")
-        for s in range(len(In.slots)):
-            for r in range(len(In.rooms)):
-                for c in range(len(In.courses)):
-                    if src[(s, r, c)]:
-                        Ts = []
-                        if In.courses[c] in In.courses_open:
-                            Ts.append("OPEN")
-                        elif In.courses[c] in In.courses_solo:
-                            for t in range(len(In.teachers)):
-                                # if solver.Value(tc[(t,c)]):
-                                if tc[(t, c)]:
-                                    Ts.append(In.teachers[t])
-                                    break
-                        elif In.courses[c] in In.courses_threesome:
-                            for t in range(len(In.teachers)):
-                                # if solver.Value(tc[(t,c)]):
-                                if tc[(t, c)]:
-                                    Ts.append(In.teachers[t])
-                            assert len(Ts) == 3
-                        elif In.courses[c] in In.courses_regular:
-                            # t_lead = "UNKNOWN"
-                            # t_follow = "UNKNOWN"
-                            for t in range(len(In.teachers)):
-                                if tc_lead[(t, c)]:
-                                    t_lead = t
-                                if tc_follow[(t, c)]:
-                                    t_follow = t
-                            Ts.append(In.teachers[t_lead])
-                            Ts.append(In.teachers[t_follow])
-                        # if len(Ts) == 2 and (Ts[0] in In.teachers_follow or Ts[1] in In.teachers_lead):
-                        # Ts[0], Ts[1] = Ts[1], Ts[0]
-                        if len(Ts) == 2:
-                            Ts_print = f"{Ts[0]:<10}+ {Ts[1]}"
-                        elif len(Ts) == 3:
-                            Ts_print = f"{Ts[0]}+{Ts[1]}+{Ts[2]}"  # TODO
-                        else:
-                            Ts_print = f"{Ts[0]}"
-                        # print(f"{In.slots[s]: <11}{In.rooms[r]: <5}{'+'.join(Ts): <19}{In.courses[c]}")
-                        print(
-                            f"  {In.slots[s]: <11}{In.rooms[r]: <4}{Ts_print: <22}{In.courses[c]}"
-                        )
-        if penalties:
-            print("PENALTIES:")
-            total = 0
+        total += total_very_heavy
 
-            n_heavy = 0
+        total_teachers = 0
+        print("Teachers:", file=file)
+        teachers_happy = []
+        # FIXME
+        for T, d in penalties["teacher"].items():
+            ls = []
+            s = 0
+            for p, v in d.items():
+                y = v  # TODO have all values in R?
+                if y > 0:
+                    total_teachers += y
+                    ls.append((p, y))
+                    s += y
+            if s:
+                details = ", ".join([f"{x[0]}:{x[1]}" for x in ls])
+                print(f" * {T}: {s} // {details}", file=file)
+            else:
+                In.log.debug(f" * {T} is happy")
+                teachers_happy.append(T)
+        print(
+            f" Happy teachers: ({len(teachers_happy)}) {', '.join(teachers_happy)}",
+            file=file,
+        )
+        print(f"Teachers total: {total_teachers}", file=file)
+        total += total_teachers
+
+        n_closed = penalties["courses_closed"]
+        w = In.PENALTIES["courses_closed"]
+        total_closed = n_closed * w
+        print(f"Closed courses: {n_closed}*{w}={total_closed}", file=file)
+        total += total_closed
+
+        n_custom = 0
+        ls = []
+        w = In.PENALTIES["custom"]
+        for name, v in penalties["custom"].items():
+            y = v  # TODO
+            if y != 0:
+                n_custom += y
+                ls.append(name)
+        if not ls:
+            ls.append("none")
+        total_custom = n_custom * w
+        print(f"Custom ({n_custom}*{w}={total_custom}): {', '.join(ls)}", file=file)
+        total += total_custom
+
+        n_nice = 0
+        ls = []
+        w = In.PENALTIES["nice"]
+        for name, v in penalties["nice"].items():
+            y = v  # TODO
+            if y != 0:
+                n_nice += y
+                ls.append(name)
+        if not ls:
+            ls.append("none")
+        total_nice = n_nice * w
+        print(f"Nice: ({n_nice}*{w}={total_nice}): {', '.join(ls)}", file=file)
+        total += total_nice
+
+        if "repair" in penalties:
             ls = []
-            w = In.PENALTIES["heavy"]
-            for name, v in penalties["heavy"].items():
-                y = sol.Value(v)  # TODO
-                if y != 0:
-                    n_heavy += y
-                    ls.append(name)
-            if not ls:
-                ls.append("none")
-            total_heavy = n_heavy * w
-            print(f"Heavy ({n_heavy}*{w}={total_heavy}): {', '.join(ls)}")
-            total += total_heavy
-
-            n_very_heavy = 0
+            total_repair = 0
+            for k, v in penalties["repair"].items():
+                w = In.PENALTIES[f"repair_{k}"]
+                ls.append(f"{k} {v}*{w}={v * w}")
+                total_repair += v * w
+            print(f"Changes ({total_repair}): {', '.join(ls)}", file=file)
+            total += total_repair
+
+        print("Students:", file=file)
+        total_students = 0
+        happiness_sum = 0
+        happiness_count = 0
+        students_hh = {}  # Happiness Histogram
+        for S, d in penalties["student"].items():
             ls = []
-            w = In.PENALTIES["very_heavy"]
-            for name, v in penalties["very_heavy"].items():
-                y = sol.Value(v)  # TODO
-                if y != 0:
-                    n_very_heavy += y
-                    ls.append(name)
-            if not ls:
-                ls.append("none")
-            total_very_heavy = n_very_heavy * w
+            s = 0
+            courses_wanted = 0
+            courses_bad = 0
+            for p, v in d.items():
+                courses_wanted += 1
+                y = v  # TODO have all values in R?
+                if y > 0:
+                    courses_bad += 1
+                    total_students += y
+                    ls.append((p, y))
+                    s += y
+            courses_good = courses_wanted - courses_bad
+            happiness = int(courses_good / courses_wanted * 100)
+            hh_item = students_hh.get(happiness, [])
+            hh_item.append(S)
+            students_hh[happiness] = hh_item
+            happiness_sum += happiness
+            happiness_count += 1
+
+        for v in sorted(students_hh.keys()):
             print(
-                f"VERY Heavy ({n_very_heavy}*{w}={total_very_heavy}): {', '.join(ls)}"
+                f" * {v:>3}%: {len(students_hh[v]):>3} ({' '.join(students_hh[v])})",
+                file=file,
             )
-            total += total_very_heavy
-
-            total_teachers = 0
-            print("Teachers:")
-            teachers_happy = []
-            # FIXME
-            for T, d in penalties["teacher"].items():
-                ls = []
-                s = 0
-                for p, v in d.items():
-                    y = sol.Value(v)  # TODO have all values in R?
-                    if y > 0:
-                        total_teachers += y
-                        ls.append((p, y))
-                        s += y
-                if s:
-                    details = ", ".join([f"{x[0]}:{x[1]}" for x in ls])
-                    print(f" * {T}: {s} // {details}")
-                else:
-                    debug(f" * {T} is happy")
-                    teachers_happy.append(T)
+        total_students = total_students * In.PENALTIES["student"] // 100
+        if happiness_count:
             print(
-                f" Happy teachers: ({len(teachers_happy)}) {', '.join(teachers_happy)}"
+                f"Students total: {total_students} ({happiness_sum // happiness_count}%)",
+                file=file,
             )
-            print(f"Teachers total: {total_teachers}")
-            total += total_teachers
+        total += total_students
+
+    if utilization:
+        print("UTILIZATION:", file=file)
+        n = np.bincount(R.teachers[R.teachers >= 0], minlength=len(In.teachers))
+        tn = dict(zip(In.teachers, n.tolist()))
+        for v in sorted(set(tn.values())):
+            print(f"{v}: {', '.join(t for t in tn if tn[t] == v)}", file=file)
+    print(f"TOTAL: {total}", file=file)
+
+    if objective and objective != total:
+        In.log.warning(
+            f"Mismatch of objective value: objective {objective} vs. total {total}"
+        )  # FIXME
+
+
+# course C -> (slot, room, teachers) of schedule R, teachers in the lead, follow order
+def schedule_entries(R, In):
+    return {
+        In.courses[c]: (
+            In.slots[R.slot[c]],
+            In.rooms[R.room[c]],
+            [In.teachers[t] for t in R.teachers[c] if t >= 0],
+        )
+        for c in R.courses()
+    }
 
-            n_closed = sol.Value(penalties["courses_closed"])
-            w = In.PENALTIES["courses_closed"]
-            total_closed = n_closed * w
-            print(f"Closed courses: {n_closed}*{w}={total_closed}")
-            total += total_closed
 
-            n_custom = 0
-            ls = []
-            w = In.PENALTIES["custom"]
-            for name, v in penalties["custom"].items():
-                y = sol.Value(v)  # TODO
-                if y != 0:
-                    n_custom += y
-                    ls.append(name)
-            if not ls:
-                ls.append("none")
-            total_custom = n_custom * w
-            print(f"Custom ({n_custom}*{w}={total_custom}): {', '.join(ls)}")
-            total += total_custom
-
-            n_nice = 0
-            ls = []
-            w = In.PENALTIES["nice"]
-            for name, v in penalties["nice"].items():
-                y = sol.Value(v)  # TODO
-                if y != 0:
-                    n_nice += y
-                    ls.append(name)
-            if not ls:
-                ls.append("none")
-            total_nice = n_nice * w
-            print(f"Nice: ({n_nice}*{w}={total_nice}): {', '.join(ls)}")
-            total += total_nice
-
-            print("Students:")
-            total_students = 0
-            happiness_sum = 0
-            happiness_count = 0
-            students_hh = {}  # Happiness Histogram
-            for S, d in penalties["student"].items():
-                ls = []
-                s = 0
-                courses_wanted = 0
-                courses_bad = 0
-                for p, v in d.items():
-                    courses_wanted += 1
-                    y = sol.Value(v)  # TODO have all values in R?
-                    if y > 0:
-                        courses_bad += 1
-                        total_students += y
-                        ls.append((p, y))
-                        s += y
-                courses_good = courses_wanted - courses_bad
-                happiness = int(courses_good / courses_wanted * 100)
-                hh_item = students_hh.get(happiness, [])
-                hh_item.append(S)
-                students_hh[happiness] = hh_item
-                happiness_sum += happiness
-                happiness_count += 1
-
-            for v in sorted(students_hh.keys()):
-                print(
-                    f" * {v:>3}%: {len(students_hh[v]):>3} ({' '.join(students_hh[v])})"
-                )
-            total_students = total_students * In.PENALTIES["student"] // 100
-            if happiness_count:
-                print(
-                    f"Students total: {total_students} ({happiness_sum // happiness_count}%)"
+def schedule_json(R, In):
+    return [
+        {"course": C, "slot": S, "room": Rm, "teachers": Ts}
+        for C, (S, Rm, Ts) in schedule_entries(R, In).items()
+    ]
+
+
+SCHEDULE_CSV_HEADER = ["course", "slot", "room", "teacher1", "teacher2", "teacher3"]
+
+
+# JSON with the schedule, objective and penalties, or CSV with one course per
+# row (by the extension of path), both can be read back by read_schedule
+def write_schedule(R, In, path):
+    if path.endswith(".csv"):
+        with open(path, mode="w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(SCHEDULE_CSV_HEADER)
+            for C, (S, Rm, Ts) in schedule_entries(R, In).items():
+                writer.writerow(
+                    [C, S, Rm, *Ts] + [""] * (Result.MAX_TEACHERS - len(Ts))
                 )
-            total += total_students
+    else:
+        data = {}
+        if R.penalties:
+            data["status"] = getattr(R, "status", "FEASIBLE")
+            data["objective"] = R.objective
+            data["bound"] = R.bound
+            data["gap"] = relative_gap(R.objective, R.bound)
+            data["penalties"] = penalty_totals(R.penalties, In)
+            data["teacher_penalties"] = teacher_penalty_kinds(R, In)
+        data["schedule"] = schedule_json(R, In)
+        with open(path, mode="w") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    In.log.info(f"Schedule written to {path}")
+
+
+def read_schedule(In, path):
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            rows = list(csv.reader(f))[1:]
+        entries = {row[0]: (row[1], row[2], [T for T in row[3:] if T]) for row in rows}
+        return schedule_result(In, entries)
+    with open(path) as f:
+        return schedule_from_json(In, json.load(f)["schedule"])
+
+
+def schedule_from_json(In, schedule):
+    entries = {e["course"]: (e["slot"], e["room"], e["teachers"]) for e in schedule}
+    return schedule_result(In, entries)
+
+
+# schedule given by schedule_entries (possibly of another Input) as a Result
+# with values of decision variables, e.g. for hints
+def schedule_result(In, entries):
+    P = Result(In)
+    P.entries = {}
+    for C, (S, Rm, Ts) in entries.items():
+        if C not in In.Courses or S not in In.slots or Rm not in In.Rooms:
+            In.log.warning(f"Schedule: ignoring {C} {S} {Rm}")
+            continue
+        c = In.Courses[C]
+        P.slot[c] = In.slots.index(S)
+        P.room[c] = In.Rooms[Rm]
+        for i, T in enumerate(Ts[: Result.MAX_TEACHERS]):
+            if T not in In.Teachers:
+                In.log.warning(f"Schedule: {T} does not teach {C} any more")
+                continue
+            P.teachers[c, i] = In.Teachers[T]
+        P.entries[C] = (S, Rm, Ts)
+    return P
+
+
+# changes of schedule R against schedule P (see schedule_result)
+def schedule_diff(P, R, In):
+    entries = schedule_entries(R, In)
+    ls = []
+    for C in In.courses:
+        old = P.entries.get(C)
+        new = entries.get(C)
+        if old == new:
+            continue
+        if old is None:
+            ls.append(f"opened {C}: {new[0]} {new[1]} {' + '.join(new[2])}")
+        elif new is None:
+            ls.append(f"closed {C}: was {old[0]} {old[1]} {' + '.join(old[2])}")
+        else:
+            if old[:2] != new[:2]:
+                ls.append(f"moved {C}: {old[0]} {old[1]} -> {new[0]} {new[1]}")
+            if old[2] != new[2]:
+                ls.append(f"teachers {C}: {' + '.join(old[2])} -> {' + '.join(new[2])}")
+    return ls
+
+
+def print_diff(changes):
+    print("CHANGES:")
+    for x in changes or ["none"]:
+        print(f"  {x}")
+
+
+# weighted total of each penalty domain, summed as in Model.final_penalties
+def penalty_totals(penalties, In):
+    totals = {}
+    for top, d in penalties.items():
+        if top == "teacher":
+            totals[top] = sum(sum(x.values()) for x in d.values())
+        elif top == "student":
+            n = sum(sum(x.values()) for x in d.values())
+            totals[top] = n * In.PENALTIES["student"] // 100
+        elif top == "courses_closed":
+            totals[top] = d * In.PENALTIES[top]
+        elif top == "repair":
+            for k, v in d.items():
+                totals[f"repair_{k}"] = v * In.PENALTIES[f"repair_{k}"]
+        else:
+            totals[top] = sum(d.values()) * In.PENALTIES[top]
+    return totals
 
-        if utilization:
-            print("UTILIZATION:")
-            tn = {}
-            # for t in range(len(In.teachers)):
-            # tn[In.teachers[t]] = sum(tc[t,c] for c in range(len(In.courses)))
-            for T in In.teachers:
-                tn[T] = sum(tc[In.Teachers[T], c] for c in range(len(In.courses)))
-            for v in sorted(set(tn.values())):
-                print(f"{v}: {', '.join(t for t in tn if tn[t] == v)}")
-        print(f"TOTAL: {total}")
 
-        if objective and objective != total:
-            warn(
-                f"Mismatch of objective value: objective {objective} vs. total {total}"
-            )  # FIXME
+# the total penalty of each teacher and the kinds it is made of, e.g.
+# {"Jakub": {"total": 12, "bad_time": 8, "split": 4}}
+def teacher_penalty_kinds(R, In):
+    return {
+        T: {
+            "total": int(row.sum()),
+            **{kind: int(v) for kind, v in zip(Result.TEACHER_PENALTIES, row) if v},
+        }
+        for T, row in zip(In.teachers, R.teacher_penalties)
+    }
+
+
+# how far the objective can still be from the optimum, as CP-SAT computes it
+def relative_gap(objective, bound):
+    if bound is None:
+        return None
+    return abs(objective - bound) / max(1, abs(objective))
+
+
+# JSON Lines record of a result found at timestamp, see --incumbents
+def incumbent_json(R, In, timestamp):
+    return {
+        "time": datetime.datetime.fromtimestamp(timestamp).astimezone().isoformat(),
+        "status": getattr(R, "status", "FEASIBLE"),
+        "objective": R.objective,
+        "bound": R.bound,
+        "gap": relative_gap(R.objective, R.bound),
+        "wall_time": R.wall_time,
+        "assignments": schedule_json(R, In),
+        "penalties": penalty_totals(R.penalties, In),
+    }
+
+
+# Library interface: solve(input, options) returns a ScheduleResult, prints
+# nothing and raises ScheduleError instead of exiting.
+
+
+@dataclass
+class Assignment:
+    course: str
+    slot: str
+    room: str
+    teachers: list[str]  # lead first in couple courses
+
+
+@dataclass
+class SolveOptions:
+    time_limit: float | None = None
+    cache: bool = False
+    repair: str | None = None  # published schedule (JSON or CSV) to change minimally
+    repair_radius: int | None = None
+    on_result: object = None  # called with every improving Result
+    # improve a FEASIBLE result by local search in a part of the time limit
+    polish: bool = False
+    # continue an interrupted solve from its checkpoint (needs cache)
+    resume: bool = False
+    # wall-clock time (time.time()) to stop the search at, see Model.solve
+    deadline: float | None = None
+    # messages while solving, nothing is printed by default
+    log: Log | None = None
+
+
+@dataclass
+class ScheduleResult:
+    status: str
+    objective: float
+    bound: float
+    assignments: list[Assignment]
+    penalties: dict[str, int]  # weighted total of each penalty domain
+    build_time: float
+    solve_time: float
+    gap: float | None  # relative, see relative_gap
+    cached: bool = False
+    interrupted: bool = False  # stopped by Ctrl-C
+    changes: list[str] | None = None  # against the repaired schedule
+    # objective before polishing, moves taken and time spent, see polish.py
+    polish: dict | None = None
+    # values of the penalty variables by domain, teacher, student and rule
+    penalty_values: dict = field(default_factory=dict, repr=False)
+    # the schedule in arrays, e.g. for print_result or write_schedule
+    result: Result = field(default=None, repr=False)
+
+
+# input_ logging to options.log, quiet without it
+def input_with_log(input_, options):
+    return input_.with_log(options.log if options.log is not None else Log(quiet=True))
+
+
+def solve(input_, options=None):
+    options = options or SolveOptions()
+    In = input_with_log(input_, options)
+    start = time.perf_counter()
+    M = Model()
+    M.build(In, cache=options.cache)
+    P = None
+    if options.repair is not None:
+        P = read_schedule(In, options.repair)
+        M.add_repair(P, options.repair_radius)
+    build_time = time.perf_counter() - start
+    time_limit = options.time_limit
+    deadline = options.deadline
+    budget = time_limit
+    if deadline is not None:
+        remaining = max(deadline - time.time(), 0)
+        budget = remaining if budget is None else min(budget, remaining)
+    polish_time = None
+    if options.polish and budget is not None:
+        from swing_schedule.polish import POLISH_SHARE
+
+        polish_time = budget * POLISH_SHARE
+        if time_limit is not None:
+            time_limit -= polish_time
+        if deadline is not None:
+            deadline -= polish_time
+    R = M.solve(
+        time_limit=time_limit,
+        cache=options.cache,
+        on_result=options.on_result,
+        resume=options.resume,
+        deadline=deadline,
+    )
+    if polish_time is not None and R.status == "FEASIBLE" and not R.interrupted:
+        from swing_schedule.polish import polish
+
+        solved = R
+        R = polish(In, solved, polish_time, P)
+        R.status = solved.status
+        R.bound = solved.bound
+        R.time_limit = solved.time_limit
+        R.cached = solved.cached
+        R.interrupted = solved.interrupted
+        R.wall_time = solved.wall_time + R.polish["time"]
+    return schedule_result_of(R, In, build_time, P)
+
+
+# ScheduleResult of the solved Result R, P is the repaired schedule
+def schedule_result_of(R, In, build_time, P=None):
+    return ScheduleResult(
+        status=R.status,
+        objective=R.objective,
+        bound=R.bound,
+        assignments=[
+            Assignment(C, S, Rm, Ts)
+            for C, (S, Rm, Ts) in schedule_entries(R, In).items()
+        ],
+        penalties=penalty_totals(R.penalties, In),
+        build_time=build_time,
+        solve_time=R.wall_time,
+        gap=relative_gap(R.objective, R.bound),
+        cached=R.cached,
+        interrupted=getattr(R, "interrupted", False),
+        changes=schedule_diff(P, R, In) if P is not None else None,
+        polish=getattr(R, "polish", None),
+        penalty_values=R.penalties,
+        result=R,
+    )
 
-    debug(pprint.pformat(R))
-    print_solution(R, M.penalties_analysis, objective=sol.ObjectiveValue())
-    print()
 
+# the k best schedules, each differing from all the previous ones in at least
+# distance variables (see Model.add_distance), the best first
+#
+# Every search starts from the previous schedule and gets options.time_limit,
+# fewer schedules are returned when no other one is found. A search stopped by
+# the time limit may find a worse schedule than the next one, so the results
+# are sorted by objective. The searches depend
+# on each other, so they run one after another, each with the parallel workers
+# of the solver. Only time_limit, cache, on_result and log of options are
+# used.
+def alternatives(input_, k, distance, options=None):
+    options = options or SolveOptions()
+    In = input_with_log(input_, options)
+    start = time.perf_counter()
+    M = Model()
+    M.build(In, cache=options.cache)
+    build_time = time.perf_counter() - start
+    results = []
+    for i in range(k):
+        try:
+            R = M.solve(
+                time_limit=options.time_limit,
+                cache=options.cache,
+                on_result=options.on_result,
+            )
+        except ScheduleError as e:
+            if not results:
+                raise
+            In.log.info(f"No more alternatives ({e})")
+            break
+        results.append(schedule_result_of(R, In, build_time))
+        M.add_distance(R, distance)
+        M.add_hints(R)
+    results.sort(key=lambda S: S.objective)
+    return results
+
+
+# schedules (ScheduleResults) side by side: weighted penalties of each domain
+# and a row per course with "slot room teachers" of every schedule, empty if
+# it does not open
+def write_alternatives(results, In, path):
+    cells = [
+        {a.course: f"{a.slot} {a.room} {'+'.join(a.teachers)}" for a in S.assignments}
+        for S in results
+    ]
+    domains = list(dict.fromkeys(k for S in results for k in S.penalties))
+    with open(path, mode="w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["course"] + [str(i + 1) for i in range(len(results))])
+        writer.writerow(["status"] + [S.status for S in results])
+        writer.writerow(["objective"] + [S.objective for S in results])
+        for k in domains:
+            writer.writerow([k] + [S.penalties.get(k, "") for S in results])
+        for C in In.courses:
+            row = [x.get(C, "") for x in cells]
+            if any(row):
+                writer.writerow([C] + row)
+    In.log.info(f"Alternatives written to {path}")
+
+
+# one point of pareto(), run in a worker process: the best schedule with
+# weights (see Model.set_weights) and the student penalties limited to eps,
+# starting from the schedule given by hint (see schedule_entries)
+def pareto_point(input_, weights, eps, hint, time_limit, cache, num_workers):
+    In = input_
+    start = time.perf_counter()
+    M = Model()
+    M.build(In, cache=cache)
+    M.num_workers = num_workers
+    M.set_weights(weights)
+    if eps is not None:
+        M.add_student_limit(eps)
+    if hint is not None:
+        M.add_hints(schedule_result(In, hint))
+    build_time = time.perf_counter() - start
+    try:
+        R = M.solve(time_limit=time_limit, cache=cache)
+    except ScheduleError as e:
+        In.log.info(f"Pareto: no schedule for student penalties <= {eps} ({e})")
+        return None
+    S = schedule_result_of(R, In, build_time)
+    # comparable between the points, unlike the objectives of their models
+    S.objective = sum(S.penalties.values())
+    return S
+
+
+# unweighted sum of the student penalties of a ScheduleResult
+def student_penalty(S):
+    return sum(sum(d.values()) for d in S.penalty_values["student"].values())
+
+
+# approximate Pareto front of the teacher and student penalties: n schedules
+# (fewer if some are not found) ordered from the best for teachers to the best
+# for students
+#
+# The two extremes minimize the teacher penalties, and the student penalties
+# first; the rest minimize the other penalties with the student penalties
+# limited to values in between (the epsilon-constraint method), starting
+# from the schedule best for students, which meets every limit. The solves
+# run in a pool of processes, options.time_limit applies to each.
+def pareto(input_, n, options=None):
+    from concurrent.futures import ProcessPoolExecutor
+
+    import_numpy()  # for the results of the workers
+    options = options or SolveOptions()
+    In = input_with_log(input_, options)
+    if not In.PENALTIES.get("teacher") or not In.PENALTIES.get("student"):
+        In.log.error("Pareto front needs both teacher and student penalties")
+    if not any(Sd.courses_attend for Sd in In.student_data):
+        # every schedule would have the same student penalties, one point
+        In.log.error("Pareto front needs student preferences (-s)")
+    if n < 2:
+        In.log.error("Pareto front needs at least 2 points")
+    cpus = os.cpu_count() or 1
+    processes = min(n - 2, cpus) or 1
+
+    def run(pool, points, workers):
+        futures = [
+            pool.submit(
+                pareto_point,
+                In,
+                weights,
+                eps,
+                hint,
+                options.time_limit,
+                options.cache,
+                workers,
+            )
+            for weights, eps, hint in points
+        ]
+        return [f.result() for f in futures]
 
-# The worst argument parser in the history of argument parsers, maybe ever.
+    with ProcessPoolExecutor(min(max(processes, 2), cpus)) as pool:
+        extremes = [
+            {"student": 0},
+            # a unit of student penalties outweighs any single teacher wish
+            {"student": 100 * In.PENALTIES["teacher"]},
+        ]
+        teachers_best, students_best = run(
+            pool, [(w, None, None) for w in extremes], max(1, cpus // 2)
+        )
+        if teachers_best is None or students_best is None:
+            In.log.error("Pareto front: an extreme schedule was not found")
+        hi, lo = student_penalty(teachers_best), student_penalty(students_best)
+        hint = schedule_entries(students_best.result, In)
+        limits = sorted(
+            {round(hi - (hi - lo) * i / (n - 1)) for i in range(1, n - 1)} - {hi, lo},
+            reverse=True,
+        )
+        middle = run(
+            pool,
+            [({"student": 0}, eps, hint) for eps in limits],
+            max(1, cpus // processes),
+        )
+    points = [teachers_best] + [S for S in middle if S is not None] + [students_best]
+
+    # the searches are time limited, some may be worse than others
+    return pareto_front(points)
+
+
+# the ScheduleResults of points not worse than another one in both the student
+# penalties and the rest of the objective, the first of equal ones, ordered
+# from the best for teachers to the best for students
+def pareto_front(points):
+    def key(S):
+        return S.objective - S.penalties["student"], S.penalties["student"]
+
+    unique = {}
+    for S in points:
+        unique.setdefault(key(S), S)
+    points = list(unique.values())
+    front = [
+        S
+        for S in points
+        if not any(
+            key(X) != key(S) and key(X)[0] <= key(S)[0] and key(X)[1] <= key(S)[1]
+            for X in points
+        )
+    ]
+    return sorted(front, key=lambda S: -S.penalties["student"])
+
+
+# re-solve whenever the input CSVs change, the latest schedule is kept in output
+def watch(args, output, interval=1, log=None):
+    log = log if log is not None else LOG
+    paths = [p for p in (args.teachers, args.students) if p is not None]
+    mtimes = None
+    running = None  # (solver, thread, superseded)
+    # "result" of the latest solve and its "entries" (see schedule_entries)
+    best = {}
+
+    def write(R, In, status):
+        tmp = f"{output}.tmp"
+        with open(tmp, mode="w") as f:
+            print(f"{time.strftime('%H:%M:%S')} {status}", file=f)
+            print_result(R, In, file=f)
+        os.replace(tmp, output)  # readers never see a partial file
+
+    try:
+        while True:
+            try:
+                current = [os.stat(p).st_mtime_ns for p in paths]
+            except FileNotFoundError:  # being replaced by an editor
+                current = mtimes
+            if current != mtimes:
+                mtimes = current
+                if running is not None:
+                    log.info("Input changed, stopping the previous solve")
+                    running[2].set()
+                    running[0].StopSearch()
+                    running[1].join()
+                    running = None
+                try:
+                    In = Input(log)
+                    In.init(
+                        args.teachers,
+                        students_csv=args.students,
+                        penalties=args.penalties,
+                        excluded_teachers=args.excluded_teachers,
+                        cache=args.cache,
+                    )
+                    M = Model()
+                    M.build(In, cache=args.cache)
+                except ScheduleError as e:
+                    log.warning(
+                        f"Cannot build the model ({e}), waiting for the next change"
+                    )
+                    continue
+                if "entries" in best:
+                    M.add_hints(schedule_result(In, best["entries"]))
+
+                best.pop("result", None)
+                # set when the input changes, the schedules of this solve are
+                # then only hints for the next one
+                superseded = threading.Event()
+
+                def write_incumbent(R, timestamp, In=In, superseded=superseded):
+                    best["entries"] = schedule_entries(R, In)
+                    if superseded.is_set():
+                        return
+                    write(R, In, f"FEASIBLE {R.objective} (searching)")
+                    log.info(f"New schedule {R.objective} written to {output}")
+
+                incumbents = Incumbents(write_incumbent)
+
+                def on_result(R, incumbents=incumbents):
+                    best["result"] = R
+                    incumbents.add(R)
+
+                def on_done(
+                    status, In=In, incumbents=incumbents, superseded=superseded
+                ):
+                    incumbents.close()
+                    if superseded.is_set():
+                        return
+                    log.info(f"Solving finished with status {status}")
+                    R = best.get("result")
+                    if R is not None and status in ("FEASIBLE", "OPTIMAL"):
+                        write(R, In, f"{status} {R.objective}")
+
+                log.info("Solving...")
+                running = (
+                    *M.start(on_result, on_done, time_limit=args.time_limit),
+                    superseded,
+                )
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        if running is not None:
+            running[0].StopSearch()
+            running[1].join()
+
+
+# the CLI minimises the objective, which takes minutes on larger inputs, so it
+# stops after TIME_LIMIT seconds unless told otherwise
+TIME_LIMIT = 60
+
+
+# --time-limit in seconds, 0 for no limit
+def parse_time_limit(s):
+    try:
+        limit = float(s)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time limit: {s}") from None
+    if limit < 0:
+        raise argparse.ArgumentTypeError(f"negative time limit: {s}")
+    return limit or None
+
+
+# --deadline as a timestamp: a time today (tomorrow if it has passed) or a
+# date and time, both in ISO format, e.g. 18:30 or 2026-10-20T08:00
+def parse_deadline(s):
+    now = datetime.datetime.now()
+    try:
+        t = datetime.time.fromisoformat(s)
+    except ValueError:
+        try:
+            return datetime.datetime.fromisoformat(s).timestamp()
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid time: {s}") from None
+    d = datetime.datetime.combine(now.date(), t)
+    if d <= now:
+        d += datetime.timedelta(days=1)
+    return d.timestamp()
+
+
+# teachers, students, penalties and excluded teachers of the command line,
+# parse_args has all the options
 def parse(argv=None):
+    args = parse_args(argv)
+    return (args.teachers, args.students, args.penalties, args.excluded_teachers)
+
+
+# The worst argument parser in the history of argument parsers, maybe ever.
+def parse_args(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "-v", "--verbose", action="store_true", dest="verbose", help="Debug output"
@@ -2326,11 +3743,143 @@ def parse(argv=None):
         "-e",
         "--exclude-teacher",
         action="append",
-        default=[],
         dest="excluded_teachers",
         help="Ignore teacher",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        dest="validate",
+        help="Only check the CSV files, do not build the model",
+    )
+    parser.add_argument(
+        "--time-limit",
+        action="store",
+        type=parse_time_limit,
+        default=TIME_LIMIT,
+        dest="time_limit",
+        help=f"Solver time limit in seconds, 0 for none (default {TIME_LIMIT})",
+    )
+    parser.add_argument(
+        "--deadline",
+        action="store",
+        type=parse_deadline,
+        dest="deadline",
+        help="Stop the search at this time (e.g. 18:30 or 2026-10-20T08:00)",
+    )
+    parser.add_argument(
+        "--save-schedule",
+        action="store",
+        dest="save_schedule",
+        help="Write the schedule to a JSON or CSV file (e.g. to publish it)",
+    )
+    parser.add_argument(
+        "--repair",
+        action="store",
+        dest="repair",
+        help="Change as little as possible in the published schedule (JSON or CSV)",
+    )
+    parser.add_argument(
+        "--repair-radius",
+        action="store",
+        type=int,
+        dest="repair_radius",
+        help="Maximal number of changes in the repair mode (a move counts twice)",
+    )
+    parser.add_argument(
+        "--alternatives",
+        action="store",
+        type=int,
+        dest="alternatives",
+        help="Find N different good schedules (--time-limit applies to each)",
+    )
+    parser.add_argument(
+        "--min-distance",
+        action="store",
+        type=int,
+        default=10,
+        dest="min_distance",
+        help="Alternatives differ in at least N variables (a move counts twice, default 10)",
+    )
+    parser.add_argument(
+        "--save-alternatives",
+        action="store",
+        dest="save_alternatives",
+        help="Write the alternatives side by side to a CSV file",
+    )
+    parser.add_argument(
+        "--pareto",
+        action="store",
+        type=int,
+        dest="pareto",
+        help="Find N schedules trading teacher penalties for student penalties "
+        "(--time-limit applies to each)",
+    )
+    parser.add_argument(
+        "--save-pareto",
+        action="store",
+        dest="save_pareto",
+        help="Write the Pareto schedules side by side to a CSV file",
+    )
+    parser.add_argument(
+        "--polish",
+        action="store_true",
+        dest="polish",
+        help="Improve a FEASIBLE schedule by local search in the last 5%% of the time limit",
+    )
+    parser.add_argument(
+        "--evaluate",
+        action="store",
+        dest="evaluate",
+        help="Only score the schedule (JSON or CSV) and check its hard constraints",
+    )
+    parser.add_argument(
+        "--incumbents",
+        action="store",
+        dest="incumbents",
+        help="Append improving schedules to a JSON Lines file while solving",
+    )
+    parser.add_argument(
+        "--incumbents-interval",
+        action="store",
+        type=float,
+        default=1.0,
+        dest="incumbents_interval",
+        help="Write at most one improving schedule per N seconds (default 1)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store",
+        dest="watch",
+        help="Re-solve whenever the CSV files change, keep the latest schedule in a file",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store",
+        dest="serve",
+        help="Serve JSON requests on a Unix socket (see service.py)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        dest="resume",
+        help="Continue an interrupted solve from its checkpoint in the cache",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        dest="cache",
+        default=False,
+        help="Cache input, model and results in ~/.cache/swing-schedule",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_false",
+        dest="cache",
+        default=False,
+        help="Do not use the cache (the default)",
+    )
+    args = parser.parse_args(argv)
 
     if args.verbose:
         set_verbose()
@@ -2340,29 +3889,173 @@ def parse(argv=None):
         for x in args.penalties:
             name, value = x.split(":")
             penalties[name] = int(value)
+    args.penalties = penalties
+    args.excluded_teachers = args.excluded_teachers or []
 
-    return (args.teachers, args.students, penalties, args.excluded_teachers)
+    return args
 
 
 def main():
-    teach_csv, stud_csv, penalties, excluded_teachers = parse()
+    try:
+        cli(parse_args())
+    except ScheduleError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+
+# the command line interface, a thin layer on top of solve() printing its result
+def cli(args):
+    if args.watch:
+        watch(args, args.watch)
+        return
+    if args.serve:
+        from swing_schedule import service
+
+        service.serve(args.serve, cache=args.cache)
+        return
 
     # all input information
     input = Input()
     input.init(
-        teach_csv,
-        students_csv=stud_csv,
-        penalties=penalties,
-        excluded_teachers=excluded_teachers,
+        args.teachers,
+        students_csv=args.students,
+        penalties=args.penalties,
+        excluded_teachers=args.excluded_teachers,
+        cache=args.cache,
     )
 
-    # model construction
-    model = Model()
-    model.init(input)
-    model.init_penalties()
+    if args.validate:
+        problems = input.validate()
+        for x in problems:
+            input.log.warning(x)
+        if problems:
+            input.log.error(f"Input is not valid: {len(problems)} problems")
+        input.log.info("Input is valid")
+        return
+
+    if args.evaluate:
+        from swing_schedule.evaluate import evaluate
+
+        published = read_schedule(input, args.repair) if args.repair else None
+        R = evaluate(input, read_schedule(input, args.evaluate), published)
+        print_result(R, input)
+        print()
+        for x in R.violations:
+            input.log.warning(x)
+        if R.violations:
+            input.log.error(
+                f"Schedule is not feasible: {len(R.violations)} broken constraints"
+            )
+        print(f"Schedule evaluated in {R.wall_time * 1000:.1f} ms")
+        return
+
+    if args.alternatives:
+        results = alternatives(
+            input,
+            args.alternatives,
+            args.min_distance,
+            SolveOptions(time_limit=args.time_limit, cache=args.cache, log=input.log),
+        )
+        first = results[0]
+        print_result(first.result, input)
+        print()
+        P = schedule_result(input, schedule_entries(first.result, input))
+        for i, S in enumerate(results):
+            print(f"Alternative {i + 1}: {S.status} {S.objective}")
+            if i:
+                print_diff(schedule_diff(P, S.result, input))
+        if args.save_alternatives:
+            write_alternatives(results, input, args.save_alternatives)
+        return
+
+    if args.pareto:
+        points = pareto(
+            input,
+            args.pareto,
+            SolveOptions(time_limit=args.time_limit, cache=args.cache, log=input.log),
+        )
+        print("PARETO FRONT:")
+        print(
+            f"  {'':>3} {'status':<10}{'teachers':>10}{'students':>10}"
+            f"{'other':>10}{'total':>10}"
+        )
+        for i, S in enumerate(points):
+            teachers, students = S.penalties["teacher"], S.penalties["student"]
+            other = S.objective - teachers - students
+            print(
+                f"  {i + 1:>3} {S.status:<10}{teachers:>10}{students:>10}"
+                f"{other:>10}{S.objective:>10}"
+            )
+        if args.save_pareto:
+            write_alternatives(points, input, args.save_pareto)
+        return
+
+    # incumbents are printed and written in background threads
+    handlers = []
+    if args.verbose:
 
-    # run the solver
-    model.solve()
+        def print_incumbent(R, timestamp):
+            print_result(R, input)
+            print()
+
+        handlers.append(Incumbents(print_incumbent))
+    if args.incumbents:
+
+        def write_incumbent(R, timestamp):
+            record = incumbent_json(R, input, timestamp)
+            with open(args.incumbents, mode="a") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        handlers.append(Incumbents(write_incumbent, args.incumbents_interval))
+
+    def on_result(R):
+        for h in handlers:
+            h.add(R)
+
+    try:
+        S = solve(
+            input,
+            SolveOptions(
+                time_limit=args.time_limit,
+                cache=args.cache,
+                repair=args.repair,
+                repair_radius=args.repair_radius,
+                on_result=on_result if handlers else None,
+                polish=args.polish,
+                resume=args.resume,
+                deadline=args.deadline,
+                log=input.log,
+            ),
+        )
+        if args.incumbents:
+            handlers[-1].add(S.result)  # the final status and bound
+    finally:
+        for h in handlers:
+            h.close()
+    # with -v the incumbents were printed, but not the polished schedule
+    if S.cached or not args.verbose or S.polish is not None:
+        if S.interrupted:
+            print("INTERRUPTED, the best schedule found so far:")
+        elif not S.cached:
+            print("SOLVED")
+        print_result(S.result, input)
+        print()
+    print(
+        f"Solving {'interrupted' if S.interrupted else 'finished'}"
+        f" in {S.solve_time} seconds with status {S.status}"
+        + (f", gap {S.gap:.1%} (bound {S.bound})" if S.status == "FEASIBLE" else "")
+        + (" (cached)" if S.cached else "")
+    )
+    if S.polish is not None:
+        print(
+            f"Polishing improved the objective from {S.polish['objective']} to"
+            f" {S.objective} with {S.polish['moves']} moves"
+            f" in {S.polish['time']:.2f} seconds"
+        )
+    if S.changes is not None:
+        print_diff(S.changes)
+    if args.save_schedule:
+        write_schedule(S.result, input, args.save_schedule)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+import swing_schedule
+from swing_schedule import Input, Log, Model
+from swing_schedule.swing_schedule import extract_result
+
+SAMPLE_TEACHERS = os.path.join(
+    os.path.dirname(swing_schedule.__file__), "data", "teachers.csv"
+)
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    # never touch the cache of the user
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    return tmp_path / "cache"
+
+
+@pytest.fixture(scope="session")
+def sample_teachers():
+    return SAMPLE_TEACHERS
+
+
+@pytest.fixture
+def sample_input():
+    In = Input(Log(quiet=True))
+    In.init(SAMPLE_TEACHERS)
+    return In
+
+
+# the sample and its first schedule, which comes fast on any machine
+@pytest.fixture(scope="session")
+def first_schedule():
+    In = Input(Log(quiet=True))
+    In.init(SAMPLE_TEACHERS)
+    M = Model()
+    M.build(In)
+    solver = M.new_solver(60)
+    solver.parameters.stop_after_first_solution = True
+    assert M.run(solver, lambda R: None) == "FEASIBLE"
+    return In, extract_result(solver, M, In)
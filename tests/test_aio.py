@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+import pytest
+
+from swing_schedule import Model, ScheduleError, ScheduleResult
+from swing_schedule.aio import AsyncSolve, schedule_async
+
+# long enough for a first schedule of the sample
+TIME_LIMIT = 10
+
+
+def test_schedule_async(sample_input, capsys):
+    incumbents = []
+    S = asyncio.run(
+        schedule_async(
+            sample_input,
+            {"time_limit": TIME_LIMIT, "on_incumbent": incumbents.append},
+        )
+    )
+    assert isinstance(S, ScheduleResult)
+    assert S.status in ("FEASIBLE", "OPTIMAL")
+    assert S.assignments
+    objectives = [R.objective for R in incumbents]
+    assert objectives
+    assert objectives == sorted(objectives, reverse=True)
+    assert S.objective == objectives[-1]
+    assert capsys.readouterr().out == ""
+
+
+def test_not_found(sample_input):
+    with pytest.raises(ScheduleError, match="Solution NOT found"):
+        asyncio.run(schedule_async(sample_input, {"time_limit": 0.001}))
+
+
+# cancel stops the search at the first schedule, which is returned
+def test_cancel(sample_input):
+    async def stopped():
+        M = Model()
+        await asyncio.get_running_loop().run_in_executor(None, M.build, sample_input)
+        solve = AsyncSolve(M, time_limit=600).start()
+        async for R in solve:
+            solve.cancel()
+            incumbent = R
+        return incumbent, await solve.result()
+
+    start = time.perf_counter()
+    incumbent, R = asyncio.run(stopped())
+    assert time.perf_counter() - start < 60
+    assert R.status == "FEASIBLE"
+    assert R.interrupted
+    assert R.objective <= incumbent.objective
+
+
+# a cancelled task stops the solver thread as well, otherwise asyncio.run
+# would wait for it in the executor
+def test_cancel_task(sample_input):
+    async def cancelled():
+        found = asyncio.Event()
+        task = asyncio.create_task(
+            schedule_async(
+                sample_input,
+                {"time_limit": 600, "on_incumbent": lambda R: found.set()},
+            )
+        )
+        await found.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    start = time.perf_counter()
+    asyncio.run(cancelled())
+    assert time.perf_counter() - start < 60
@@ -0,0 +1,34 @@
+import itertools
+
+import numpy as np
+
+from swing_schedule import SolveOptions, alternatives
+
+# long enough for a schedule of every search
+TIME_LIMIT = 10
+
+
+# changed decision variables between Results A and B, as in Model.distance:
+# placements and teachers, lead and follow in couple courses
+def hamming(A, B):
+    a, b = A.variables(), B.variables()
+    single = ~A.couple
+    n = np.abs(a["src"] - b["src"]).sum()
+    n += np.abs(a["tc"][:, single] - b["tc"][:, single]).sum()
+    for name in ("tc_lead", "tc_follow"):
+        n += np.abs(a[name] - b[name]).sum()
+    return n
+
+
+def test_alternatives(sample_input):
+    distance = 6
+    results = alternatives(
+        sample_input, 3, distance, SolveOptions(time_limit=TIME_LIMIT)
+    )
+    assert len(results) >= 2
+    for S in results:
+        assert S.status in ("FEASIBLE", "OPTIMAL")
+    objectives = [S.objective for S in results]
+    assert objectives == sorted(objectives)
+    for S1, S2 in itertools.combinations(results, 2):
+        assert hamming(S1.result, S2.result) >= distance
@@ -0,0 +1,81 @@
+import argparse
+import datetime
+import re
+import time
+
+import pytest
+
+from swing_schedule.swing_schedule import (
+    cli,
+    parse,
+    parse_args,
+    parse_deadline,
+    parse_time_limit,
+)
+
+
+def test_time_limit():
+    assert parse_time_limit("90") == 90
+    assert parse_time_limit("2.5") == 2.5
+    assert parse_time_limit("0") is None  # no limit
+
+
+@pytest.mark.parametrize("s", ["-1", "soon"])
+def test_bad_time_limit(s):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_time_limit(s)
+
+
+# the shape of parse from before the other options
+def test_parse():
+    argv = ["-t", "t.csv", "-s", "s.csv", "-p", "teacher:5", "-e", "Marie"]
+    assert parse(argv) == ("t.csv", "s.csv", {"teacher": 5}, ["Marie"])
+
+
+def test_cache_opt_in():
+    assert not parse_args(["-t", "t.csv"]).cache
+    assert parse_args(["-t", "t.csv", "--cache"]).cache
+    assert not parse_args(["-t", "t.csv", "--no-cache"]).cache
+
+
+def hms(d):
+    return d.strftime("%H:%M:%S")
+
+
+# a time of day is the next one to come, today or tomorrow
+def test_deadline_time():
+    now = datetime.datetime.now()
+    hour = datetime.timedelta(hours=1)
+    # midnight does not matter, but a change of the clock would
+    assert parse_deadline(hms(now + hour)) == pytest.approx(
+        (now + hour).timestamp(), abs=1
+    )
+    assert parse_deadline(hms(now - hour)) == pytest.approx(
+        (now + 23 * hour).timestamp(), abs=1
+    )
+
+
+def test_deadline_date():
+    d = datetime.datetime(2026, 10, 20, 8, 0)
+    assert parse_deadline("2026-10-20T08:00") == d.timestamp()
+    # in the past, Model.solve refuses it
+    assert parse_deadline("2020-01-01T08:00") < time.time()
+
+
+@pytest.mark.parametrize("s", ["25:00", "soon"])
+def test_bad_deadline(s):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_deadline(s)
+
+
+# a deadline too close for the optimum, the best schedule is printed with
+# its gap to the bound
+def test_deadline_solve(sample_teachers, capsys):
+    deadline = hms(datetime.datetime.now() + datetime.timedelta(seconds=8))
+    cli(parse_args(["-t", sample_teachers, "--deadline", deadline]))
+    out = capsys.readouterr().out
+    assert "until the deadline" in out
+    m = re.search(r"with status (\w+), gap ([\d.]+)% \(bound ", out)
+    assert m
+    assert m[1] == "FEASIBLE"
+    assert float(m[2]) > 0
@@ -0,0 +1,37 @@
+import pytest
+
+# course names of the forms, including the theme-course and sub-prefix cases
+# of is_course_type and names matching nothing
+NAMES = [
+    "LH",
+    "LH Beg",
+    "LH Int",
+    "LH Beg/Int",
+    "Collegiate Shag",
+    "Collegiate Shag Int",
+    "Balboa Int",
+    "Blues Int",
+    "Solo",
+    "Saint Louis Shag Beg",
+    "Nonexistent Course",
+]
+
+
+# courses of type Cgen as they were found before course_types, by filtering
+# all the courses on every call
+def filtered(In, Cgen):
+    return tuple(
+        c for c, Cspec in enumerate(In.courses) if In.is_course_type(Cspec, Cgen)
+    )
+
+
+def test_indexed_names(sample_input):
+    In = sample_input
+    assert In.course_types
+    for Cgen in list(In.course_types):
+        assert In.courses_of_type(Cgen) == filtered(In, Cgen), Cgen
+
+
+@pytest.mark.parametrize("Cgen", NAMES)
+def test_names(sample_input, Cgen):
+    assert sample_input.courses_of_type(Cgen) == filtered(sample_input, Cgen)
@@ -0,0 +1,83 @@
+import json
+import random
+
+from swing_schedule import Model
+from swing_schedule.evaluate import Evaluator, evaluate
+from swing_schedule.swing_schedule import Result, extract_result, write_schedule
+
+
+def test_evaluate_matches_solver(sample_input, tmp_path):
+    In = sample_input
+    M = Model()
+    M.build(In)
+    # any schedule will do, the first one comes fast on any machine
+    solver = M.new_solver(60)
+    solver.parameters.stop_after_first_solution = True
+    assert M.run(solver, lambda R: None) == "FEASIBLE"
+    P = extract_result(solver, M, In)
+
+    # the incumbent may still pay for slack the fixed model does not need
+    F = M.clone()
+    F.fix(P)
+    R = F.solve()
+    assert R.status == "OPTIMAL"
+
+    E = evaluate(In, P)
+    assert E.violations == []
+    assert E.status == "FEASIBLE"
+    assert E.objective == R.objective
+
+    # the same penalties of every teacher, kind by kind
+    for d in P.penalties["teacher"].values():
+        assert set(d) <= set(Result.TEACHER_PENALTIES)
+    assert (E.teacher_penalties == P.teacher_penalties).all()
+    path = str(tmp_path / "schedule.json")
+    write_schedule(E, In, path)
+    with open(path) as f:
+        exported = json.load(f)["teacher_penalties"]
+    for T, d in E.penalties["teacher"].items():
+        assert exported[T] == {
+            "total": sum(d.values()),
+            **{kind: v for kind, v in d.items() if v},
+        }
+
+
+# a random move of every kind, hard constraints may break
+def random_move(rnd, E):
+    C = len(E.slot)
+    kind = rnd.choice(("move", "swap", "teacher"))
+    if kind == "move":
+        if rnd.random() < 0.2:
+            return ("move", rnd.randrange(C), -1, -1)
+        s, r = rnd.randrange(len(E.In.slots)), rnd.randrange(len(E.In.rooms))
+        return ("move", rnd.randrange(C), s, r)
+    if kind == "swap":
+        return ("swap", *rnd.sample(range(C), 2))
+    c = rnd.randrange(C)
+    i = rnd.randrange(2 if E.couple[c] else Result.MAX_TEACHERS)
+    return ("teacher", c, i, rnd.randrange(-1, len(E.In.teachers)))
+
+
+# delta and apply agree with evaluating the changed schedule from scratch
+def test_moves(first_schedule):
+    In, P = first_schedule
+    E = Evaluator(In, P)
+    rnd = random.Random(0)
+    for _ in range(200):
+        move = random_move(rnd, E)
+        before = E.result()
+        d = E.delta(move)
+        assert E.result().objective == before.objective  # left as it was
+        assert (E.slot == before.slot).all()
+        assert (E.teachers == before.teachers).all()
+        assert E.apply(move) == d
+        R = E.result()
+        F = Result(In)
+        F.slot[:], F.room[:], F.teachers[:] = R.slot, R.room, R.teachers
+        evaluate(In, F)
+        assert R.objective - before.objective == d[0]
+        assert len(R.violations) - len(before.violations) == d[1]
+        assert (R.objective, R.penalties) == (F.objective, F.penalties)
+        # the same broken constraints, courses in a room may come in another order
+        assert len(R.violations) == len(F.violations)
+        assert (R.teacher_penalties == F.teacher_penalties).all()
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from swing_schedule import Log
+from swing_schedule.swing_schedule import Incumbents
+
+
+# while handle is busy, only the latest of the added results is kept
+def test_keep_latest():
+    started = threading.Event()
+    release = threading.Event()
+    handled = []
+
+    def handle(R, timestamp):
+        handled.append(R)
+        started.set()
+        release.wait()
+
+    incumbents = Incumbents(handle)
+    incumbents.add(1)
+    started.wait()
+    for R in (2, 3, 4):
+        incumbents.add(R)
+    release.set()
+    incumbents.close()
+    assert handled == [1, 4]
+
+
+# handle is called at most once per interval, close does not wait for the
+# interval to pass and handles the latest result
+def test_throttle():
+    interval = 0.5
+    handled = []
+    times = []
+    called = threading.Semaphore(0)
+
+    def handle(R, timestamp):
+        handled.append(R)
+        times.append(time.monotonic())
+        called.release()
+
+    incumbents = Incumbents(handle, interval)
+    incumbents.add(1)
+    called.acquire()
+    incumbents.add(2)
+    incumbents.add(3)
+    called.acquire()
+    assert times[1] - times[0] >= interval
+    incumbents.add(4)
+    start = time.monotonic()
+    incumbents.close()
+    assert time.monotonic() - start < interval
+    assert handled == [1, 3, 4]
+
+
+def test_os_error(capsys):
+    handled = []
+    failed = threading.Event()
+
+    def handle(R, timestamp):
+        if R == 1:
+            failed.set()
+            raise OSError("No space left on device")
+        handled.append(R)
+
+    incumbents = Incumbents(handle, log=Log())
+    incumbents.add(1)
+    failed.wait()
+    incumbents.add(2)
+    incumbents.close()
+    assert handled == [2]
+    assert "WARNING: Cannot handle incumbent: No space left" in capsys.readouterr().out
@@ -0,0 +1,103 @@
+import os
+import pickle
+import subprocess
+import sys
+
+import swing_schedule
+from swing_schedule.swing_schedule import Result
+
+SRC = os.path.dirname(os.path.dirname(swing_schedule.__file__))
+
+# prints the heavy modules imported by then, run in a fresh interpreter
+REPORT = "print(sorted(m for m in ('ortools', 'numpy') if m in sys.modules))"
+
+
+def imported(code):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    p = subprocess.run(
+        [sys.executable, "-c", f"import sys\n{code}\n{REPORT}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return p.stdout.splitlines()[-1]
+
+
+# cumulative microseconds of importing module in a fresh interpreter, as
+# reported by -X importtime, the best of a few runs
+def import_time(module, runs=3):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    times = []
+    for _ in range(runs):
+        p = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        for line in p.stderr.splitlines():
+            _, cumulative, name = line.rsplit("|", 2)
+            if name.strip() == module:
+                times.append(int(cumulative))
+    return min(times)
+
+
+def validate(teachers, *args):
+    argv = ["swing-schedule", "-t", teachers, "--validate", *args]
+    return f"""
+from swing_schedule import main
+sys.argv = {argv!r}
+try:
+    main()
+except SystemExit:  # problems in the sample are not the point here
+    pass
+"""
+
+
+def test_import():
+    assert imported("import swing_schedule") == "[]"
+
+
+def test_validate(sample_teachers):
+    assert imported(validate(sample_teachers)) == "[]"
+
+
+def test_validate_cached(sample_teachers):
+    assert imported(validate(sample_teachers, "--cache")) == "[]"  # stores the input
+    assert imported(validate(sample_teachers, "--cache")) == "[]"  # loads it
+
+
+# the point of the lazy import: the package loads in a fraction of the time
+# OR-Tools takes (about 0.08 s against 0.5 s when this was written)
+def test_import_time():
+    assert (
+        import_time("swing_schedule") < import_time("ortools.sat.python.cp_model") / 3
+    )
+
+
+# a cached Result is unpickled without OR-Tools, its methods need NumPy
+def test_unpickled_result(sample_input, tmp_path):
+    path = tmp_path / "result.pickle"
+    with open(path, mode="wb") as f:
+        pickle.dump(Result(sample_input), f)
+    code = f"""
+import pickle
+with open({str(path)!r}, mode="rb") as f:
+    pickle.load(f).variables()
+"""
+    assert "ortools" not in imported(code)
+
+
+# scoring a schedule needs NumPy only
+def test_evaluate(sample_teachers):
+    code = f"""
+from swing_schedule import Input, Log
+from swing_schedule.evaluate import evaluate
+from swing_schedule.swing_schedule import Result
+In = Input(Log(quiet=True))
+In.init({sample_teachers!r})
+evaluate(In, Result(In))
+"""
+    assert imported(code) == "['numpy']"
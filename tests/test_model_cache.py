@@ -0,0 +1,44 @@
+import csv
+
+from swing_schedule import Input, Log, Model, swing_schedule
+
+# column of "How many courses are you able to teach at most?"
+MAX_COURSES = 3
+
+
+# copy of the sample teachers with the maximum of the first teacher changed
+def write_teachers(sample_teachers, path, maximum):
+    with open(sample_teachers, newline="") as f:
+        rows = list(csv.reader(f))
+    rows[1][MAX_COURSES] = str(maximum)
+    with open(path, mode="w", newline="") as f:
+        csv.writer(f).writerows(rows)
+    return rows[1][1]
+
+
+def build(path):
+    In = Input(Log(quiet=True))
+    In.init(str(path), cache=True)
+    M = Model()
+    M.build(In, cache=True)
+    return In, M
+
+
+def test_updates_do_not_grow_the_model(sample_teachers, tmp_path, monkeypatch):
+    # one teacher leaves about 0.6 % of the sample model behind
+    monkeypatch.setattr(swing_schedule, "MAX_GARBAGE", 0.01)
+    path = tmp_path / "teachers.csv"
+    write_teachers(sample_teachers, path, 3)
+    _, M = build(path)
+    fresh = M.size()
+    garbage = []
+    # every build updates the stored model of the previous one
+    for maximum in (4, 3, 4, 3):
+        T = write_teachers(sample_teachers, path, maximum)
+        In, M = build(path)
+        assert In.teacher_data[In.Teachers[T]].ncourses_max == maximum
+        assert M.size() - M.garbage == fresh
+        assert M.garbage <= 0.01 * M.size()
+        garbage.append(M.garbage)
+    assert garbage[0] > 0  # updated
+    assert 0 in garbage  # rebuilt
@@ -0,0 +1,90 @@
+import csv
+import random
+import types
+
+import pytest
+
+from swing_schedule import Input, Log, ScheduleError, SolveOptions, pareto
+from swing_schedule.swing_schedule import pareto_front
+
+# long enough for a schedule of every point
+TIME_LIMIT = 10
+
+DAYS = ("Pondělí", "Úterý", "Středa", "Čtvrtek")
+TIMES = ("17:30 - 18:40", "18:50 - 20:00", "20:10 - 21:20")
+COURSES = (
+    "LH Beg",
+    "LH Int",
+    "Blues Beg",
+    "Balboa Beg",
+    "Collegiate Shag Beg",
+    "Solo Int",
+)
+
+
+# answers of n random students in the format of the students' form
+def write_students(path, n, seed=0):
+    rnd = random.Random(seed)
+    with open(path, mode="w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["Kdo jsi, pokud to chceš říct?"]
+            + [f"Jaké dny a časy ti absolutně NEvyhovují? [{day}]" for day in DAYS]
+            + ["V jaké roli si zapisuješ kurzy?", "Jaké kurzy si chceš zapsat?"]
+        )
+        for _ in range(n):
+            writer.writerow(
+                [""]
+                + [", ".join(rnd.sample(TIMES, rnd.randrange(3))) for _ in DAYS]
+                + [
+                    rnd.choice(("Lead", "Follow")),
+                    ", ".join(rnd.sample(COURSES, rnd.randrange(1, 3))),
+                ]
+            )
+
+
+# (student penalties, rest of the objective) of the schedules of front
+def student_rest(front):
+    return [
+        (S.penalties["student"], S.objective - S.penalties["student"]) for S in front
+    ]
+
+
+# no point of the front is better than another one in both, they are ordered
+# from the best for teachers to the best for students
+def check_front(points):
+    assert points == sorted(points, key=lambda p: (-p[0], p[1]))
+    for student, rest in points:
+        assert not any(
+            (s, r) != (student, rest) and s <= student and r <= rest for s, r in points
+        )
+
+
+def test_pareto_front():
+    points = [(5, 10), (3, 20), (5, 12), (4, 25), (1, 40), (3, 20), (1, 50)]
+    results = [
+        types.SimpleNamespace(objective=s + r, penalties={"student": s})
+        for s, r in points
+    ]
+    front = pareto_front(results)
+    assert student_rest(front) == [(5, 10), (3, 20), (1, 40)]
+    assert front[1] is results[1]  # the first of the equal ones
+    check_front(student_rest(front))
+
+
+def test_pareto(sample_teachers, tmp_path):
+    students = str(tmp_path / "students.csv")
+    write_students(students, 40)
+    In = Input(Log(quiet=True))
+    In.init(sample_teachers, students_csv=students)
+    front = pareto(In, 3, SolveOptions(time_limit=TIME_LIMIT))
+    assert front  # how many depends on how far the searches get
+    for S in front:
+        assert S.status in ("FEASIBLE", "OPTIMAL")
+    check_front(student_rest(front))
+
+
+# without students every schedule is one point
+def test_no_students(sample_input):
+    with pytest.raises(ScheduleError, match="student preferences"):
+        pareto(sample_input, 3)
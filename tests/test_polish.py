@@ -0,0 +1,50 @@
+import copy
+
+from swing_schedule import Input, Log
+from swing_schedule.evaluate import evaluate
+from swing_schedule.polish import polish
+
+TIME_LIMIT = 2
+
+
+# R scored by evaluate, R itself is left as it is
+def evaluated(In, R, published=None):
+    return evaluate(In, copy.deepcopy(R), published)
+
+
+def test_polish(first_schedule):
+    In, P = first_schedule
+    start = evaluated(In, P)
+    R = polish(In, P, TIME_LIMIT)
+    assert R.violations == []
+    assert R.objective <= start.objective
+    assert R.objective == evaluated(In, R).objective
+    assert R.polish["objective"] == P.objective
+    if R.polish["moves"]:
+        assert R.objective < start.objective
+
+
+# with a published schedule, changes pay for their repair penalties
+def test_polish_published(first_schedule):
+    In, P = first_schedule
+    start = evaluated(In, P, P)
+    R = polish(In, P, TIME_LIMIT, P)
+    assert R.violations == []
+    assert R.objective <= start.objective
+    assert "repair" in R.penalties
+
+
+# changes cost more than the whole objective, the published schedule is kept
+def test_polish_keeps_published(first_schedule, sample_teachers):
+    _, P = first_schedule
+    In = Input(Log(quiet=True))
+    In.init(
+        sample_teachers,
+        penalties={"repair_course": 10**12, "repair_teacher": 10**12},
+    )
+    assert evaluated(In, P).objective < 10**12
+    R = polish(In, P, TIME_LIMIT, P)
+    assert R.polish["moves"] == 0
+    assert (R.slot == P.slot).all()
+    assert (R.room == P.room).all()
+    assert (R.teachers == P.teachers).all()
@@ -0,0 +1,33 @@
+import os
+import signal
+
+from swing_schedule import Input, Log, SolveOptions, solve
+
+# long enough for the resumed solve to get past the checkpoint
+TIME_LIMIT = 10
+
+
+def test_resume(sample_teachers, capsys):
+    In = Input(Log(quiet=True))
+    In.init(sample_teachers, cache=True)
+
+    # Ctrl-C at the first schedule, only once: a second one aborts
+    sent = []
+
+    def interrupt(R):
+        if not sent:
+            sent.append(R)
+            os.kill(os.getpid(), signal.SIGINT)
+
+    S = solve(In, SolveOptions(time_limit=600, cache=True, on_result=interrupt))
+    assert S.interrupted
+    assert S.status == "FEASIBLE"
+
+    R = solve(
+        In, SolveOptions(time_limit=TIME_LIMIT, cache=True, resume=True, log=Log())
+    )
+    assert f"Resuming from checkpoint {S.objective}" in capsys.readouterr().out
+    assert not R.interrupted
+    assert R.status in ("FEASIBLE", "OPTIMAL")
+    assert R.objective <= S.objective
+    assert R.solve_time >= S.solve_time  # counts the interrupted run
@@ -0,0 +1,201 @@
+import json
+import socket
+import socketserver
+import threading
+
+import pytest
+
+from swing_schedule import Log, ScheduleError, service
+
+# long enough for a first schedule of the sample
+TIME_LIMIT = 10
+
+
+class Client:
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX)
+        self.socket.connect(path)
+        self.file = self.socket.makefile("rw")
+
+    def send(self, **req):
+        self.file.write(json.dumps(req) + "\n")
+        self.file.flush()
+
+    # the final reply to request rid and the incumbents sent before it
+    def wait(self, rid):
+        incumbents = []
+        while True:
+            msg = json.loads(self.file.readline())
+            assert msg["id"] == rid
+            if msg["event"] != "incumbent":
+                return msg, incumbents
+            incumbents.append(msg)
+
+    def request(self, **req):
+        self.send(**req)
+        return self.wait(req["id"])[0]
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("service") / "socket")
+    s = service.Service()
+    s.init(log=Log(quiet=True))
+    with socketserver.ThreadingUnixStreamServer(path, service.Handler) as server:
+        server.service = s
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        yield path
+        server.shutdown()
+        thread.join()
+
+
+@pytest.fixture
+def client(server):
+    c = Client(server)
+    yield c
+    c.close()
+
+
+# the first solve of the sample, shared by the tests that need a schedule
+@pytest.fixture(scope="module")
+def solved(server, sample_teachers):
+    c = Client(server)
+    c.send(id=1, op="solve", teachers=sample_teachers, time_limit=TIME_LIMIT)
+    reply, incumbents = c.wait(1)
+    c.close()
+    return reply, incumbents
+
+
+def test_solve(solved):
+    reply, incumbents = solved
+    assert reply["event"] == "result"
+    assert reply["status"] in ("FEASIBLE", "OPTIMAL")
+    assert "cached" not in reply
+    assert reply["schedule"]
+    objectives = [x["objective"] for x in incumbents]
+    assert objectives
+    assert objectives == sorted(objectives, reverse=True)
+    assert reply["objective"] <= objectives[-1]
+
+
+def test_cached_replay(solved, client, sample_teachers):
+    reply = client.request(
+        id=2, op="solve", teachers=sample_teachers, time_limit=TIME_LIMIT
+    )
+    assert reply["cached"]
+    assert reply["objective"] == solved[0]["objective"]
+    assert reply["schedule"] == solved[0]["schedule"]
+
+
+def test_evaluate(solved, client, sample_teachers):
+    reply = client.request(
+        id=3, op="evaluate", teachers=sample_teachers, schedule=solved[0]["schedule"]
+    )
+    assert reply["event"] == "result"
+    assert reply["violations"] == []
+    assert reply["objective"] == solved[0]["objective"]
+
+
+def test_what_if(solved, client, sample_teachers):
+    # a teacher of the solved schedule, so that something has to change
+    T = solved[0]["schedule"][0]["teachers"][0]
+    reply = client.request(
+        id=4,
+        op="what-if",
+        teachers=sample_teachers,
+        changes={"excluded_teachers": [T]},
+        time_limit=5,  # starts from the solved schedule
+    )
+    assert reply["event"] == "result"
+    assert reply["status"] in ("FEASIBLE", "OPTIMAL")
+    assert reply["changes"]
+    assert all(T not in x["teachers"] for x in reply["schedule"])
+
+
+def test_cancel(server, client, sample_teachers):
+    # other penalties, so that it is not answered from the solved entry
+    client.send(
+        id=5,
+        op="solve",
+        teachers=sample_teachers,
+        penalties={"teacher": 999},
+        time_limit=600,
+    )
+    client.file.readline()  # the first incumbent, the solve is running
+    # ids are per client, another one cannot cancel it
+    other = Client(server)
+    assert not other.request(id=6, op="cancel", target=5)["cancelled"]
+    other.close()
+    client.send(id=6, op="cancel", target=5)
+    replies = {}
+    while len(replies) < 2:
+        msg = json.loads(client.file.readline())
+        if msg["event"] != "incumbent":
+            replies[msg["id"]] = msg
+    assert replies[6]["cancelled"]
+    assert replies[5]["event"] == "result"
+    assert replies[5]["status"] == "FEASIBLE"
+
+
+def test_unknown_op(client):
+    reply = client.request(id=7, op="bogus")
+    assert reply == {"id": 7, "event": "error", "message": "Unknown op bogus"}
+
+
+@pytest.mark.parametrize(
+    ("req", "message"),
+    [
+        ({"op": "solve"}, "Bad request: missing teachers"),
+        ({"op": "solve", "teachers": 1}, "Bad request: teachers must be a file name"),
+        ({"op": "evaluate", "teachers": "t.csv"}, "Bad request: missing schedule"),
+        ({"op": "cancel"}, "Bad request: missing target"),
+    ],
+)
+def test_bad_request(client, req, message):
+    reply = client.request(id=8, **req)
+    assert reply == {"id": 8, "event": "error", "message": message}
+
+
+def test_bad_field(client, sample_teachers):
+    reply = client.request(id=9, op="solve", teachers=sample_teachers, time_limit="x")
+    assert reply["message"] == "Bad request: time_limit must be a number"
+
+
+def test_too_many_solves(sample_teachers):
+    s = service.Service()
+    s.init(log=Log(quiet=True), max_solves=0)
+    replies = []
+    s.handle({"id": 1, "op": "solve", "teachers": sample_teachers}, replies.append)
+    assert replies == [
+        {
+            "id": 1,
+            "event": "error",
+            "message": "Too many solves (0) running, try again later",
+        }
+    ]
+
+
+def test_not_a_socket(tmp_path):
+    path = tmp_path / "socket"
+    path.write_text("precious")
+    with pytest.raises(ScheduleError, match="not a socket"):
+        service.serve(str(path), log=Log(quiet=True))
+    assert path.read_text() == "precious"
+
+
+def test_stale_socket(tmp_path):
+    path = str(tmp_path / "socket")
+    with socket.socket(socket.AF_UNIX) as s:
+        s.bind(path)  # left behind, nobody listens
+    service.remove_stale_socket(path, Log(quiet=True))
+    assert not (tmp_path / "socket").exists()
+
+
+def test_running_server(server):
+    with pytest.raises(ScheduleError, match="Another server"):
+        service.remove_stale_socket(server, Log(quiet=True))
@@ -0,0 +1,57 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from swing_schedule import Input, Log, SolveOptions, solve
+
+# long enough for a schedule with two solves sharing a single core
+TIME_LIMIT = 10
+
+
+def read_input(teachers, excluded_teachers=()):
+    In = Input(Log(quiet=True))
+    In.init(teachers, excluded_teachers=excluded_teachers, cache=True)
+    return In
+
+
+def solve_all(inputs):
+    options = SolveOptions(time_limit=TIME_LIMIT, cache=True)
+    with ThreadPoolExecutor(len(inputs)) as pool:
+        return list(pool.map(lambda In: solve(In, options), inputs))
+
+
+def tmp_files(cache_home):
+    return [
+        name
+        for _, _, names in os.walk(cache_home)
+        for name in names
+        if name.endswith(".tmp")
+    ]
+
+
+# different inputs, every solve has cache entries of its own
+def test_separate_entries(sample_teachers, cache_home):
+    results = solve_all(
+        [read_input(sample_teachers), read_input(sample_teachers, ["Marie"])]
+    )
+    for S in results:
+        assert S.status in ("FEASIBLE", "OPTIMAL")
+        assert not S.cached
+    # the inputs are not mixed up
+    assert all("Marie" not in a.teachers for a in results[1].assignments)
+    assert tmp_files(cache_home) == []
+
+
+# one Input solved twice at once, both solves store the same model and
+# result entries
+def test_shared_entries(sample_teachers, cache_home):
+    In = read_input(sample_teachers)
+    results = solve_all([In, In])
+    for S in results:
+        assert S.status in ("FEASIBLE", "OPTIMAL")
+    assert tmp_files(cache_home) == []
+    # the stored entries are whole, the next solve is answered from them
+    S = solve(
+        read_input(sample_teachers), SolveOptions(time_limit=TIME_LIMIT, cache=True)
+    )
+    assert S.cached
+    assert S.objective in {R.objective for R in results}  # the last one stored